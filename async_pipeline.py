@@ -0,0 +1,476 @@
+"""
+Async Pipeline Module
+An asyncio facade over the emotion-to-music pipeline for embedding it in an existing
+event loop. Frames are processed on one executor thread and come out as an async
+iterator of emotion events; playback is controlled over non-blocking HTTP (aiohttp), so
+UI, telemetry and music share one loop.
+
+Usage:
+    pipeline = AsyncEmotionPipeline(EmotionDetector(headless=True))
+    async for event in pipeline.events():
+        print(event.emotion, event.probabilities)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import spotipy
+from dotenv import load_dotenv
+from emotion_backends import available_backends, create_backend
+from emotion_smoother import EmotionSmoother
+from device_registry import pick_device
+from spotify_player import EMOTION_PLAYLISTS
+from metrics import PLAYBACK_SWITCHES, SPOTIFY_REQUESTS, SPOTIFY_SECONDS, spotify_endpoint
+
+SPOTIFY_API = "https://api.spotify.com/v1/"
+
+# Requests that may be sent again after a timeout or dropped connection - the first attempt may
+# already have reached Spotify, and resending e.g. a play request would restart the playlist
+RETRY_SAFE_METHODS = ("GET", "HEAD")
+
+class EmotionEvent:
+    def __init__(self, timestamp, emotion, stable_emotion, probabilities, face):
+        """
+        A detection from the pipeline
+
+        Args:
+            timestamp (float): Unix time the frame was processed
+            emotion (str): Emotion detected on this frame
+            stable_emotion (str): Smoothed emotion - what the music follows (None until confident)
+            probabilities (dict): {emotion: probability} from the backend, None for simulated emotions
+            face (tuple): (x, y, w, h) face box, None when the detector has no box
+        """
+        self.timestamp = timestamp
+        self.emotion = emotion
+        self.stable_emotion = stable_emotion
+        self.probabilities = probabilities
+        self.face = face
+
+    def to_dict(self):
+        return {
+            'timestamp': self.timestamp,
+            'emotion': self.emotion,
+            'stable_emotion': self.stable_emotion,
+            'probabilities': self.probabilities,
+            'face': [int(v) for v in self.face] if self.face is not None else None,
+        }
+
+    def __repr__(self):
+        return f"<EmotionEvent {self.emotion} (stable: {self.stable_emotion}) at {self.timestamp:.3f}>"
+
+class AsyncSpotifyClient:
+    def __init__(self, auth_manager=None, token=None, prefix=SPOTIFY_API, timeout=5.0, max_attempts=4,
+                 base_delay=0.5, max_delay=30.0):
+        """
+        Initialize a Spotify Web API client for asyncio
+
+        Args:
+            auth_manager: spotipy auth manager (e.g. SpotifyOAuth or TokenManager) - lazy token refreshes run on the
+                default executor
+            token (str): Access token, if not using an auth manager
+            prefix (str): API base URL (default: the Spotify Web API; tests point it at a fake server)
+            timeout (float): Seconds before a request times out (default: 5)
+            max_attempts (int): Attempts per request for 429, 5xx and connection errors (default: 4)
+            base_delay (float): First backoff delay in seconds (default: 0.5)
+            max_delay (float): Longest wait between attempts (default: 30)
+        """
+        self.auth_manager = auth_manager
+        self.token = token
+        self.prefix = prefix
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # Created on first use, inside the running loop; it pools keep-alive connections
+        self.session = None
+
+    async def request(self, method, path, params=None, payload=None):
+        """
+        Send a request, retrying throttled and failed ones with backoff
+
+        Args:
+            method (str): HTTP method
+            path (str): Path relative to the API prefix, e.g. "me/player/play"
+            params (dict): Query parameters
+            payload (dict): JSON body
+
+        Returns:
+            The decoded JSON response, or None for an empty one
+
+        Raises:
+            spotipy.SpotifyException: For error responses, after retries for transient ones
+        """
+        url = path if path.startswith("http") else self.prefix + path
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        endpoint = spotify_endpoint(url)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                headers = {'Authorization': f"Bearer {await self._get_token()}"}
+                if payload is not None:
+                    headers['Content-Type'] = "application/json"
+                status, response_headers, data = await self._send(method, url, headers, body)
+                if status < 400:
+                    SPOTIFY_REQUESTS.inc(method=method, endpoint=endpoint, status="ok")
+                    return json.loads(data) if data else None
+
+                error = spotipy.SpotifyException(status, -1, f"{url}:\n {_error_message(data)}",
+                                                 headers=response_headers)
+                SPOTIFY_REQUESTS.inc(method=method, endpoint=endpoint, status=f"HTTP {status}")
+                if attempt >= self.max_attempts or not (status == 429 or status >= 500):
+                    raise error
+                if status == 429:
+                    try:
+                        retry_after = float(response_headers.get('retry-after'))
+                    except (TypeError, ValueError):
+                        pass
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                SPOTIFY_REQUESTS.inc(method=method, endpoint=endpoint, status=type(e).__name__)
+                # Only a failed connect means the request certainly never reached Spotify
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                if attempt >= self.max_attempts or (sent and method not in RETRY_SAFE_METHODS):
+                    raise
+                error = e
+            finally:
+                SPOTIFY_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+
+            if retry_after is not None:
+                # Retrying before Retry-After only earns another 429 - give up if it's too long to wait
+                if retry_after > self.max_delay:
+                    print(f"Spotify asked to wait {retry_after:.0f}s (more than {self.max_delay:.0f}s) - giving up")
+                    raise error
+                delay = retry_after
+            else:
+                backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+                delay = random.uniform(backoff / 2, backoff)
+            print(f"Spotify request failed ({error.__class__.__name__}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_attempts})")
+            await asyncio.sleep(delay)
+
+    async def _get_token(self):
+        if self.auth_manager is None:
+            return self.token
+        # The auth manager returns its cached token and only refreshes it (blocking) when it expires
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.auth_manager.get_access_token(as_dict=False))
+
+    async def _send(self, method, url, headers, body):
+        """
+        Send one request on the pooled session
+
+        Returns:
+            tuple: (status, headers with lowercase names, body bytes)
+        """
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            # aiohttp (3.10+) resends PUT requests once when the connection drops, and there is no
+            # public switch for it - a play request may already have reached Spotify, so retries
+            # are left to request()
+            self.session._retry_connection = False
+        headers = dict(headers, Accept="application/json")
+        async with self.session.request(method, url, headers=headers, data=body) as response:
+            data = await response.read()
+            response_headers = {name.lower(): value for name, value in response.headers.items()}
+            return response.status, response_headers, data
+
+    async def current_user(self):
+        return await self.request("GET", "me")
+
+    async def devices(self):
+        return await self.request("GET", "me/player/devices")
+
+    async def start_playback(self, device_id=None, context_uri=None, uris=None):
+        payload = {}
+        if context_uri is not None:
+            payload['context_uri'] = context_uri
+        if uris is not None:
+            payload['uris'] = uris
+        return await self.request("PUT", "me/player/play", params={'device_id': device_id}, payload=payload)
+
+    async def pause_playback(self, device_id=None):
+        return await self.request("PUT", "me/player/pause", params={'device_id': device_id})
+
+    async def playlist(self, playlist_id, fields=None):
+        playlist_id = playlist_id.rsplit(":", 1)[-1]
+        return await self.request("GET", f"playlists/{playlist_id}", params={'fields': fields})
+
+    async def close(self):
+        """
+        Close the pooled connections
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+def _error_message(data):
+    try:
+        return json.loads(data)['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return data.decode("utf-8", "replace") if data else "error"
+
+class AsyncPlaybackController:
+    def __init__(self, client=None, device=None, playlists=None):
+        """
+        Initialize playback control
+
+        Args:
+            client (AsyncSpotifyClient): Client to play through, None for demo mode (only prints)
+            device (str): Name or id of the device to play on (default: the active device)
+            playlists (dict): {emotion: [playlist URIs]} (default: spotify_player.EMOTION_PLAYLISTS)
+        """
+        self.client = client
+        self.device = device
+        self.playlists = playlists or EMOTION_PLAYLISTS
+        self.device_id = None
+        self.requested_emotion = None
+        self.playing_emotion = None
+        self.current_playlist = None
+
+        # At most one playback call in flight - a newer emotion cancels the older request
+        self.task = None
+
+    def request(self, emotion):
+        """
+        Switch to an emotion without waiting for Spotify (call from the event loop)
+
+        Only the latest request matters: a switch to another emotion still in flight is cancelled.
+
+        Returns:
+            asyncio.Task: The playback task, None if the emotion is already playing or requested
+        """
+        if emotion is None or emotion == self.requested_emotion:
+            return None
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.requested_emotion = emotion
+        self.task = asyncio.ensure_future(self._play_requested(emotion))
+        return self.task
+
+    async def _play_requested(self, emotion):
+        playlist_uri = await self.play_emotion(emotion)
+        if self.playing_emotion != emotion:
+            # Didn't work out - let the next request for this emotion try again
+            self.requested_emotion = None
+        return playlist_uri
+
+    async def play_emotion(self, emotion):
+        """
+        Start a random playlist for an emotion
+
+        Returns:
+            str: The playlist URI started, or None if nothing was played
+        """
+        playlist_uri = random.choice(self.playlists.get(emotion) or self.playlists['neutral'])
+        if self.client is None:
+            print(f"[DEMO] Would play: {playlist_uri} (Emotion: {emotion})")
+            self.playing_emotion = emotion
+            return None
+
+        try:
+            device_id = self.device_id or await self.find_device()
+            if device_id is None:
+                print("No active Spotify devices found. Please open Spotify on a device.")
+                return None
+            try:
+                await self.client.start_playback(device_id=device_id, context_uri=playlist_uri)
+            except spotipy.SpotifyException as e:
+                if e.http_status != 404:
+                    raise
+                # The device went away - look it up again once
+                device_id = await self.find_device()
+                if device_id is None:
+                    raise
+                await self.client.start_playback(device_id=device_id, context_uri=playlist_uri)
+        except spotipy.SpotifyException as e:
+            print(f"Spotify playback error: {e}")
+            return None
+
+        PLAYBACK_SWITCHES.inc(emotion=emotion)
+        print(f"Now playing: {playlist_uri} (Emotion: {emotion})")
+        self.playing_emotion = emotion
+        self.current_playlist = playlist_uri
+        return playlist_uri
+
+    async def find_device(self):
+        """
+        Look up the device to play on
+
+        Returns:
+            str: Device id, or None if no device is available
+        """
+        devices = (await self.client.devices() or {}).get('devices', [])
+        device = pick_device(devices, self.device)
+        self.device_id = device['id'] if device is not None else None
+        return self.device_id
+
+    async def pause(self):
+        if self.client is not None:
+            await self.client.pause_playback(device_id=self.device_id)
+        self.playing_emotion = None
+
+    async def close(self):
+        """
+        Cancel a switch still in flight and wait for it, so the client can be closed after this
+        """
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+class AsyncEmotionPipeline:
+    def __init__(self, detector, smoother=None, executor=None, idle_delay=0.1):
+        """
+        Initialize the pipeline around a detector
+
+        Args:
+            detector (EmotionDetector): Detector to run - create it with headless=True, the pipeline never shows frames
+            smoother (EmotionSmoother): Smoothing for the stable emotion (default: a new one)
+            executor: Executor for frame processing (default: one dedicated thread, since the
+                detector's cascade must not run on two threads at once)
+            idle_delay (float): Seconds to wait after a frame couldn't be read (default: 0.1)
+        """
+        self.detector = detector
+        self.smoother = smoother or EmotionSmoother()
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="frames")
+        self.idle_delay = idle_delay
+
+        # Newest processed frame, for a UI that wants to show it
+        self.frame = None
+
+    async def process_frame(self):
+        """
+        Read and analyse one frame on the executor
+
+        Returns:
+            EmotionEvent: The detection, or None if there was no frame or no face
+        """
+        loop = asyncio.get_running_loop()
+        frame, emotion = await loop.run_in_executor(self.executor, self.detector.detect_emotion)
+        self.frame = frame
+        if frame is None:
+            if not getattr(self.detector, "ended", False):
+                await asyncio.sleep(self.idle_delay)
+            return None
+        if emotion is None:
+            return None
+
+        timestamp = time.time()
+        probabilities = self.detector.last_probabilities
+        stable_emotion = self.smoother.update(probabilities or emotion, timestamp)
+        return EmotionEvent(timestamp, emotion, stable_emotion, probabilities, self.detector.last_face)
+
+    async def events(self, changes_only=False):
+        """
+        Async iterator of emotion events
+
+        Args:
+            changes_only (bool): Only yield when the stable emotion changes, instead of every detection
+
+        Yields:
+            EmotionEvent: Detections, as they come - until a video file or image directory ends
+        """
+        last_stable = None
+        while True:
+            event = await self.process_frame()
+            if event is None:
+                if getattr(self.detector, "ended", False):
+                    return
+                continue
+            if changes_only and event.stable_emotion == last_stable:
+                continue
+            last_stable = event.stable_emotion
+            yield event
+
+    async def run(self, controller):
+        """
+        Play music for the stable emotion until cancelled or the source ends
+
+        Args:
+            controller (AsyncPlaybackController): Playback control
+        """
+        async for event in self.events(changes_only=True):
+            controller.request(event.stable_emotion)
+
+    async def close(self):
+        """
+        Release the detector (after any frame still being processed) and the executor
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.detector.release)
+        if self.own_executor:
+            self.executor.shutdown(wait=False)
+
+async def _main(args):
+    from emotion_detector import EmotionDetector
+    from spotipy.oauth2 import SpotifyOAuth
+    from token_manager import SharedTokenCache, TokenManager
+
+    classifier = create_backend(args.backend)
+    detector = EmotionDetector(camera_index=args.source, classifier=classifier, headless=True,
+                               max_speed=args.max_speed)
+    pipeline = AsyncEmotionPipeline(detector, EmotionSmoother(min_dwell=args.min_dwell))
+
+    client = None
+    token_manager = None
+    if os.getenv("SPOTIFY_CLIENT_ID") and os.getenv("SPOTIFY_CLIENT_SECRET"):
+        auth_manager = SpotifyOAuth(scope="user-read-playback-state,user-modify-playback-state",
+                                    redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
+                                    cache_handler=SharedTokenCache(".spotify_cache"))
+        # Shares the token with the other players and refreshes it before it expires
+        token_manager = TokenManager(auth_manager).start()
+        client = AsyncSpotifyClient(auth_manager=token_manager)
+    else:
+        print("No Spotify credentials configured - printing what would be played")
+    controller = AsyncPlaybackController(client, device=args.device)
+
+    try:
+        async for event in pipeline.events():
+            print(json.dumps(event.to_dict()))
+            controller.request(event.stable_emotion)
+    finally:
+        await pipeline.close()
+        await controller.close()
+        if client is not None:
+            await client.close()
+        if token_manager is not None:
+            token_manager.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Print emotion events as JSON lines and play matching music")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file, image directory or RTSP/HTTP stream URL (default: 0)")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="read video files and image directories as fast as possible instead of in real time")
+    parser.add_argument("--backend", choices=available_backends(), default=None,
+                        help="emotion backend (default: EMOTION_BACKEND setting or 'simulated')")
+    parser.add_argument("--device", default=None, help="Spotify device name or id (default: the active device)")
+    parser.add_argument("--min-dwell", type=float, default=10.0,
+                        help="minimum seconds to keep an emotion before switching music (default: 10)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        print("Stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Batch Analysis Script
+Runs the emotion detector over recorded footage on a process pool and writes one emotion
+timeline per input (timestamp, face box and class probabilities) to CSV, or Parquet when
+pandas and pyarrow are installed.
+
+Usage:
+    python batch_analysis.py recordings/ --output timelines/ --backend deepface
+    python batch_analysis.py clip1.mp4 clip2.mp4 --workers 16 --format parquet
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from dotenv import load_dotenv
+from emotion_detector import EmotionDetector
+from emotion_backends import available_backends, create_backend, top_emotion
+from frame_sources import IMAGE_EXTENSIONS, open_source
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v', '.mpg', '.mpeg', '.wmv')
+
+# Per worker process state, set up once by _init_worker
+_classifier = None
+_detector = None
+_detector_path = None
+
+def find_inputs(paths):
+    """
+    Expand the command line paths into the videos and image directories to analyse
+
+    Directories are searched recursively. Every video file is one input; every directory
+    that directly contains images is one input, its images read in file name order.
+
+    Args:
+        paths (list): Files and directories
+
+    Returns:
+        list: Paths of the inputs
+    """
+    inputs = []
+    for path in paths:
+        if os.path.isfile(path):
+            inputs.append(path)
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            files = sorted(files)
+            inputs.extend(os.path.join(root, name) for name in files if name.lower().endswith(VIDEO_EXTENSIONS))
+            if any(name.lower().endswith(IMAGE_EXTENSIONS) for name in files):
+                inputs.append(root)
+    return inputs
+
+def plan_chunks(path, chunk_frames):
+    """
+    Split an input into frame ranges that workers can analyse independently
+
+    Args:
+        path (str): Video file or image directory
+        chunk_frames (int): Frames per range
+
+    Returns:
+        tuple: (list of (start, end) ranges, frames per second of the input)
+    """
+    source = open_source(path, max_speed=True)
+    if not source.isOpened():
+        raise ValueError(f"could not open {source!r}")
+    frame_count = int(source.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = source.get(cv2.CAP_PROP_FPS) or 30.0
+    source.release()
+
+    if frame_count <= 0:
+        # Unknown length (some containers don't say) - one worker reads the whole file
+        return [(0, None)], fps
+    return [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)], fps
+
+def _init_worker(backend, batch_size):
+    global _classifier
+    # One OpenCV thread per process - the pool already uses every core
+    cv2.setNumThreads(1)
+    _classifier = create_backend(backend, batch_size=batch_size)
+    _classifier.load()
+
+def _get_detector(path):
+    """
+    Get a detector reading the given input, reusing the worker's current one if it's the same file
+    """
+    global _detector, _detector_path
+    if _detector_path != path:
+        if _detector is not None:
+            _detector.cap.release()
+        _detector = EmotionDetector(camera_index=path, max_speed=True, headless=True, classifier=_classifier)
+        _detector_path = path
+    return _detector
+
+def analyse_chunk(path, start, end, fps, stride=1):
+    """
+    Analyse a frame range of one input (runs in a worker process)
+
+    Args:
+        path (str): Video file or image directory
+        start (int): First frame
+        end (int): Frame to stop before, None for the end of the input
+        fps (float): Frames per second, for the timestamps
+        stride (int): Analyse every Nth frame of the input (default: 1)
+
+    Returns:
+        list: (frame, timestamp, face box or None, probabilities or None) rows
+    """
+    detector = _get_detector(path)
+    detector.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    batch_size = _classifier.batch_size
+    rows = []
+    pending = []  # (row index, crop) waiting for the next forward pass
+
+    frame_number = start
+    while end is None or frame_number < end:
+        # Stride from frame 0, not the chunk start, so chunk boundaries don't change which frames are sampled
+        if frame_number % stride:
+            # Skip without decoding into a new array
+            if not detector.cap.grab():
+                break
+            frame_number += 1
+            continue
+
+        ret, frame = detector.cap.read()
+        if not ret:
+            break
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        face = detector.detect_largest_face(frame, gray)
+        if face is not None:
+            face = tuple(int(v) for v in face)
+            pending.append((len(rows), _classifier.preprocess(gray, face)))
+        rows.append([frame_number, frame_number / fps, face, None])
+
+        if len(pending) >= batch_size:
+            _classify(rows, pending)
+            pending = []
+        frame_number += 1
+
+    if pending:
+        _classify(rows, pending)
+    return rows
+
+def _classify(rows, pending):
+    results = _classifier.predict_batch([crop for _, crop in pending])
+    for (row_index, _), probabilities in zip(pending, results):
+        rows[row_index][3] = probabilities
+
+def write_timeline(rows, labels, path, output_format):
+    """
+    Write an emotion timeline
+
+    Args:
+        rows (list): Rows from analyse_chunk(), in frame order
+        labels (list): Emotion labels of the backend, one probability column each
+        path (str): Output path without extension
+        output_format (str): "csv" or "parquet"
+
+    Returns:
+        str: The written file
+    """
+    header = ['frame', 'timestamp', 'x', 'y', 'w', 'h', 'emotion'] + [f"p_{label}" for label in labels]
+    records = []
+    for frame_number, timestamp, face, probabilities in rows:
+        x, y, w, h = face if face is not None else (None, None, None, None)
+        probabilities = probabilities or {}
+        records.append([frame_number, round(timestamp, 3), x, y, w, h, top_emotion(probabilities)] +
+                       [probabilities.get(label) for label in labels])
+
+    if output_format == "parquet":
+        try:
+            import pandas as pd
+            filename = f"{path}.parquet"
+            pd.DataFrame(records, columns=header).to_parquet(filename, index=False)
+            return filename
+        except ImportError:
+            print("Parquet output needs pandas and pyarrow - writing CSV instead")
+
+    filename = f"{path}.csv"
+    with open(filename, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(records)
+    return filename
+
+def output_name(path, output_dir):
+    """
+    Output path (without extension) for an input - file names are kept, directory names flattened
+    """
+    name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0] if os.path.isfile(path) \
+        else os.path.normpath(path).replace(os.sep, "_").strip("._")
+    return os.path.join(output_dir, f"{name}.emotions")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyse recorded footage into emotion timelines")
+    parser.add_argument("inputs", nargs="+", help="video files, image directories or directories of videos")
+    parser.add_argument("--output", "-o", default="timelines", help="directory for the timelines (default: timelines)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="output format (default: csv)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU core)")
+    parser.add_argument("--chunk-frames", type=int, default=900,
+                        help="frames per work item - smaller spreads short files over more cores (default: 900)")
+    parser.add_argument("--stride", type=int, default=1, help="analyse every Nth frame (default: 1)")
+    parser.add_argument("--backend", choices=available_backends(), default=None,
+                        help="emotion backend (default: EMOTION_BACKEND setting or 'simulated')")
+    parser.add_argument("--batch-size", type=int, default=16, help="face crops per forward pass (default: 16)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    load_dotenv()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        print("No videos or images found")
+        return
+    os.makedirs(args.output, exist_ok=True)
+    labels = create_backend(args.backend).labels
+
+    # Split every input into frame ranges up front so the pool stays busy across files
+    jobs = []
+    for path in inputs:
+        try:
+            chunks, fps = plan_chunks(path, args.chunk_frames)
+        except ValueError as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        jobs.extend((path, start, end, fps) for start, end in chunks)
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"Analysing {len(inputs)} input(s) in {len(jobs)} chunk(s) on {workers} worker process(es)...")
+
+    start_time = time.time()
+    results = {path: [] for path in inputs}
+    remaining = {path: 0 for path in inputs}
+    for path, _, _, _ in jobs:
+        remaining[path] += 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.backend, args.batch_size)) as pool:
+        futures = {pool.submit(analyse_chunk, path, start, end, fps, args.stride): path
+                   for path, start, end, fps in jobs}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path].extend(future.result())
+            except Exception as e:
+                print(f"Chunk of {path} failed: {e}")
+
+            # Write each timeline as soon as all of its chunks are in
+            remaining[path] -= 1
+            if remaining[path] == 0:
+                rows = sorted(results.pop(path), key=lambda row: row[0])
+                filename = write_timeline(rows, labels, output_name(path, args.output), args.format)
+                print(f"{path}: {len(rows)} frames -> {filename}")
+
+    print(f"Done in {time.time() - start_time:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Benchmark Script
+Plays recorded video clips through EmotionDetector and EmotionMusicPlayer as fast as possible,
+using a local stand-in for the Spotify Web API, and reports fps, per-stage latency percentiles
+and peak memory. Results are written as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmark.py clip.mp4 [more clips...] --output results.json
+    python benchmark.py clip.mp4 --output new.json --compare old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import cv2
+
+from emotion_backends import available_backends, create_backend
+from emotion_detector import EmotionDetector
+from emotion_music_player import EmotionMusicPlayer
+from face_detectors import DEFAULT_DETECTOR, available_detectors, create_detector
+from emotion_smoother import EmotionSmoother
+from fake_spotify_server import FakeSpotifyServer
+from spotify_client import TokenBucket, create_spotify_client
+from spotify_player import SpotifyPlayer
+
+class StageTimer:
+    """
+    Collects timing samples per pipeline stage
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def timed(self, stage, func):
+        """
+        Wrap a function so every call is recorded under the given stage
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self):
+        """
+        Get count, mean and percentiles (in milliseconds) for every stage
+
+        Returns:
+            dict: {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}
+        """
+        result = {}
+        for stage, samples in sorted(self.samples.items()):
+            values = sorted(samples)
+            result[stage] = {
+                "count": len(values),
+                "mean_ms": 1000.0 * sum(values) / len(values),
+                "p50_ms": 1000.0 * percentile(values, 50),
+                "p95_ms": 1000.0 * percentile(values, 95),
+                "p99_ms": 1000.0 * percentile(values, 99),
+                "max_ms": 1000.0 * values[-1],
+            }
+        return result
+
+class TimedProxy:
+    """
+    Stands in for an object (e.g. a cv2.VideoCapture) and times calls to some of its methods
+    """
+
+    def __init__(self, target, timer, stages):
+        self._target = target
+        self._timer = timer
+        self._stages = stages
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name in self._stages:
+            return self._timer.timed(self._stages[name], attribute)
+        return attribute
+
+def percentile(sorted_values, q):
+    """
+    Percentile of already sorted values, with linear interpolation
+
+    Args:
+        sorted_values (list): Values in ascending order
+        q (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile
+    """
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process so far
+
+    Returns:
+        float: Peak RSS in MB, or None if it can't be measured on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+def git_commit():
+    """
+    Short hash of the current commit, if this is a git checkout
+    """
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return output.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def make_fake_client(server, timer):
+    """
+    Create a Spotify client that talks to the fake server and times every API call
+
+    Each client gets its own full rate limiter, so a target doesn't start with the bucket the
+    previous one drained. Waiting for the limiter (spotify_rate_limit) is timed separately
+    from the HTTP round trip (spotify_api).
+    """
+    sp = create_spotify_client(auth="benchmark-token")
+    sp.prefix = server.api_prefix
+    sp.rate_limiter = TimedProxy(TokenBucket(), timer, {"acquire": "spotify_rate_limit"})
+    sp._session = TimedProxy(sp._session, timer, {"request": "spotify_api"})
+    return sp
+
+def benchmark_detector(clips, args, server):
+    """
+    Run the clips through EmotionDetector + SpotifyPlayer, mirroring main.py without the display
+
+    Returns:
+        dict: Frames, fps and per-stage latency
+    """
+    timer = StageTimer()
+    sp = make_fake_client(server, timer)
+    player = SpotifyPlayer(None, None, None, sp=sp)
+    smoother = EmotionSmoother(min_dwell=args.min_dwell)
+    current_emotion = None
+
+    frames = 0
+    elapsed = 0.0
+    for clip in clips:
+        classifier = create_backend(args.backend, batch_size=args.batch_size)
+        classifier.load()
+        detector = EmotionDetector(camera_index=clip, classifier=classifier, max_speed=True,
+                                   face_detector=create_detector(args.face_detector))
+        detector.cap = TimedProxy(detector.cap, timer, {"read": "read"})
+        detector.face_detector = TimedProxy(detector.face_detector, timer, {"detect": "face_detection"})
+        classifier.add_face = timer.timed("classification", classifier.add_face)
+
+        start = time.perf_counter()
+        while args.max_frames is None or frames < args.max_frames:
+            frame_start = time.perf_counter()
+            frame, emotion = detector.detect_emotion()
+            if frame is None:
+                break
+
+            if emotion:
+                stable_emotion = smoother.update(detector.last_probabilities or emotion)
+                if stable_emotion is not None and stable_emotion != current_emotion:
+                    timer.timed("playback_submit", player.play_music_for_emotion)(stable_emotion)
+                    current_emotion = stable_emotion
+                detector.display_emotion(frame, current_emotion)
+
+            timer.add("frame", time.perf_counter() - frame_start)
+            frames += 1
+        elapsed += time.perf_counter() - start
+        detector.cap.release()
+
+    player.dispatcher.wait_idle(timeout=30)
+    player.close()
+    return _target_result(frames, elapsed, timer)
+
+def benchmark_player(clips, args, server):
+    """
+    Run the clips through EmotionMusicPlayer, mirroring EmotionMusicPlayer.run without the display
+
+    Returns:
+        dict: Frames, fps and per-stage latency
+    """
+    timer = StageTimer()
+    sp = make_fake_client(server, timer)
+
+    frames = 0
+    elapsed = 0.0
+    for index, clip in enumerate(clips):
+        classifier = create_backend(args.backend, batch_size=args.batch_size)
+        classifier.load()
+        app = EmotionMusicPlayer(classifier=classifier, min_dwell=args.min_dwell, source=clip, max_speed=True,
+                                 face_detector=create_detector(args.face_detector))
+        if not app.init_camera():
+            print(f"Could not open {clip} - skipped")
+            continue
+        app.init_spotify(sp)
+
+        app.cap = TimedProxy(app.cap, timer, {"read": "read"})
+        app.face_detector = TimedProxy(app.face_detector, timer, {"detect": "face_detection"})
+        classifier.add_face = timer.timed("classification", classifier.add_face)
+        app.play_music_for_emotion = timer.timed("playback_submit", app.play_music_for_emotion)
+
+        start = time.perf_counter()
+        while args.max_frames is None or frames < args.max_frames:
+            frame_start = time.perf_counter()
+            run_detection = app.scheduler.should_detect()
+            frame, emotion = app.detect_face_and_emotion(run_detection)
+            if frame is None:
+                break
+            app.scheduler.record(time.perf_counter() - frame_start - app.read_seconds, run_detection)
+
+            if emotion and run_detection:
+                app.play_music_for_emotion(app.smoother.update(app.last_probabilities or emotion))
+
+            timer.add("frame", time.perf_counter() - frame_start)
+            frames += 1
+        elapsed += time.perf_counter() - start
+
+        app.dispatcher.wait_idle(timeout=30)
+        app.dispatcher.stop()
+        if app.device_registry is not None:
+            app.device_registry.stop()
+        app.cap.release()
+
+    return _target_result(frames, elapsed, timer)
+
+def _target_result(frames, elapsed, timer):
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "stages": timer.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_benchmarks(args):
+    """
+    Run every benchmark target against a fresh fake Spotify server
+
+    Returns:
+        dict: Machine-readable results
+    """
+    clips = [os.path.abspath(clip) for clip in args.clips]
+    targets = {
+        "emotion_detector": benchmark_detector,
+        "emotion_music_player": benchmark_player,
+    }
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "backend": args.backend or os.getenv("EMOTION_BACKEND", "simulated"),
+            "face_detector": args.face_detector or os.getenv("FACE_DETECTOR", DEFAULT_DETECTOR),
+            "clips": clips,
+            "spotify_latency_ms": args.spotify_latency_ms,
+        },
+        "results": {},
+    }
+
+    # Run in a scratch directory so on-disk caches from real runs don't skew the numbers
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="moodify-bench-") as scratch:
+        os.chdir(scratch)
+        try:
+            for name in args.targets:
+                print(f"Benchmarking {name}...")
+                server = FakeSpotifyServer(latency_ms=args.spotify_latency_ms).start()
+                try:
+                    result = targets[name](clips, args, server)
+                finally:
+                    server.stop()
+                result["spotify_requests"] = server.request_counts()
+                results["results"][name] = result
+        finally:
+            os.chdir(original_dir)
+
+    return results
+
+def print_results(results):
+    for name, result in results["results"].items():
+        print(f"\n{name}: {result['frames']} frames in {result['seconds']:.2f}s = {result['fps']:.1f} fps"
+              f" (peak RSS {_format(result['peak_rss_mb'], 'MB')})")
+        print(f"  {'stage':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, stats in result["stages"].items():
+            print(f"  {stage:<18}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+        if result.get("spotify_requests"):
+            print(f"  spotify requests: {result['spotify_requests']}")
+
+def print_comparison(results, baseline):
+    """
+    Print how fps and stage latencies changed compared to an earlier run
+    """
+    print(f"\nComparison with {baseline['meta'].get('commit') or 'baseline'} "
+          f"({baseline['meta'].get('timestamp', '?')}):")
+    for name, result in results["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        print(f"  {name}: fps {old['fps']:.1f} -> {result['fps']:.1f} ({_change(old['fps'], result['fps'])})")
+        for stage, stats in result["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if old_stats is None:
+                continue
+            print(f"    {stage:<18} p50 {old_stats['p50_ms']:.2f} -> {stats['p50_ms']:.2f} ms "
+                  f"({_change(old_stats['p50_ms'], stats['p50_ms'])}), "
+                  f"p95 {old_stats['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ms "
+                  f"({_change(old_stats['p95_ms'], stats['p95_ms'])})")
+
+def _change(old, new):
+    if not old:
+        return "n/a"
+    return f"{100.0 * (new - old) / old:+.1f}%"
+
+def _format(value, unit):
+    return f"{value:.1f} {unit}" if value is not None else "n/a"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the emotion pipeline on recorded clips")
+    parser.add_argument("clips", nargs="+", help="recorded video files to play through the pipeline")
+    parser.add_argument("--output", "-o", help="write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--targets", nargs="+", default=["emotion_detector", "emotion_music_player"],
+                        choices=["emotion_detector", "emotion_music_player"], help="what to benchmark")
+    parser.add_argument("--backend", choices=available_backends(), default=None, help="emotion backend")
+    parser.add_argument("--face-detector", choices=available_detectors(), default=None, help="face detector")
+    parser.add_argument("--batch-size", type=int, default=4, help="face crops per classifier forward pass")
+    parser.add_argument("--min-dwell", type=float, default=10.0, help="smoother minimum dwell time in seconds")
+    parser.add_argument("--max-frames", type=int, default=None, help="stop each target after this many frames")
+    parser.add_argument("--spotify-latency-ms", type=float, default=50.0,
+                        help="artificial latency of the fake Spotify API (default: 50)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmarks(args)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Catalog Sync Module
+Pulls the tracks of every emotion playlist and their audio features from Spotify into the
+local track catalog snapshot (see track_catalog.py).
+
+Playlists whose snapshot_id hasn't changed since the last sync are not fetched again, and
+audio features are only requested for tracks the snapshot doesn't have yet, so a refresh
+usually costs one request per playlist.
+
+Usage:
+    python catalog_sync.py [--output track_catalog.snapshot] [--full]
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from spotipy.exceptions import SpotifyException
+from spotipy.oauth2 import SpotifyClientCredentials
+from spotify_client import create_spotify_client
+from spotify_player import EMOTION_PLAYLISTS
+from track_catalog import DEFAULT_CATALOG_PATH, FEATURES, read_snapshot, write_snapshot
+
+# Largest page the playlist items endpoint returns
+PAGE_SIZE = 100
+
+# Track IDs per audio features request (the API maximum)
+AUDIO_FEATURES_BATCH = 100
+
+# Only the fields the catalog needs, to keep pages small
+ITEM_FIELDS = "items(track(uri,type,is_local)),next"
+
+def load_previous(path):
+    """
+    Load what the last sync stored, to find out what can be reused
+
+    Args:
+        path (str): Snapshot file
+
+    Returns:
+        tuple: ({playlist uri: (snapshot_id, [track uris])}, {track uri: feature row}) - both empty
+            if there is no usable snapshot
+    """
+    if not os.path.exists(path):
+        return {}, {}
+    try:
+        columns = read_snapshot(path)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return {}, {}
+
+    uris = [uri.decode("ascii") for uri in columns['uris']]
+    features = dict(zip(uris, np.array(columns['features'])))
+
+    playlists = {}
+    snapshot_ids = [snapshot_id.decode("ascii") for snapshot_id in columns['playlist_snapshots']]
+    for row, uri in enumerate(columns['playlists']):
+        playlists[uri.decode("ascii")] = (snapshot_ids[row], [])
+    playlist_uris = list(playlists)
+    for playlist_row, track_row in zip(columns['member_playlist'], columns['member_track']):
+        playlists[playlist_uris[playlist_row]][1].append(uris[track_row])
+    return playlists, features
+
+def fetch_playlist_tracks(sp, playlist_uri):
+    """
+    Get the URIs of all tracks in a playlist, one page of PAGE_SIZE items per request
+
+    Local files, episodes and removed tracks are skipped.
+
+    Returns:
+        list: Track URIs in playlist order
+    """
+    tracks = []
+    page = sp.playlist_items(playlist_uri, fields=ITEM_FIELDS, limit=PAGE_SIZE, additional_types=("track",))
+    while page:
+        for item in page.get('items') or []:
+            track = item.get('track')
+            if track and track.get('type') == 'track' and not track.get('is_local') and track.get('uri'):
+                tracks.append(track['uri'])
+        page = sp.next(page) if page.get('next') else None
+    return tracks
+
+def fetch_features(sp, track_uris):
+    """
+    Get the catalog features for tracks, AUDIO_FEATURES_BATCH tracks per request
+
+    Returns:
+        dict: {track uri: float32 feature row} - tracks without audio features are left out
+    """
+    features = {}
+    for start in range(0, len(track_uris), AUDIO_FEATURES_BATCH):
+        batch = track_uris[start:start + AUDIO_FEATURES_BATCH]
+        for uri, analysis in zip(batch, sp.audio_features(batch)):
+            if analysis and all(analysis.get(feature) is not None for feature in FEATURES):
+                features[uri] = np.array([analysis[feature] for feature in FEATURES], dtype=np.float32)
+    return features
+
+def sync_catalog(sp, path=DEFAULT_CATALOG_PATH, playlists=None, full=False):
+    """
+    Bring the catalog snapshot up to date with the playlists
+
+    Args:
+        sp: Authenticated spotipy.Spotify client
+        path (str): Snapshot file (default: DEFAULT_CATALOG_PATH)
+        playlists (list): Playlist URIs (default: every playlist in EMOTION_PLAYLISTS)
+        full (bool): Fetch everything again instead of reusing the previous snapshot
+
+    Returns:
+        dict: Counts of playlists fetched/unchanged, tracks in the catalog and feature lookups made,
+            or None if the app has no access to audio features (the snapshot is left as it was)
+    """
+    if playlists is None:
+        playlists = [uri for uris in EMOTION_PLAYLISTS.values() for uri in uris]
+    playlists = list(dict.fromkeys(playlists))
+    previous, known_features = ({}, {}) if full else load_previous(path)
+
+    stats = {'playlists_fetched': 0, 'playlists_unchanged': 0, 'features_fetched': 0}
+    synced = {}
+    for uri in playlists:
+        try:
+            snapshot_id = sp.playlist(uri, fields="snapshot_id")['snapshot_id']
+            if uri in previous and previous[uri][0] == snapshot_id:
+                synced[uri] = previous[uri]
+                stats['playlists_unchanged'] += 1
+                continue
+            synced[uri] = (snapshot_id, fetch_playlist_tracks(sp, uri))
+            stats['playlists_fetched'] += 1
+            print(f"Fetched {len(synced[uri][1])} tracks from {uri}")
+        except SpotifyException as e:
+            # Keep what the last sync had rather than dropping the playlist
+            print(f"Could not sync {uri}: {e}")
+            if uri in previous:
+                synced[uri] = previous[uri]
+
+    track_uris = list(dict.fromkeys(track for _, tracks in synced.values() for track in tracks))
+    missing = [track for track in track_uris if track not in known_features]
+    if missing:
+        print(f"Fetching audio features for {len(missing)} tracks...")
+        try:
+            known_features.update(fetch_features(sp, missing))
+        except SpotifyException as e:
+            print(f"Could not fetch audio features: {e}")
+            if e.http_status == 403:
+                print("This Spotify app has no access to audio features - the catalog can't be built")
+                return None
+        stats['features_fetched'] = len(missing)
+
+    # Tracks without features can't be matched to a mood, so only the others get a row
+    track_uris = [track for track in track_uris if track in known_features]
+    track_rows = {track: row for row, track in enumerate(track_uris)}
+    members = [(playlist_row, track_rows[track])
+               for playlist_row, (_, tracks) in enumerate(synced.values())
+               for track in tracks if track in track_rows]
+
+    write_snapshot(path, {
+        'uris': np.array(track_uris, dtype=bytes),
+        'features': np.array([known_features[track] for track in track_uris], dtype=np.float32)
+                      .reshape(len(track_uris), len(FEATURES)),
+        'playlists': np.array(list(synced), dtype=bytes),
+        'playlist_snapshots': np.array([snapshot_id for snapshot_id, _ in synced.values()], dtype=bytes),
+        'member_playlist': np.array([playlist_row for playlist_row, _ in members], dtype=np.int32),
+        'member_track': np.array([track_row for _, track_row in members], dtype=np.int32),
+    })
+    stats['tracks'] = len(track_uris)
+    return stats
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync the emotion playlists into the local track catalog")
+    parser.add_argument("--output", "-o", default=None,
+                        help="snapshot file (default: MOODIFY_CATALOG setting or track_catalog.snapshot)")
+    parser.add_argument("--playlist", action="append", default=None,
+                        help="playlist URI to sync instead of the emotion playlists (can be repeated)")
+    parser.add_argument("--full", action="store_true",
+                        help="fetch every playlist and track again instead of only what changed")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    load_dotenv()
+
+    client_id = os.getenv("SPOTIFY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+    if not client_id or not client_secret or any(x.startswith('your_') for x in [client_id, client_secret]):
+        print("Set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in the .env file to sync the catalog")
+        return
+
+    # Playlists and audio features are public data - no user login needed
+    sp = create_spotify_client(auth_manager=SpotifyClientCredentials(client_id, client_secret), requests_timeout=15)
+
+    path = args.output or os.getenv("MOODIFY_CATALOG", DEFAULT_CATALOG_PATH)
+    start_time = time.time()
+    stats = sync_catalog(sp, path, playlists=args.playlist, full=args.full)
+    if stats is None:
+        return
+    print(f"Catalog {path}: {stats['tracks']} tracks ({stats['playlists_fetched']} playlists fetched, "
+          f"{stats['playlists_unchanged']} unchanged, {stats['features_fetched']} feature lookups) "
+          f"in {time.time() - start_time:.1f}s")
+
+if __name__ == "__main__":
+    main()
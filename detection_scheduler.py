@@ -0,0 +1,143 @@
+"""
+Detection Scheduler Module
+Decides on which frames to run face detection and emotion classification so the loop
+stays within a frame-time budget or a CPU cap, while frames keep being shown at camera rate.
+"""
+
+import math
+import time
+
+class DetectionScheduler:
+    def __init__(self, frame_budget_ms=None, cpu_percent=None, min_interval=1, max_interval=30, window=1.0):
+        """
+        Initialize the scheduler
+
+        With neither a budget nor a CPU cap, detection runs on every frame.
+
+        Args:
+            frame_budget_ms (float): Target average processing time per frame in milliseconds
+            cpu_percent (float): Target CPU use of the process in percent of one core
+            min_interval (int): Smallest number of frames between detections (default: 1)
+            max_interval (int): Largest number of frames between detections (default: 30)
+            window (float): Seconds between interval adjustments (default: 1.0)
+        """
+        self.frame_budget = frame_budget_ms / 1000.0 if frame_budget_ms else None
+        self.cpu_percent = cpu_percent
+        self.min_interval = max(1, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.window = window
+
+        # Run detection every `interval` frames
+        self.interval = self.min_interval
+        self.frames_since_detection = self.interval
+
+        # Moving averages of the cost of frames with and without detection (seconds)
+        self.detect_frame_cost = None
+        self.plain_frame_cost = None
+
+        # CPU measurement window
+        self.window_start = time.perf_counter()
+        self.window_cpu_start = time.process_time()
+        self.measured_cpu_percent = None
+
+    @property
+    def enabled(self):
+        """
+        bool: True if a budget or CPU cap is set
+        """
+        return self.frame_budget is not None or self.cpu_percent is not None
+
+    def should_detect(self):
+        """
+        Check whether detection should run on the current frame
+
+        Returns:
+            bool: True to run detection and classification on this frame
+        """
+        if not self.enabled:
+            return True
+        return self.frames_since_detection >= self.interval
+
+    def record(self, seconds, detected):
+        """
+        Record the processing time of a frame and adapt the detection interval
+
+        Args:
+            seconds (float): Time spent processing the frame (detection, classification, drawing) -
+                without the time spent waiting for the frame, which a faster pipeline can't shorten
+            detected (bool): Whether detection ran on this frame
+        """
+        if detected:
+            self.frames_since_detection = 1
+            self.detect_frame_cost = _average(self.detect_frame_cost, seconds)
+        else:
+            self.frames_since_detection += 1
+            self.plain_frame_cost = _average(self.plain_frame_cost, seconds)
+
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        if now - self.window_start < self.window:
+            return
+
+        if self.frame_budget is not None:
+            self._adapt_to_budget()
+        if self.cpu_percent is not None:
+            self._adapt_to_cpu(now)
+
+        self.window_start = now
+        self.window_cpu_start = time.process_time()
+
+    def _adapt_to_budget(self):
+        """
+        Pick the smallest interval whose average frame cost fits the budget
+        """
+        if self.detect_frame_cost is None:
+            return
+
+        plain = self.plain_frame_cost if self.plain_frame_cost is not None else 0.0
+        detection_cost = max(0.0, self.detect_frame_cost - plain)
+        headroom = self.frame_budget - plain
+
+        # Average cost per frame is plain + detection_cost / interval
+        if headroom <= 0:
+            interval = self.max_interval
+        else:
+            interval = math.ceil(detection_cost / headroom) if detection_cost > 0 else self.min_interval
+
+        self._set_interval(interval)
+
+    def _adapt_to_cpu(self, now):
+        """
+        Detect less often while the process uses more CPU than allowed, more often when well below it
+        """
+        cpu_now = time.process_time()
+        elapsed = now - self.window_start
+        self.measured_cpu_percent = 100.0 * (cpu_now - self.window_cpu_start) / elapsed if elapsed > 0 else 0.0
+
+        if self.measured_cpu_percent > self.cpu_percent:
+            # Scale the interval by how far over the cap we are
+            interval = math.ceil(self.interval * self.measured_cpu_percent / self.cpu_percent)
+        elif self.measured_cpu_percent < 0.8 * self.cpu_percent:
+            interval = self.interval - 1
+        else:
+            interval = self.interval
+
+        # With a frame budget as well, keep whichever interval is more conservative
+        if self.frame_budget is not None:
+            interval = max(interval, self.interval)
+
+        self._set_interval(interval)
+
+    def _set_interval(self, interval):
+        interval = min(self.max_interval, max(self.min_interval, int(interval)))
+        if interval != self.interval:
+            print(f"Detection interval adjusted: every {interval} frame(s)")
+        self.interval = interval
+
+def _average(current, value, weight=0.1):
+    """
+    Exponential moving average that starts at the first value
+    """
+    return value if current is None else current + weight * (value - current)
@@ -0,0 +1,176 @@
+"""
+Device Registry Module
+Keeps the list of Spotify devices in memory and refreshes it in the background,
+so playback doesn't need a devices() call before every switch.
+"""
+
+import threading
+import time
+
+class DeviceRegistry:
+    def __init__(self, sp, ttl=30, refresh_interval=15, retry_interval=2):
+        """
+        Initialize the registry
+
+        Args:
+            sp: Authenticated spotipy.Spotify client
+            ttl (float): Seconds the cached device list may be used before it must be fetched again (default: 30)
+            refresh_interval (float): Seconds between background refreshes (default: 15)
+            retry_interval (float): Seconds between background refreshes while no device is available (default: 2)
+        """
+        self.sp = sp
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+
+        self.devices = []
+        self.fetched_at = 0.0
+        self.condition = threading.Condition()
+        self.wake_event = threading.Event()
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        Start refreshing the device list in the background
+
+        Returns:
+            DeviceRegistry: self, so the call can be chained
+        """
+        if self.running:
+            return self
+
+        self.running = True
+        self.thread = threading.Thread(target=self._refresh_loop, name="device-registry", daemon=True)
+        self.thread.start()
+        return self
+
+    def _refresh_loop(self):
+        """
+        Refresh the device list periodically, faster while no device is available
+        """
+        while self.running:
+            # Cleared before refreshing, so an invalidate() during the refresh or the wait still wakes us
+            self.wake_event.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Could not refresh Spotify devices: {e}")
+
+            with self.condition:
+                interval = self.refresh_interval if self.devices else self.retry_interval
+            if self.running:
+                self.wake_event.wait(interval)
+
+    def refresh(self):
+        """
+        Fetch the device list from Spotify
+
+        Returns:
+            list: The available devices
+        """
+        devices = self.sp.devices()['devices']
+        with self.condition:
+            self.devices = devices
+            self.fetched_at = time.time()
+            self.condition.notify_all()
+        return devices
+
+    def is_fresh(self):
+        """
+        bool: True if the cached device list is younger than the TTL
+        """
+        with self.condition:
+            return self.fetched_at > 0 and time.time() - self.fetched_at < self.ttl
+
+    def get_devices(self):
+        """
+        Get the device list, fetching it only if the cached copy is stale
+
+        Returns:
+            list: The available devices
+        """
+        if not self.is_fresh():
+            return self.refresh()
+
+        with self.condition:
+            return list(self.devices)
+
+    def get_device(self, preferred=None):
+        """
+        Get the device to play on - the active one if there is one, otherwise the first
+
+        Args:
+            preferred (str): Name or id of a specific device to use instead (e.g. the speaker of a zone)
+
+        Returns:
+            dict: Spotify device, or None if no (matching) device is available
+        """
+        return pick_device(self.get_devices(), preferred)
+
+    def get_device_id(self, preferred=None):
+        """
+        Get the id of the device to play on
+
+        Args:
+            preferred (str): Name or id of a specific device to use instead
+
+        Returns:
+            str: Device id, or None if no (matching) device is available
+        """
+        device = self.get_device(preferred)
+        return device['id'] if device else None
+
+    def invalidate(self):
+        """
+        Forget the cached devices (e.g. after NO_ACTIVE_DEVICE) and refresh right away in the background
+        """
+        with self.condition:
+            self.devices = []
+            self.fetched_at = 0.0
+        self.wake_event.set()
+
+    def wait_for_device(self, timeout, preferred=None):
+        """
+        Wait until the background refresh finds a device
+
+        Args:
+            timeout (float): Seconds to wait
+            preferred (str): Name or id of a specific device to wait for
+
+        Returns:
+            dict: The device to play on, or None if none appeared in time
+        """
+        self.wake_event.set()
+        with self.condition:
+            self.condition.wait_for(lambda: pick_device(self.devices, preferred), timeout)
+            return pick_device(self.devices, preferred)
+
+    def stop(self):
+        """
+        Stop the background refresh
+        """
+        self.running = False
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+def pick_device(devices, preferred=None):
+    """
+    Choose a device from a device list
+
+    Args:
+        devices (list): Spotify devices
+        preferred (str): Name (case-insensitive) or id of the wanted device, or None for any
+
+    Returns:
+        dict: The preferred device, else the active one, else the first - None if nothing matches
+    """
+    if not devices:
+        return None
+    if preferred:
+        return next((device for device in devices
+                     if device['id'] == preferred or device['name'].lower() == preferred.lower()), None)
+    return next((device for device in devices if device.get('is_active')), devices[0])
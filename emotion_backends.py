@@ -0,0 +1,378 @@
+"""
+Emotion Backends Module
+Registry of emotion classification backends. Backends are created cheaply and only import
+their heavy dependencies and load model weights the first time they are needed.
+"""
+
+import os
+import random
+import threading
+import time
+import numpy as np
+
+# Backend used when none is given on the command line or in the EMOTION_BACKEND setting
+DEFAULT_BACKEND = "simulated"
+
+# Seconds before a failed background load is tried again, doubling after every failure up to the maximum
+LOAD_RETRY_DELAY = 5.0
+MAX_LOAD_RETRY_DELAY = 300.0
+
+# name -> factory function; factories import backend modules lazily
+_BACKENDS = {}
+
+def register_backend(name):
+    """
+    Decorator registering a backend factory under a name
+
+    Args:
+        name (str): Name used to select the backend in config or on the command line
+    """
+    def decorator(factory):
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+def available_backends():
+    """
+    Get the names of all registered backends
+
+    Returns:
+        list: Backend names
+    """
+    return list(_BACKENDS.keys())
+
+def create_backend(name=None, **options):
+    """
+    Create an emotion backend without loading its model
+
+    Args:
+        name (str): Backend name, defaults to the EMOTION_BACKEND setting or DEFAULT_BACKEND
+        **options: Backend specific options
+
+    Returns:
+        EmotionBackend: The backend instance
+    """
+    name = name or os.getenv("EMOTION_BACKEND", DEFAULT_BACKEND)
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown emotion backend '{name}'. Available backends: {', '.join(available_backends())}")
+    return _BACKENDS[name](**options)
+
+def top_emotion(probabilities):
+    """
+    Get the most likely emotion from a probability dict
+
+    Args:
+        probabilities (dict): {emotion: probability}
+
+    Returns:
+        str: The emotion with the highest probability, or None if there are no probabilities
+    """
+    if not probabilities:
+        return None
+    return max(probabilities, key=probabilities.get)
+
+class EmotionBackend:
+    """
+    Base class for emotion backends
+
+    Subclasses implement _load() and predict_batch(). Face crops are collected
+    by add_face() and classified in batches of batch_size.
+    """
+    name = "base"
+    labels = []
+
+    def __init__(self, batch_size=1):
+        self.batch_size = max(1, batch_size)
+        self.loaded = False
+        self.load_error = None
+        self.load_failures = 0
+        self.retry_load_at = 0.0
+        self.load_thread = None
+        self.load_lock = threading.Lock()
+
+        # Face crops waiting for the next forward pass
+        self.pending_crops = []
+        self.latest_probabilities = None
+
+        # Buffer reuse mode: add_face() preprocesses into per-slot scratch arrays instead of new ones
+        self.reuse_buffers = False
+        self.scratch_buffers = {}
+
+    def load(self):
+        """
+        Import dependencies and load the model, once
+        """
+        with self.load_lock:
+            if self.loaded:
+                return
+            start = time.time()
+            self._load()
+            self.loaded = True
+            print(f"Emotion backend '{self.name}' loaded in {time.time() - start:.1f}s")
+
+    def start_loading(self):
+        """
+        Load the model on a background thread so the caller can keep showing frames
+
+        After a failed load this does nothing until the retry delay has passed.
+        """
+        if self.loaded or self.load_thread is not None or time.monotonic() < self.retry_load_at:
+            return
+
+        print(f"Loading emotion backend '{self.name}' in the background...")
+        self.load_thread = threading.Thread(target=self._load_in_background, name="backend-loader", daemon=True)
+        self.load_thread.start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+            self.load_error = None
+        except Exception as e:
+            self.load_error = e
+            self.load_failures += 1
+            delay = min(MAX_LOAD_RETRY_DELAY, LOAD_RETRY_DELAY * 2 ** (self.load_failures - 1))
+            self.retry_load_at = time.monotonic() + delay
+            print(f"Could not load emotion backend '{self.name}': {e} - retrying in {delay:.0f}s")
+        finally:
+            # Let the next start_loading() try again (after the retry delay)
+            self.load_thread = None
+
+    @property
+    def ready(self):
+        """
+        bool: True once the model is loaded and predictions can be made
+        """
+        return self.loaded
+
+    def _load(self):
+        """
+        Load the model - override in subclasses with heavy dependencies
+        """
+
+    def preprocess(self, gray, face, slot=None):
+        """
+        Crop and prepare a face for the model
+
+        Args:
+            gray: Grayscale frame
+            face (tuple): (x, y, w, h) face box
+            slot (int): Batch position to reuse a scratch array for (buffer reuse mode only)
+
+        Returns:
+            The preprocessed crop
+        """
+        x, y, w, h = face
+        crop = gray[y:y+h, x:x+w]
+        if slot is None or not self.reuse_buffers:
+            return crop
+
+        # The frame buffer is overwritten by the next frame, so queued crops need their own copy
+        out = self.scratch(("crop", slot), crop.shape, crop.dtype)
+        out[...] = crop
+        return out
+
+    def scratch(self, key, shape, dtype=np.uint8):
+        """
+        Get a reusable scratch array, grown when a larger one is needed
+
+        Args:
+            key: Identifies the buffer, e.g. ("crop", slot)
+            shape (tuple): Shape needed
+            dtype: Element type (default: uint8)
+
+        Returns:
+            numpy.ndarray: A view of the buffer with exactly the requested shape
+        """
+        buffer = self.scratch_buffers.get(key)
+        if (buffer is None or buffer.dtype != dtype or buffer.ndim != len(shape)
+                or any(have < need for have, need in zip(buffer.shape, shape))):
+            if buffer is not None and buffer.dtype == dtype and buffer.ndim == len(shape):
+                shape_to_allocate = tuple(max(have, need) for have, need in zip(buffer.shape, shape))
+            else:
+                shape_to_allocate = tuple(shape)
+            buffer = np.empty(shape_to_allocate, dtype)
+            self.scratch_buffers[key] = buffer
+        return buffer[tuple(slice(0, size) for size in shape)]
+
+    def predict_batch(self, crops):
+        """
+        Classify several preprocessed crops at once
+
+        Args:
+            crops (list): Preprocessed crops from preprocess()
+
+        Returns:
+            list: One dict of {emotion: probability} per crop
+        """
+        raise NotImplementedError
+
+    def add_face(self, gray, face):
+        """
+        Queue the face from a frame and classify the queue once a full batch is collected
+
+        Returns None while the model is still loading, so frames can be shown
+        before any model has been imported.
+
+        Args:
+            gray: Grayscale frame
+            face (tuple): (x, y, w, h) face box
+
+        Returns:
+            dict: Latest {emotion: probability} averaged over the last batch, or None before the first batch
+        """
+        if not self.ready:
+            self.start_loading()
+            return None
+
+        self.pending_crops.append(self.preprocess(gray, face, slot=len(self.pending_crops)))
+        if len(self.pending_crops) < self.batch_size:
+            return self.latest_probabilities
+
+        results = self.predict_batch(self.pending_crops)
+        self.pending_crops = []
+
+        # Average over the frames in the batch - they all show the same face
+        self.latest_probabilities = {
+            label: sum(result.get(label, 0.0) for result in results) / len(results)
+            for label in self.labels
+        }
+        return self.latest_probabilities
+
+    def reset(self):
+        """
+        Drop queued crops, e.g. when the face is lost
+        """
+        self.pending_crops = []
+        self.latest_probabilities = None
+
+class SimulatedBackend(EmotionBackend):
+    """
+    Picks a random emotion every few seconds - the original demo behaviour
+    """
+    name = "simulated"
+
+    def __init__(self, emotions=None, change_interval=15, batch_size=1):
+        super().__init__(batch_size=1)
+        self.labels = list(emotions or ['happy', 'sad', 'angry', 'neutral', 'surprise'])
+        self.change_interval = change_interval
+        self.current_emotion = 'neutral'
+        self.last_emotion_time = time.time()
+        self.loaded = True
+
+    def predict_batch(self, crops):
+        current_time = time.time()
+        if current_time - self.last_emotion_time > self.change_interval:
+            self.current_emotion = random.choice(self.labels)
+            self.last_emotion_time = current_time
+
+        probabilities = {label: 0.0 for label in self.labels}
+        probabilities[self.current_emotion] = 1.0
+        return [probabilities for _ in crops]
+
+    def reset(self):
+        # The simulated emotion doesn't depend on the face, so keep it across face losses
+        self.pending_crops = []
+
+class HaarHeuristicBackend(EmotionBackend):
+    """
+    Rough emotion cues from OpenCV's smile and eye cascades - no model download needed
+    """
+    name = "haar"
+    labels = ['happy', 'surprise', 'neutral']
+
+    def __init__(self, batch_size=1):
+        super().__init__(batch_size)
+        self.smile_cascade = None
+        self.eye_cascade = None
+
+    def _load(self):
+        import cv2
+        self.smile_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_smile.xml')
+        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+    def predict_batch(self, crops):
+        return [self._predict_one(crop) for crop in crops]
+
+    def _predict_one(self, face):
+        h, w = face.shape[:2]
+
+        # Smiles are in the lower half of the face, eyes in the upper half
+        smiles = self.smile_cascade.detectMultiScale(face[h//2:, :], 1.7, 20)
+        eyes = self.eye_cascade.detectMultiScale(face[:h//2, :], 1.1, 10)
+
+        # Wide open eyes are taller relative to the face
+        eye_openness = max((eh / h for (_, _, _, eh) in eyes), default=0.0)
+
+        scores = {'happy': 0.1, 'surprise': 0.1, 'neutral': 0.5}
+        if len(smiles) > 0:
+            scores['happy'] += 1.0
+        if eye_openness > 0.22:
+            scores['surprise'] += 1.0
+
+        total = sum(scores.values())
+        return {label: score / total for label, score in scores.items()}
+
+class OnnxEmotionBackend(EmotionBackend):
+    """
+    Emotion model in ONNX format (e.g. FER+ emotion-ferplus-8.onnx) run through cv2.dnn
+    """
+    name = "onnx"
+
+    # Output order of the FER+ model, mapped onto the labels used by the player
+    ferplus_labels = ['neutral', 'happy', 'surprise', 'sad', 'angry', 'disgust', 'fear', 'disgust']
+    labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+    def __init__(self, model_path=None, batch_size=4):
+        super().__init__(batch_size)
+        self.model_path = model_path or os.getenv("EMOTION_ONNX_MODEL", os.path.join("models", "emotion-ferplus-8.onnx"))
+        self.input_size = (64, 64)
+        self.net = None
+
+    def _load(self):
+        import cv2
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"ONNX emotion model not found at {self.model_path}")
+        self.net = cv2.dnn.readNetFromONNX(self.model_path)
+
+    def preprocess(self, gray, face, slot=None):
+        import cv2
+        x, y, w, h = face
+        out = self.scratch(("crop", slot), self.input_size) if slot is not None and self.reuse_buffers else None
+        return cv2.resize(gray[y:y+h, x:x+w], self.input_size, dst=out, interpolation=cv2.INTER_AREA)
+
+    def predict_batch(self, crops):
+        import cv2
+        import numpy as np
+
+        blob = cv2.dnn.blobFromImages(crops, scalefactor=1.0, size=self.input_size)
+        self.net.setInput(blob)
+        scores = self.net.forward().reshape(len(crops), -1)
+
+        # Softmax over the raw scores
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        scores /= scores.sum(axis=1, keepdims=True)
+
+        results = []
+        for row in scores:
+            probabilities = {label: 0.0 for label in self.labels}
+            for label, score in zip(self.ferplus_labels, row):
+                probabilities[label] += float(score)
+            results.append(probabilities)
+        return results
+
+@register_backend("simulated")
+def _simulated_backend(**options):
+    return SimulatedBackend(**options)
+
+@register_backend("haar")
+def _haar_backend(batch_size=1, **options):
+    return HaarHeuristicBackend(batch_size=batch_size)
+
+@register_backend("deepface")
+def _deepface_backend(batch_size=4, **options):
+    from emotion_classifier import DeepFaceEmotionClassifier
+    return DeepFaceEmotionClassifier(batch_size=batch_size)
+
+@register_backend("onnx")
+def _onnx_backend(batch_size=4, model_path=None, **options):
+    return OnnxEmotionBackend(model_path=model_path, batch_size=batch_size)
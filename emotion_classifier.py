@@ -0,0 +1,79 @@
+"""
+Emotion Classifier Module
+Classifies face crops with the DeepFace emotion model, batching several crops into one forward pass.
+"""
+
+import cv2
+import numpy as np
+from emotion_backends import EmotionBackend
+
+# Output order of the DeepFace emotion model
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+class DeepFaceEmotionClassifier(EmotionBackend):
+    name = "deepface"
+    labels = EMOTION_LABELS
+
+    def __init__(self, batch_size=4):
+        """
+        Initialize the classifier
+
+        DeepFace and TensorFlow are only imported when the model is loaded.
+
+        Args:
+            batch_size (int): Number of face crops collected before running the model (default: 4)
+        """
+        super().__init__(batch_size)
+        self.input_size = (48, 48)
+        self.model = None
+
+    def _load(self):
+        """
+        Load the DeepFace emotion model
+        """
+        from deepface import DeepFace
+        self.model = DeepFace.build_model("Emotion")
+
+    def preprocess(self, gray, face, slot=None):
+        """
+        Crop a face from a grayscale frame and prepare it for the model
+
+        Args:
+            gray: Grayscale frame
+            face (tuple): (x, y, w, h) face box
+            slot (int): Batch position to reuse scratch arrays for (buffer reuse mode only)
+
+        Returns:
+            numpy.ndarray: 48x48 float32 image scaled to [0, 1]
+        """
+        x, y, w, h = face
+        crop = gray[y:y+h, x:x+w]
+        if slot is None or not self.reuse_buffers:
+            crop = cv2.resize(crop, self.input_size, interpolation=cv2.INTER_AREA)
+            return crop.astype(np.float32) / 255.0
+
+        # Resize into a shared scratch image, then scale into this slot's own float buffer
+        resized = cv2.resize(crop, self.input_size, dst=self.scratch("resized", self.input_size),
+                             interpolation=cv2.INTER_AREA)
+        out = self.scratch(("crop", slot), self.input_size, np.float32)
+        np.multiply(resized, 1.0 / 255.0, out=out)
+        return out
+
+    def predict_batch(self, crops):
+        """
+        Run one forward pass over several preprocessed face crops
+
+        Args:
+            crops (list): Preprocessed crops from preprocess()
+
+        Returns:
+            list: One dict of {emotion: probability} per crop
+        """
+        if not crops:
+            return []
+
+        self.load()
+        batch = np.stack(crops)[..., np.newaxis]
+        predictions = self.model.predict(batch, batch_size=len(crops), verbose=0)
+
+        return [dict(zip(self.labels, (float(p) for p in row))) for row in predictions]
@@ -4,84 +4,237 @@ Uses OpenCV to detect faces and basic emotion cues from webcam input.
 """
 
 import cv2
-import numpy as np
-import random
 import time
+from frame_grabber import LatestFrameGrabber
+from face_tracker import FaceTracker
+from face_detectors import FaceDetector, create_detector, largest_face
+from emotion_backends import create_backend, top_emotion
+from metrics import time_stage
+from frame_sources import open_source
 
 class EmotionDetector:
-    def __init__(self, camera_index=0):
+    # Mapping of emotions to display colors (BGR format)
+    emotion_colors = {
+        'happy': (0, 255, 255),     # Yellow
+        'sad': (255, 0, 0),         # Blue
+        'angry': (0, 0, 255),       # Red
+        'neutral': (255, 255, 255), # White
+        'surprise': (0, 165, 255)   # Orange
+    }
+    
+    def __init__(self, camera_index=0, threaded_capture=False, buffer_size=2,
+                 track_faces=False, detect_interval=5, classifier=None, headless=False, max_speed=False,
+                 reuse_buffers=False, face_detector=None):
         """
         Initialize the emotion detector with camera feed
         
         Args:
-            camera_index (int): Index of the camera to use (default: 0 for built-in webcam)
+            camera_index: Index of the camera to use (default: 0 for built-in webcam), or a video file,
+                image directory or RTSP/HTTP stream URL (see frame_sources.open_source)
+            threaded_capture (bool): Read frames on a background thread and always use the newest one
+            buffer_size (int): Number of frames kept by the background reader (default: 2)
+            track_faces (bool): Run the full face detector only every few frames and track the face in between
+            detect_interval (int): Frames between full detections when tracking (default: 5)
+            classifier: Emotion backend from emotion_backends.create_backend(); defaults to
+                simulated emotions. Its model is loaded in the background on first use.
+            headless (bool): Don't draw on frames or open windows (for running as a service)
+            max_speed (bool): Read video files and image directories as fast as possible instead of in real time
+            reuse_buffers (bool): Decode frames, convert to grayscale and prepare face crops into preallocated
+                arrays instead of new ones every frame. A returned frame is only valid until the next call.
+            face_detector: Face detector name (see face_detectors.available_detectors) or a FaceDetector
+                (default: FACE_DETECTOR setting or the Haar cascade)
         """
-        self.cap = cv2.VideoCapture(camera_index)
+        self.headless = headless
+        
+        self.cap = open_source(camera_index, max_speed=max_speed)
         if not self.cap.isOpened():
-            raise ValueError("Could not open camera. Please check your webcam connection.")
+            raise ValueError(f"Could not open {self.cap!r}. Please check your webcam connection or source.")
+        
+        # Preallocated frame buffers, sized on the first frame
+        self.reuse_buffers = reuse_buffers
+        self.frame_buffer = None
+        self.gray_buffer = None
         
-        # Load the face cascade for face detection
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Optional background reader so slow detection doesn't build up camera latency
+        self.grabber = None
+        if threaded_capture:
+            self.grabber = LatestFrameGrabber(self.cap, buffer_size, reuse_buffers=reuse_buffers).start()
         
-        # Mapping of emotions to display colors (BGR format)
-        self.emotion_colors = {
-            'happy': (0, 255, 255),     # Yellow
-            'sad': (255, 0, 0),         # Blue
-            'angry': (0, 0, 255),       # Red
-            'neutral': (255, 255, 255), # White
-            'surprise': (0, 165, 255)   # Orange
-        }
+        # Load the face detector
+        if not isinstance(face_detector, FaceDetector):
+            face_detector = create_detector(face_detector)
+        face_detector.load()
+        self.face_detector = face_detector
+        
+        # Optional tracker that avoids a full-frame detection on every frame
+        self.tracker = FaceTracker(self.face_detector, detect_interval) if track_faces else None
         
         # Available emotions
         self.emotions = list(self.emotion_colors.keys())
         
         # For the simplified version, we'll use time-based emotion changes
-        self.last_emotion_time = time.time()
         self.emotion_change_interval = 15  # seconds
         self.current_emotion = 'neutral'
         
+        # Emotion classification on the detected face crops
+        if classifier is None:
+            classifier = create_backend("simulated", emotions=self.emotions,
+                                        change_interval=self.emotion_change_interval)
+        self.classifier = classifier
+        self.classifier.reuse_buffers = reuse_buffers
+        self.last_probabilities = None
+        self.last_face = None
+        
+        # Set when a video file or image directory has no more frames
+        self.ended = False
+        
+        # Seconds the last read waited for its frame - not compute time, so the scheduler leaves it out
+        self.read_seconds = 0.0
+        
         # Print initialization message
         print("Emotion detector initialized. Accessing camera feed...")
     
-    def detect_emotion(self):
+    def read_frame(self):
         """
-        Capture a frame from the webcam and simulate emotion detection
+        Read the next frame from the camera, or the newest one when using threaded capture
         
         Returns:
-            tuple: (frame, emotion) - The captured frame and the simulated emotion
+            The captured frame, or None if no frame could be read
         """
-        ret, frame = self.cap.read()
+        read_start = time.perf_counter()
+        with time_stage("read"):
+            if self.grabber is not None:
+                ret, frame = self.grabber.read()
+            elif self.reuse_buffers:
+                # Decode into the previous frame's array
+                ret, frame = self.cap.read(self.frame_buffer)
+                if ret:
+                    self.frame_buffer = frame
+            else:
+                ret, frame = self.cap.read()
+        self.read_seconds = time.perf_counter() - read_start
+        
         if not ret:
-            print("Failed to capture frame from camera")
-            return None, None
+            if getattr(self.cap, "ended", False):
+                if not self.ended:
+                    print(f"End of {self.cap!r}")
+                self.ended = True
+            else:
+                print("Failed to capture frame from camera")
+            return None
         
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+    
+    def to_gray(self, frame):
+        """
+        Convert a frame to grayscale, into the preallocated buffer when reusing buffers
         
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        Args:
+            frame: BGR frame
         
-        # For demo purposes, change the emotion every few seconds
-        current_time = time.time()
-        if current_time - self.last_emotion_time > self.emotion_change_interval:
-            self.current_emotion = random.choice(self.emotions)
-            self.last_emotion_time = current_time
-            print(f"Emotion changed to: {self.current_emotion}")
+        Returns:
+            Grayscale frame
+        """
+        if not self.reuse_buffers:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        # OpenCV reallocates the buffer itself if the frame size changed
+        self.gray_buffer = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray_buffer)
+        return self.gray_buffer
+    
+    def detect_largest_face(self, frame, gray=None):
+        """
+        Find the largest face in a frame
+        
+        Args:
+            frame: BGR frame
+            gray: Grayscale version of the frame, if already converted
+        
+        Returns:
+            tuple: (x, y, w, h) of the largest face, or None if no face was found
+        """
+        if self.tracker is not None:
+            return self.tracker.update(frame, gray)
         
-        # If at least one face is detected
-        if len(faces) > 0:
-            # Use the largest face for visualization
-            largest_face = max(faces, key=lambda face: face[2] * face[3])
+        return largest_face(self.face_detector.detect(frame, gray=gray))
+    
+    def detect_emotion(self, run_detection=True):
+        """
+        Capture a frame from the webcam and detect the emotion
+        
+        The per-class probabilities from the emotion backend are kept in
+        self.last_probabilities.
+        
+        Args:
+            run_detection (bool): Run face detection and classification on this frame.
+                If False, the last result is drawn on the new frame instead.
+        
+        Returns:
+            tuple: (frame, emotion) - The captured frame and the detected emotion
+        """
+        frame = self.read_frame()
+        if frame is None:
+            return None, None
+        
+        if run_detection:
+            # Convert to grayscale for face detection
+            with time_stage("convert"):
+                gray = self.to_gray(frame)
+            
+            # Detect the largest face (tracked between full detections if enabled)
+            with time_stage("detect_faces"):
+                largest_face = self.detect_largest_face(frame, gray)
+            
+            # Classify the face crop
+            with time_stage("classify"):
+                self._classify_face(gray, largest_face)
+            self.last_face = largest_face
+        else:
+            largest_face = self.last_face
+        
+        # If a face is detected, use it for visualization
+        if largest_face is not None:
             x, y, w, h = largest_face
             
+            # The backend may still be loading or collecting its first batch
+            if self.last_probabilities is None:
+                return frame, None
+            
+            if self.headless:
+                return frame, self.current_emotion
+            
             # Draw a rectangle around the face
-            color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            with time_stage("draw"):
+                color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
             
             return frame, self.current_emotion
         
         return frame, None
     
+    def _classify_face(self, gray, face):
+        """
+        Feed the face crop to the classifier and update the current emotion
+        
+        Args:
+            gray: Grayscale frame
+            face (tuple): (x, y, w, h) face box, or None if no face was found
+        """
+        if face is None:
+            self.classifier.reset()
+            self.last_probabilities = None
+            return
+        
+        probabilities = self.classifier.add_face(gray, face)
+        if probabilities is None:
+            return
+        
+        self.last_probabilities = probabilities
+        emotion = top_emotion(probabilities)
+        if emotion != self.current_emotion:
+            self.current_emotion = emotion
+            print(f"Emotion changed to: {self.current_emotion}")
+    
     def display_emotion(self, frame, emotion):
         """
         Display the detected emotion text on the frame
@@ -90,11 +243,12 @@ class EmotionDetector:
             frame: The frame to display the emotion on
             emotion (str): The detected emotion
         """
-        if frame is not None and emotion is not None:
+        if frame is not None and emotion is not None and not self.headless:
             # Display the emotion text
-            color = self.emotion_colors.get(emotion, (255, 255, 255))
-            cv2.putText(frame, f"Emotion: {emotion}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
+            with time_stage("draw"):
+                color = self.emotion_colors.get(emotion, (255, 255, 255))
+                cv2.putText(frame, f"Emotion: {emotion}", (10, 30), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
     
     def show_frame(self, frame):
         """
@@ -103,8 +257,9 @@ class EmotionDetector:
         Args:
             frame: The frame to display
         """
-        if frame is not None:
-            cv2.imshow('Emotion-Based Music Player', frame)
+        if frame is not None and not self.headless:
+            with time_stage("display"):
+                cv2.imshow('Emotion-Based Music Player', frame)
     
     def should_quit(self):
         """
@@ -113,12 +268,19 @@ class EmotionDetector:
         Returns:
             bool: True if the user pressed 'q', False otherwise
         """
-        return cv2.waitKey(1) & 0xFF == ord('q')
+        with time_stage("wait_key"):
+            key = cv2.waitKey(1)
+        return key & 0xFF == ord('q')
     
     def release(self):
         """
         Release the camera and close all windows
         """
+        if self.grabber is not None:
+            self.grabber.stop()
         self.cap.release()
+        if self.headless:
+            print("Camera released")
+            return
         cv2.destroyAllWindows()
         print("Camera released and windows closed")
@@ -8,10 +8,28 @@ import os
 import sys
 import time
 import random
+import argparse
 import cv2
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
+from frame_grabber import LatestFrameGrabber
+from face_tracker import FaceTracker
+from face_detectors import FaceDetector, available_detectors, create_detector, largest_face
+from emotion_backends import available_backends, create_backend, top_emotion
+from spotify_dispatcher import SpotifyDispatcher
+from playlist_cache import PlaylistCache
+from device_registry import DeviceRegistry
+from playback_prewarm import PlaybackPrewarmer
+from spotify_client import create_spotify_client, is_transient_error
+from token_manager import SharedTokenCache, TokenManager
+from emotion_smoother import EmotionSmoother
+from detection_scheduler import DetectionScheduler
+from metrics import PLAYBACK_SWITCHES, record_frame, start_exporters, time_stage
+from service import ShutdownSignal
+from frame_sources import open_source
+from startup import StartupOrchestrator
+from track_catalog import load_catalog
 
 # --- Configuration ---
 # Spotify credentials - can be embedded for global distribution
@@ -20,17 +38,37 @@ DEFAULT_CLIENT_SECRET = "85df3a86219440c4ba14e6252f5af295"
 DEFAULT_REDIRECT_URI = "http://127.0.0.1:8888/callback"
 
 class EmotionMusicPlayer:
-    def __init__(self):
+    def __init__(self, threaded_capture=False, track_faces=False, detect_interval=5, classifier=None,
+                 min_dwell=10.0, frame_budget_ms=None, cpu_limit=None, headless=False, source=0, max_speed=False,
+                 reuse_buffers=False, catalog_path=None, face_detector=None):
         # Load credentials
         load_dotenv()  # Try to load from .env file first
         self.client_id = os.getenv("SPOTIFY_CLIENT_ID", DEFAULT_CLIENT_ID)
         self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET", DEFAULT_CLIENT_SECRET)
         self.redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI", DEFAULT_REDIRECT_URI)
 
-        # Camera and face detection properties
-        self.camera_index = 0
+        # Camera and face detection properties (the source can also be a video file, image directory or stream URL)
+        self.source = source
+        self.max_speed = max_speed
         self.cap = None
-        self.face_cascade = None
+        self.ended = False  # set when a video file or image directory has no more frames
+        self.read_seconds = 0.0  # time the last read waited for its frame, left out of the frame budget
+        self.face_detector_option = face_detector
+        self.face_detector = None
+        self.threaded_capture = threaded_capture
+        self.grabber = None
+        self.track_faces = track_faces
+        self.detect_interval = detect_interval
+        self.tracker = None
+        
+        # Preallocated frame buffers (sized on the first frame) instead of new arrays every frame
+        self.reuse_buffers = reuse_buffers
+        self.frame_buffer = None
+        self.gray_buffer = None
+        
+        # Headless: no annotation or preview window, stopped by signals instead of 'q'
+        self.headless = headless
+        self.shutdown = None
         
         # Emotion properties
         self.current_emotion = "neutral"
@@ -49,11 +87,43 @@ class EmotionMusicPlayer:
         # Available emotions to cycle through
         self.emotions = list(self.emotion_colors.keys())
         
+        # Emotion backend for the face crops - simulated emotions unless another one is given.
+        # run() loads its model alongside the camera; otherwise it loads when the first face is seen.
+        if classifier is None:
+            classifier = create_backend("simulated", emotions=self.emotions,
+                                        change_interval=self.emotion_change_interval)
+        self.classifier = classifier
+        self.classifier.reuse_buffers = reuse_buffers
+        self.last_probabilities = None
+        self.last_face = None
+        
+        # Smooths detections so one-frame flips don't switch the music
+        self.smoother = EmotionSmoother(min_dwell=min_dwell)
+        
+        # Runs detection less often when the loop is over its frame-time or CPU budget
+        self.scheduler = DetectionScheduler(frame_budget_ms=frame_budget_ms, cpu_percent=cpu_limit)
+        
         # Spotify properties
         self.sp = None
         self.current_playlist = None
         self.device_id = None
         self.demo_mode = False
+        self.playlist_cache = None
+        self.device_registry = None
+        self.prewarmer = None
+        self.token_manager = None
+        
+        # Local track catalog - when there is one, tracks are matched to the detected mood
+        # instead of picking one of the emotion's playlists
+        self.catalog = load_catalog(catalog_path)
+        
+        # Set by run() - playback waits for its Spotify step while the video loop is already going
+        self.startup = None
+        
+        # Playback calls run on a background thread so the video loop never waits on Spotify
+        self.dispatcher = SpotifyDispatcher().start()
+        self.requested_emotion = None
+        self.playing_emotion = None
         
         # Emotion playlists
         self.emotion_playlists = {
@@ -84,19 +154,23 @@ class EmotionMusicPlayer:
             ]
         }
         
-    def init_camera(self):
-        """Initialize the camera and face detection"""
+    def init_camera(self, with_face_detection=True):
+        """Initialize the camera and face detection (the latter can be left to init_face_detection)"""
         try:
-            self.cap = cv2.VideoCapture(self.camera_index)
-            if not self.cap.isOpened():
-                print("Warning: Could not open camera. Running in demo mode without camera.")
-                self.cap = None
+            cap = open_source(self.source, max_speed=self.max_speed)
+            if not cap.isOpened():
+                print(f"Warning: Could not open {cap!r}. Running in demo mode without camera.")
                 return False
-                
-            # Load the face cascade for face detection
-            face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            self.face_cascade = cv2.CascadeClassifier(face_cascade_path)
             
+            if with_face_detection:
+                self.init_face_detection()
+            
+            # Read frames on a background thread if requested
+            if self.threaded_capture:
+                self.grabber = LatestFrameGrabber(cap, reuse_buffers=self.reuse_buffers).start()
+            
+            # Set last - the video loop starts reading as soon as it sees the camera
+            self.cap = cap
             print("Camera initialized successfully")
             return True
         except Exception as e:
@@ -104,32 +178,68 @@ class EmotionMusicPlayer:
             self.cap = None
             return False
     
-    def init_spotify(self):
-        """Initialize Spotify connection"""
+    def init_face_detection(self):
+        """Load the face detector (and the tracker built on it)"""
+        face_detector = self.face_detector_option
+        if not isinstance(face_detector, FaceDetector):
+            face_detector = create_detector(face_detector)
+        face_detector.load()
+        print(f"Face detector: {face_detector.describe()}")
+        
+        # Track the face between full detections if requested
+        if self.track_faces:
+            self.tracker = FaceTracker(face_detector, self.detect_interval)
+        self.face_detector = face_detector
+        return True
+    
+    def _load_emotion_model(self):
+        """Load the emotion model now instead of when the first face shows up"""
+        self.classifier.load()
+        return True
+    
+    def init_spotify(self, sp=None):
+        """Initialize Spotify connection, or use a ready-made client (e.g. one pointed at a test server)"""
         try:
             print("Connecting to Spotify...")
             
-            # Authentication scope
-            scope = "user-read-playback-state,user-modify-playback-state"
-            
-            # Create the OAuth manager
-            auth_manager = SpotifyOAuth(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                redirect_uri=self.redirect_uri,
-                scope=scope,
-                open_browser=True,
-                show_dialog=True,
-                cache_path=".spotify_cache"
-            )
-            
-            # Create the Spotify client
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            if sp is None:
+                # Authentication scope
+                scope = "user-read-playback-state,user-modify-playback-state"
+                
+                # Create the OAuth manager - the token cache can be shared with other processes
+                auth_manager = SpotifyOAuth(
+                    client_id=self.client_id,
+                    client_secret=self.client_secret,
+                    redirect_uri=self.redirect_uri,
+                    scope=scope,
+                    open_browser=True,
+                    show_dialog=True,
+                    cache_handler=SharedTokenCache(".spotify_cache")
+                )
+                
+                # Refresh the token in the background before it expires, so no request waits for it
+                self.token_manager = TokenManager(auth_manager).start()
+                
+                # Create the Spotify client (pooled connections, rate limited, retries throttled requests)
+                sp = create_spotify_client(auth_manager=self.token_manager)
+            self.sp = sp
             
             # Check user info
             user = self.sp.current_user()
             print(f"Connected to Spotify as: {user['display_name']}")
             
+            # Warm the playlist metadata cache in the background so switches don't fetch it
+            self.playlist_cache = PlaylistCache(self.sp)
+            if self.catalog is None:
+                self.playlist_cache.prefetch(uri for uris in self.emotion_playlists.values() for uri in uris)
+            
+            # Keep the device list cached and refreshed in the background
+            self.device_registry = DeviceRegistry(self.sp).start()
+            
+            # Resolve the playlist and device for the emotion expected next while the current one plays
+            self.prewarmer = PlaybackPrewarmer(self._choose_playlist if self.catalog is None else lambda emotion: None,
+                                               self.device_registry, playlist_cache=self.playlist_cache)
+            
             # Check for active devices
             self._check_devices()
             
@@ -146,38 +256,32 @@ class EmotionMusicPlayer:
             return
             
         try:
-            # Check for active devices
-            devices = self.sp.devices()
+            # Check for active devices (cached by the registry)
+            device = self.device_registry.get_device()
             
-            if not devices['devices']:
+            if device is None:
                 print("No active Spotify devices found.")
                 print("Please open Spotify on your phone or computer and play/pause a song.")
                 print("Waiting for an active device...")
                 
-                # Wait for device to become available
-                for i in range(3):
-                    print(f"Checking for devices (attempt {i+1}/3)...")
-                    time.sleep(2)
-                    devices = self.sp.devices()
-                    if devices['devices']:
-                        break
+                # Wait for the background refresh to find a device
+                device = self.device_registry.wait_for_device(timeout=6)
                 
-                if not devices['devices']:
+                if device is None:
                     print("No Spotify devices found. Running in demo mode.")
                     self.demo_mode = True
                     return
             
-            # Use the first available device
-            self.device_id = devices['devices'][0]['id']
-            device_name = devices['devices'][0]['name']
-            print(f"Using Spotify device: {device_name}")
+            # Use the active (or first available) device
+            self.device_id = device['id']
+            print(f"Using Spotify device: {device['name']}")
             
         except Exception as e:
             print(f"Error checking for Spotify devices: {e}")
             self.demo_mode = True
     
-    def detect_face_and_emotion(self):
-        """Detect face and simulate emotion detection"""
+    def detect_face_and_emotion(self, run_detection=True):
+        """Detect face and emotion (reuses the last result on frames where run_detection is False)"""
         if self.cap is None:
             # In demo mode without camera
             current_time = time.time()
@@ -188,48 +292,127 @@ class EmotionMusicPlayer:
                 
             return None, self.current_emotion
             
-        # Read frame from camera
-        ret, frame = self.cap.read()
+        if self.face_detector is None:
+            # The face detector is still loading - show frames without detection until it's there
+            run_detection = False
+        
+        # Read frame from camera (newest frame when using threaded capture)
+        read_start = time.perf_counter()
+        with time_stage("read"):
+            if self.grabber is not None:
+                ret, frame = self.grabber.read()
+            elif self.reuse_buffers:
+                ret, frame = self.cap.read(self.frame_buffer)
+                if ret:
+                    self.frame_buffer = frame
+            else:
+                ret, frame = self.cap.read()
+        self.read_seconds = time.perf_counter() - read_start
         if not ret:
-            print("Failed to capture frame from camera")
+            if getattr(self.cap, "ended", False):
+                if not self.ended:
+                    print(f"End of {self.cap!r}")
+                self.ended = True
+            else:
+                print("Failed to capture frame from camera")
             return None, None
             
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # For demo purposes, change emotion every few seconds
-        current_time = time.time()
-        if current_time - self.last_emotion_time > self.emotion_change_interval:
-            self.current_emotion = random.choice(self.emotions)
-            self.last_emotion_time = current_time
-            print(f"Detected emotion: {self.current_emotion}")
-        
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        if run_detection:
+            # Convert to grayscale for face detection
+            with time_stage("convert"):
+                if self.reuse_buffers:
+                    self.gray_buffer = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray_buffer)
+                    gray = self.gray_buffer
+                else:
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            
+            # Detect faces (tracked between full detections if enabled)
+            with time_stage("detect_faces"):
+                face = self.detect_largest_face(frame, gray)
+            
+            # Classify the face crop
+            with time_stage("classify"):
+                self._classify_face(gray, face)
+            self.last_face = face
+        else:
+            face = self.last_face
         
         # If faces detected, show on frame
-        if len(faces) > 0:
-            # Use the largest face
-            largest_face = max(faces, key=lambda face: face[2] * face[3])
-            x, y, w, h = largest_face
+        if face is not None:
+            x, y, w, h = face
             
-            # Draw rectangle around face
-            color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            # The backend may still be loading or collecting its first batch
+            if self.last_probabilities is None:
+                return frame, None
             
-            # Display emotion text
-            cv2.putText(frame, f"Emotion: {self.current_emotion}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
+            if self.headless:
+                return frame, self.current_emotion
+            
+            with time_stage("draw"):
+                # Draw rectangle around face
+                color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+                
+                # Display emotion text
+                cv2.putText(frame, f"Emotion: {self.current_emotion}", (10, 30), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2, cv2.LINE_AA)
                         
             return frame, self.current_emotion
         
         return frame, None
     
-    def play_music_for_emotion(self, emotion):
-        """Play music based on the detected emotion"""
-        if emotion is None:
+    def detect_largest_face(self, frame, gray=None):
+        """Find the largest face in a frame (tracked between full detections if enabled)"""
+        if self.tracker is not None:
+            return self.tracker.update(frame, gray)
+        return largest_face(self.face_detector.detect(frame, gray=gray))
+    
+    def _classify_face(self, gray, face):
+        """Feed the face crop to the classifier and update the current emotion"""
+        if face is None:
+            self.classifier.reset()
+            self.last_probabilities = None
             return
-            
+        
+        probabilities = self.classifier.add_face(gray, face)
+        if probabilities is None:
+            return
+        
+        self.last_probabilities = probabilities
+        emotion = top_emotion(probabilities)
+        if emotion != self.current_emotion:
+            self.current_emotion = emotion
+            print(f"Detected emotion: {self.current_emotion}")
+    
+    def _choose_playlist(self, emotion):
+        """Pick a random playlist for an emotion (neutral's if the emotion isn't recognized)"""
+        playlists = self.emotion_playlists.get(emotion, self.emotion_playlists['neutral'])
+        return random.choice(playlists)
+    
+    def prepare_next(self, emotion):
+        """Get playback for the likely next emotion ready in the background, so the switch is one Spotify call"""
+        if self.prewarmer is None or self.demo_mode or emotion is None or emotion == self.requested_emotion:
+            return
+        self.prewarmer.predict(emotion)
+    
+    def play_music_for_emotion(self, emotion, probabilities=None):
+        """Queue playback for the detected emotion (and smoothed probabilities) without blocking the video loop"""
+        if emotion is None or emotion == self.requested_emotion:
+            return
+        
+        # Only the latest pending emotion change is sent to Spotify
+        self.requested_emotion = emotion
+        probabilities = dict(probabilities) if probabilities is not None else None
+        self.dispatcher.submit(self._play_music_for_emotion, emotion, probabilities, key="play_emotion")
+    
+    def _play_music_for_emotion(self, emotion, probabilities=None):
+        """Play music based on the detected emotion (runs on the dispatcher thread)"""
+        if self.startup is not None and not self.startup.done("spotify"):
+            # Spotify is still connecting - wait here rather than in the video loop. A newer
+            # emotion submitted meanwhile replaces this one in the dispatcher queue.
+            print(f"Waiting for Spotify before playing music for: {emotion}")
+            self.startup.wait("spotify")
+        
         if self.demo_mode:
             # Demo mode - just show what would be played
             playlist_names = {
@@ -245,68 +428,131 @@ class EmotionMusicPlayer:
             print(f"[DEMO] Would play: {playlist_name} (Emotion: {emotion})")
             return
             
-        # Skip if emotion hasn't changed
-        if emotion == self.current_emotion and self.current_playlist is not None:
+        # Skip if this emotion is already playing
+        if emotion == self.playing_emotion and self.current_playlist is not None:
             return
             
         try:
-            # Get playlists for this emotion
-            playlists = self.emotion_playlists.get(emotion, self.emotion_playlists['neutral'])
+            # Playlist and device resolved ahead of time if this emotion was predicted
+            prepared = self.prewarmer.take(emotion)
             
-            # Select a random playlist
-            playlist_uri = random.choice(playlists)
+            if self.catalog is not None:
+                # Tracks nearest to the detected mood
+                tracks = self.catalog.recommend(probabilities or emotion)
+                playlist_uri = tracks[0]
+            elif prepared is not None:
+                playlist_uri = prepared['context']
+            else:
+                # Select a random playlist for this emotion
+                playlist_uri = self._choose_playlist(emotion)
             
-            # Play the playlist
-            self.sp.start_playback(device_id=self.device_id, context_uri=playlist_uri)
+            # Play the playlist on the prepared or cached device
+            self.device_id = prepared['device_id'] if prepared is not None else self.device_registry.get_device_id()
+            if self.device_id is None:
+                print("No active Spotify devices found. Please open Spotify on a device.")
+                return
+            with time_stage("spotify_playback"):
+                if self.catalog is not None:
+                    self.sp.start_playback(device_id=self.device_id, uris=tracks)
+                else:
+                    self.sp.start_playback(device_id=self.device_id, context_uri=playlist_uri)
+            PLAYBACK_SWITCHES.inc(emotion=emotion)
             
-            # Get playlist info
-            playlist_info = self.sp.playlist(playlist_uri)
-            print(f"Now playing: {playlist_info['name']} (Emotion: {emotion})")
+            if self.catalog is not None:
+                print(f"Now playing: {len(tracks)} tracks for {self.catalog.describe(probabilities or emotion)} "
+                      f"(Emotion: {emotion})")
+            else:
+                # Get playlist name (cached)
+                playlist_name = self.playlist_cache.get_name(playlist_uri)
+                print(f"Now playing: {playlist_name} (Emotion: {emotion})")
             
             # Update current playlist
             self.current_playlist = playlist_uri
+            self.playing_emotion = emotion
             
         except spotipy.exceptions.SpotifyException as e:
             print(f"Spotify playback error: {e}")
-            if "NO_ACTIVE_DEVICE" in str(e):
+            if is_transient_error(e):
+                # Still rate limited or failing after the client's retries - try again on the next detection
+                self.requested_emotion = None
+            elif "NO_ACTIVE_DEVICE" in str(e):
                 print("Please open Spotify on your device and play/pause a song to activate it.")
-                self._check_devices()
+                
+                # The cached device is gone - refresh right away and let the next detection retry
+                self.device_registry.invalidate()
+                self.requested_emotion = None
             elif "PREMIUM_REQUIRED" in str(e):
                 print("This feature requires Spotify Premium.")
                 self.demo_mode = True
         except Exception as e:
             print(f"Unexpected error: {e}")
-            self.demo_mode = True
+            if is_transient_error(e):
+                # Network trouble - keep real playback and try again on the next detection
+                self.requested_emotion = None
+            else:
+                self.demo_mode = True
     
-    def run(self):
-        """Main application loop"""
+    def run(self, metrics_port=None, metrics_json=None, metrics_interval=10.0):
+        """Main application loop (optionally exporting metrics on a port or to a JSON file)"""
         print("Starting Emotion-Based Music Player...")
-        print("Press 'q' to quit")
         
-        camera_available = self.init_camera()
-        spotify_available = self.init_spotify()
+        if self.headless:
+            self.shutdown = ShutdownSignal().install()
+            print("Running headless - send SIGTERM or press Ctrl+C to quit")
+        else:
+            print("Press 'q' to quit")
         
-        if not camera_available:
-            print("Running without camera in demo mode.")
+        exporters = start_exporters(metrics_port, metrics_json, metrics_interval)
+        
+        # Open the camera, load the cascade and model and connect to Spotify all at once.
+        # The video loop starts as soon as the camera is open; playback waits for Spotify.
+        self.startup = StartupOrchestrator()
+        self.startup.add("camera", lambda: self.init_camera(with_face_detection=False))
+        self.startup.add("face_detection", self.init_face_detection)
+        self.startup.add("emotion_model", self._load_emotion_model)
+        self.startup.add("spotify", self.init_spotify)
+        self.startup.start()
         
-        if not spotify_available:
-            print("Running without Spotify in demo mode.")
-            
         try:
-            while True:
-                # Detect face and emotion
-                frame, emotion = self.detect_face_and_emotion()
+            while self.shutdown is None or not self.shutdown.requested:
+                if not self.startup.done("camera"):
+                    # Nothing to show yet
+                    self.startup.wait("camera", 0.05)
+                    continue
+                
+                # Detect face and emotion (not on every frame if the scheduler is throttling)
+                run_detection = self.scheduler.should_detect()
+                frame_start = time.perf_counter()
+                frame, emotion = self.detect_face_and_emotion(run_detection)
+                # Only compute counts against the budget, not waiting for the camera
+                self.scheduler.record(time.perf_counter() - frame_start - self.read_seconds, run_detection)
+                if self.ended:
+                    break
+                if frame is not None:
+                    record_frame(run_detection)
+                    self.startup.first_frame()
                 
-                # Play music for detected emotion
-                if emotion:
-                    self.play_music_for_emotion(emotion)
+                # Play music for the smoothed emotion
+                if emotion and run_detection:
+                    stable_emotion = self.smoother.update(self.last_probabilities or emotion)
+                    self.play_music_for_emotion(stable_emotion, self.smoother.smoothed)
+                    self.prepare_next(self.smoother.likely_next())
+                
+                if self.headless:
+                    if frame is None:
+                        # No camera (or a camera hiccup) - wait instead of spinning
+                        self.shutdown.wait(1 if self.cap is None else 0.5)
+                    continue
                 
                 # Display the frame if camera is available
                 if frame is not None:
-                    cv2.imshow('Emotion-Based Music Player', frame)
+                    with time_stage("display"):
+                        cv2.imshow('Emotion-Based Music Player', frame)
                     
                     # Check for quit
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                    with time_stage("wait_key"):
+                        key = cv2.waitKey(1)
+                    if key & 0xFF == ord('q'):
                         break
                 else:
                     # If no camera, just wait for interval
@@ -319,12 +565,76 @@ class EmotionMusicPlayer:
             print("\nApplication stopped by user")
             
         finally:
+            # A short input can end while startup steps are still running - let them finish
+            # first so their threads aren't torn down in the middle of OpenCV or Spotify calls
+            self.startup.wait_all(timeout=10.0)
+            
             # Clean up
+            for exporter in exporters:
+                exporter.stop()
+            self.dispatcher.stop()
+            if self.prewarmer is not None:
+                self.prewarmer.stop()
+            if self.token_manager is not None:
+                self.token_manager.stop()
+            if self.device_registry is not None:
+                self.device_registry.stop()
+            if self.grabber is not None:
+                self.grabber.stop()
             if self.cap is not None:
                 self.cap.release()
-            cv2.destroyAllWindows()
+            if not self.headless:
+                cv2.destroyAllWindows()
             print("Application closed")
 
 if __name__ == "__main__":
-    app = EmotionMusicPlayer()
-    app.run()
+    parser = argparse.ArgumentParser(description="Emotion-Based Music Player")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file, image directory or RTSP/HTTP stream URL (default: 0)")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="read video files and image directories as fast as possible instead of in real time")
+    parser.add_argument("--threaded-capture", action="store_true",
+                        help="read camera frames on a background thread and always use the newest one")
+    parser.add_argument("--track-faces", action="store_true",
+                        help="run the full face detector only every few frames and track the face in between")
+    parser.add_argument("--detect-interval", type=int, default=5,
+                        help="frames between full face detections when tracking (default: 5)")
+    parser.add_argument("--backend", choices=available_backends(), default=None,
+                        help="emotion backend (default: EMOTION_BACKEND setting or 'simulated')")
+    parser.add_argument("--batch-size", type=int, default=4,
+                        help="face crops per classifier forward pass (default: 4)")
+    parser.add_argument("--min-dwell", type=float, default=10.0,
+                        help="minimum seconds to keep an emotion before switching music (default: 10)")
+    parser.add_argument("--frame-budget-ms", type=float, default=None,
+                        help="run detection less often to keep the average frame processing time under this budget")
+    parser.add_argument("--cpu-limit", type=float, default=None,
+                        help="run detection less often to keep CPU use under this percentage of one core")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port (/metrics, /metrics.json)")
+    parser.add_argument("--metrics-json", default=None,
+                        help="periodically write metrics as JSON to this file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between JSON metric dumps (default: 10)")
+    parser.add_argument("--reuse-buffers", action="store_true",
+                        help="read and convert frames into preallocated buffers instead of allocating every frame")
+    parser.add_argument("--catalog", default=None,
+                        help="track catalog to match tracks to the detected mood (default: MOODIFY_CATALOG setting "
+                             "or track_catalog.snapshot if it exists, otherwise emotion playlists)")
+    parser.add_argument("--face-detector", choices=available_detectors(), default=None,
+                        help="face detector (default: FACE_DETECTOR setting or 'haar')")
+    parser.add_argument("--detector-width", type=int, default=None,
+                        help="downscale frames to this width for face detection (default: the detector's own)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview window or frame annotation; stop with SIGTERM/SIGINT (for running as a service)")
+    args = parser.parse_args()
+    
+    load_dotenv()  # So EMOTION_BACKEND can be set in the .env file
+    classifier = create_backend(args.backend, batch_size=args.batch_size)
+    app = EmotionMusicPlayer(threaded_capture=args.threaded_capture, track_faces=args.track_faces,
+                             detect_interval=args.detect_interval, classifier=classifier,
+                             min_dwell=args.min_dwell, frame_budget_ms=args.frame_budget_ms,
+                             cpu_limit=args.cpu_limit, headless=args.headless, source=args.source,
+                             max_speed=args.max_speed, reuse_buffers=args.reuse_buffers, catalog_path=args.catalog,
+                             face_detector=create_detector(args.face_detector, input_width=args.detector_width))
+    app.run(metrics_port=args.metrics_port, metrics_json=args.metrics_json,
+            metrics_interval=args.metrics_interval)
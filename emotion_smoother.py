@@ -0,0 +1,119 @@
+"""
+Emotion Smoother Module
+Smooths per-frame emotion probabilities over time and only switches the reported emotion
+when a new one clearly wins and the current one has been held long enough.
+"""
+
+import math
+import time
+
+class EmotionSmoother:
+    def __init__(self, time_constant=1.5, switch_margin=0.15, min_dwell=10.0, min_confidence=0.4):
+        """
+        Initialize the smoother
+
+        Args:
+            time_constant (float): Seconds over which the moving average forgets old frames (default: 1.5)
+            switch_margin (float): How much more probable a new emotion must be than the current one (default: 0.15)
+            min_dwell (float): Minimum seconds to hold an emotion before switching (default: 10)
+            min_confidence (float): Minimum smoothed probability before an emotion is reported (default: 0.4)
+        """
+        self.time_constant = time_constant
+        self.switch_margin = switch_margin
+        self.min_dwell = min_dwell
+        self.min_confidence = min_confidence
+
+        # Exponential moving average of the per-class probabilities, and how much each
+        # one moved in the last update
+        self.smoothed = {}
+        self.trend = {}
+        self.last_update = None
+
+        # The emotion currently reported and since when
+        self.stable_emotion = None
+        self.stable_since = 0.0
+        self.switches = 0
+
+    def update(self, probabilities, timestamp=None):
+        """
+        Add a detection and get the smoothed emotion
+
+        Args:
+            probabilities: {emotion: probability} dict, or a single emotion label
+            timestamp (float): Time of the detection (default: now)
+
+        Returns:
+            str: The stable emotion, or None until one is confident enough
+        """
+        if not probabilities:
+            return self.stable_emotion
+
+        if isinstance(probabilities, str):
+            probabilities = {probabilities: 1.0}
+
+        now = time.time() if timestamp is None else timestamp
+        self._update_average(probabilities, now)
+
+        candidate = max(self.smoothed, key=self.smoothed.get)
+        candidate_score = self.smoothed[candidate]
+        if candidate_score < self.min_confidence or candidate == self.stable_emotion:
+            return self.stable_emotion
+
+        if self.stable_emotion is not None:
+            # Hysteresis: the new emotion must clearly beat the current one...
+            if candidate_score - self.smoothed.get(self.stable_emotion, 0.0) < self.switch_margin:
+                return self.stable_emotion
+            # ...and the current one must have been held for the minimum dwell time
+            if now - self.stable_since < self.min_dwell:
+                return self.stable_emotion
+
+        self.stable_emotion = candidate
+        self.stable_since = now
+        self.switches += 1
+        return self.stable_emotion
+
+    def _update_average(self, probabilities, now):
+        """
+        Blend new probabilities into the moving average, weighting by the time since the last update
+        """
+        if self.last_update is None:
+            self.smoothed = dict(probabilities)
+            self.trend = {}
+            self.last_update = now
+            return
+
+        # Frame-rate independent weight: more time since the last detection means more weight on the new one
+        elapsed = max(0.0, now - self.last_update)
+        alpha = 1.0 - math.exp(-elapsed / self.time_constant) if self.time_constant > 0 else 1.0
+        self.last_update = now
+
+        for label in set(self.smoothed) | set(probabilities):
+            old = self.smoothed.get(label, 0.0)
+            self.smoothed[label] = old + alpha * (probabilities.get(label, 0.0) - old)
+            self.trend[label] = self.smoothed[label] - old
+
+    def likely_next(self, min_probability=0.2):
+        """
+        Guess which emotion the stable one will switch to next, so playback can be prepared early
+
+        Args:
+            min_probability (float): Minimum smoothed probability to be considered (default: 0.2)
+
+        Returns:
+            str: The most probable other emotion that is not falling, or None if none qualifies
+        """
+        candidates = [label for label, p in self.smoothed.items()
+                      if label != self.stable_emotion and p >= min_probability and self.trend.get(label, 0.0) >= 0]
+        if not candidates:
+            return None
+        return max(candidates, key=self.smoothed.get)
+
+    def reset(self):
+        """
+        Forget all history
+        """
+        self.smoothed = {}
+        self.trend = {}
+        self.last_update = None
+        self.stable_emotion = None
+        self.stable_since = 0.0
@@ -0,0 +1,466 @@
+"""
+Face Detectors Module
+Registry of face detectors: OpenCV's Haar and LBP cascades and two DNN detectors (the res10
+SSD and YuNet). They trade accuracy for speed differently on every CPU, so the detector, its
+input resolution and its scale parameters are configurable, and running this module compares
+them on a recorded clip:
+
+    python face_detectors.py clip.mp4 [--detectors haar lbp ssd yunet] [--width 320]
+
+Detectors are not thread-safe - create one per thread.
+"""
+
+import argparse
+import os
+import time
+import cv2
+
+# Detector used when none is given on the command line or in the FACE_DETECTOR setting
+DEFAULT_DETECTOR = "haar"
+
+# name -> factory function
+_DETECTORS = {}
+
+def register_detector(name):
+    """
+    Decorator registering a detector factory under a name
+
+    Args:
+        name (str): Name used to select the detector in config or on the command line
+    """
+    def decorator(factory):
+        _DETECTORS[name] = factory
+        return factory
+    return decorator
+
+def available_detectors():
+    """
+    Get the names of all registered detectors
+
+    Returns:
+        list: Detector names
+    """
+    return list(_DETECTORS.keys())
+
+def create_detector(name=None, **options):
+    """
+    Create a face detector without loading its model
+
+    Args:
+        name (str): Detector name, defaults to the FACE_DETECTOR setting or DEFAULT_DETECTOR
+        **options: Detector options (input_width, scale_factor, min_neighbors, min_size, confidence,
+            nms_threshold, top_k, model_path, ...) - options a detector doesn't use are ignored
+
+    Returns:
+        FaceDetector: The detector instance
+    """
+    name = name or os.getenv("FACE_DETECTOR", DEFAULT_DETECTOR)
+    if name not in _DETECTORS:
+        raise ValueError(f"Unknown face detector '{name}'. Available detectors: {', '.join(available_detectors())}")
+    options = {key: value for key, value in options.items() if value is not None}
+    return _DETECTORS[name](**options)
+
+def largest_face(faces):
+    """
+    Get the largest of the detected faces
+
+    Args:
+        faces (list): (x, y, w, h) boxes
+
+    Returns:
+        tuple: (x, y, w, h) of the largest face, or None if there are none
+    """
+    if len(faces) == 0:
+        return None
+    return max(faces, key=lambda face: face[2] * face[3])
+
+class FaceDetector:
+    """
+    Base class for face detectors
+    """
+    name = None
+
+    # Whether the model works on BGR images (DNN detectors) rather than grayscale (cascades)
+    color = False
+
+    def __init__(self, input_width=None):
+        """
+        Initialize the detector
+
+        Args:
+            input_width (int): Downscale wider images to this width before detecting (boxes are
+                scaled back to the original image), None to detect at full resolution
+        """
+        self.input_width = input_width
+        self.loaded = False
+
+    def load(self):
+        """
+        Load the model if it isn't loaded yet
+
+        Raises:
+            FileNotFoundError: If the model files are missing
+        """
+        if not self.loaded:
+            self._load()
+            self.loaded = True
+
+    def _load(self):
+        pass
+
+    def detect(self, image, min_size=None, max_size=None, gray=None):
+        """
+        Find faces in an image
+
+        Args:
+            image: BGR image (or grayscale, which DNN detectors only get as a three-channel copy)
+            min_size (tuple): Smallest (w, h) face to report, in image pixels
+            max_size (tuple): Largest (w, h) face to report, in image pixels
+            gray: Grayscale version of image if the caller already has one - cascades use it
+                instead of converting again
+
+        Returns:
+            list: (x, y, w, h) boxes as int tuples, in image coordinates
+        """
+        self.load()
+
+        # Hand the model the input it was trained on, converting only when the caller didn't have it
+        if self.color:
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif gray is not None:
+            image = gray
+        elif image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        scale = 1.0
+        if self.input_width and image.shape[1] > self.input_width:
+            scale = self.input_width / image.shape[1]
+            size = (self.input_width, max(1, int(round(image.shape[0] * scale))))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            min_size = _scale_size(min_size, scale)
+            max_size = _scale_size(max_size, scale)
+
+        faces = self._detect(image, min_size, max_size)
+        if scale == 1.0:
+            return [tuple(int(v) for v in face) for face in faces]
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
+
+    def _detect(self, image, min_size, max_size):
+        """
+        Find faces in an image that is already at the input resolution and in the model's color format
+        """
+        raise NotImplementedError
+
+    def describe(self):
+        """
+        Short description of the detector and its settings for log messages
+        """
+        return f"{self.name} (input width {self.input_width or 'full'})"
+
+class CascadeDetector(FaceDetector):
+    """
+    OpenCV cascade classifier (Haar or LBP features) run with detectMultiScale
+    """
+
+    def __init__(self, model_path, input_width=None, scale_factor=1.1, min_neighbors=4, min_size=None):
+        """
+        Args:
+            model_path (str): Cascade XML file
+            input_width (int): See FaceDetector
+            scale_factor (float): How much the search window grows per pyramid level - larger is
+                faster but misses more faces (default: 1.1)
+            min_neighbors (int): Overlapping detections needed to report a face - larger gives fewer
+                false positives (default: 4)
+            min_size (tuple): Smallest (w, h) face to look for at the input resolution
+        """
+        super().__init__(input_width)
+        self.model_path = model_path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.cascade = None
+
+    def _load(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Face cascade not found at {self.model_path}")
+        self.cascade = cv2.CascadeClassifier(self.model_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load face cascade {self.model_path}")
+
+    def _detect(self, image, min_size, max_size):
+        return self.cascade.detectMultiScale(image, self.scale_factor, self.min_neighbors,
+                                             minSize=min_size or self.min_size or (0, 0),
+                                             maxSize=max_size or (0, 0))
+
+    def describe(self):
+        return f"{super().describe()}, scale factor {self.scale_factor}, min neighbors {self.min_neighbors}"
+
+class HaarDetector(CascadeDetector):
+    """
+    OpenCV's frontal face Haar cascade - the most accurate cascade, and the slowest
+    """
+    name = "haar"
+
+    def __init__(self, model_path=None, **options):
+        super().__init__(model_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml', **options)
+
+class LbpDetector(CascadeDetector):
+    """
+    OpenCV's LBP frontal face cascade - integer features, several times faster than Haar
+    """
+    name = "lbp"
+
+    def __init__(self, model_path=None, **options):
+        # opencv-python only ships the Haar cascades - this one comes from OpenCV's data/lbpcascades
+        model_path = model_path or os.getenv(
+            "FACE_LBP_CASCADE", os.path.join("models", "lbpcascade_frontalface_improved.xml"))
+        super().__init__(model_path, **options)
+
+class SsdDetector(FaceDetector):
+    """
+    OpenCV's res10 SSD face detector (Caffe model) run through cv2.dnn
+    """
+    name = "ssd"
+    color = True
+
+    def __init__(self, model_path=None, config_path=None, input_size=(300, 300), confidence=0.5, input_width=None):
+        """
+        Args:
+            model_path (str): res10_300x300_ssd_iter_140000.caffemodel (default: FACE_SSD_MODEL setting or models/)
+            config_path (str): deploy.prototxt (default: FACE_SSD_CONFIG setting or models/)
+            input_size (tuple): Network input (w, h) - smaller is faster but misses small faces (default: 300x300)
+            confidence (float): Minimum detection confidence (default: 0.5)
+            input_width (int): See FaceDetector - the network input is resized to input_size anyway
+        """
+        super().__init__(input_width)
+        self.model_path = model_path or os.getenv(
+            "FACE_SSD_MODEL", os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel"))
+        self.config_path = config_path or os.getenv("FACE_SSD_CONFIG", os.path.join("models", "deploy.prototxt"))
+        self.input_size = tuple(input_size)
+        self.confidence = confidence
+        self.net = None
+
+    def _load(self):
+        for path in (self.model_path, self.config_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"SSD face model file not found at {path}")
+        self.net = cv2.dnn.readNetFromCaffe(self.config_path, self.model_path)
+
+    def _detect(self, image, min_size, max_size):
+        h, w = image.shape[:2]
+
+        # The model was trained on BGR images with these channel means subtracted
+        blob = cv2.dnn.blobFromImage(image, 1.0, self.input_size, (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward().reshape(-1, 7)
+
+        faces = []
+        for _, _, confidence, x0, y0, x1, y1 in detections:
+            if confidence < self.confidence:
+                continue
+            x0, y0 = max(0.0, x0 * w), max(0.0, y0 * h)
+            x1, y1 = min(float(w), x1 * w), min(float(h), y1 * h)
+            faces.append((x0, y0, x1 - x0, y1 - y0))
+        return _filter_sizes(faces, min_size, max_size)
+
+    def describe(self):
+        return f"{super().describe()}, network input {self.input_size[0]}x{self.input_size[1]}, " \
+               f"confidence {self.confidence}"
+
+class YuNetDetector(FaceDetector):
+    """
+    YuNet face detector (ONNX model) run through cv2.FaceDetectorYN (OpenCV 4.5.4+, 4.8+ for the 2023mar model)
+    """
+    name = "yunet"
+    color = True
+
+    def __init__(self, model_path=None, input_width=320, confidence=0.6, nms_threshold=0.3, top_k=50):
+        """
+        Args:
+            model_path (str): face_detection_yunet_2022mar.onnx (default: FACE_YUNET_MODEL setting or models/)
+            input_width (int): See FaceDetector (default: 320 - YuNet runs at any input size)
+            confidence (float): Minimum face score (default: 0.6)
+            nms_threshold (float): Overlap above which weaker boxes are suppressed (default: 0.3)
+            top_k (int): Boxes kept before suppression (default: 50)
+        """
+        super().__init__(input_width)
+        self.model_path = model_path or os.getenv(
+            "FACE_YUNET_MODEL", os.path.join("models", "face_detection_yunet_2022mar.onnx"))
+        self.confidence = confidence
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self.detector = None
+        self.input_size = None
+
+    def _load(self):
+        version = _opencv_version()
+        if not hasattr(cv2, "FaceDetectorYN") or version < (4, 5, 4):
+            raise ValueError(f"YuNet needs OpenCV 4.5.4 or newer (found {cv2.__version__})")
+        if "2023mar" in os.path.basename(self.model_path) and version < (4, 8, 0):
+            raise ValueError(f"The 2023mar YuNet model needs OpenCV 4.8 or newer (found {cv2.__version__}) - "
+                             f"use face_detection_yunet_2022mar.onnx")
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"YuNet face model not found at {self.model_path}")
+        self.detector = cv2.FaceDetectorYN.create(self.model_path, "", (320, 320), self.confidence,
+                                                  self.nms_threshold, self.top_k)
+
+    def _detect(self, image, min_size, max_size):
+        size = (image.shape[1], image.shape[0])
+        if size != self.input_size:
+            self.detector.setInputSize(size)
+            self.input_size = size
+
+        _, detections = self.detector.detect(image)
+        if detections is None:
+            return []
+        # Each row is the box, five landmarks and the score - only the box is used
+        return _filter_sizes([tuple(row[:4]) for row in detections], min_size, max_size)
+
+    def describe(self):
+        return f"{super().describe()}, confidence {self.confidence}"
+
+def _opencv_version():
+    return tuple(int(part) for part in cv2.__version__.split("-")[0].split(".")[:3])
+
+def _scale_size(size, scale):
+    if size is None:
+        return None
+    return tuple(max(1, int(round(v * scale))) for v in size)
+
+def _filter_sizes(faces, min_size, max_size):
+    """
+    Drop boxes outside the size range (the cascades do this themselves during the search)
+    """
+    if min_size is not None:
+        faces = [face for face in faces if face[2] >= min_size[0] and face[3] >= min_size[1]]
+    if max_size is not None:
+        faces = [face for face in faces if face[2] <= max_size[0] and face[3] <= max_size[1]]
+    return faces
+
+@register_detector("haar")
+def _haar_detector(model_path=None, input_width=None, scale_factor=1.1, min_neighbors=4, min_size=None, **options):
+    return HaarDetector(model_path, input_width=input_width, scale_factor=scale_factor, min_neighbors=min_neighbors,
+                        min_size=min_size)
+
+@register_detector("lbp")
+def _lbp_detector(model_path=None, input_width=None, scale_factor=1.1, min_neighbors=4, min_size=None, **options):
+    return LbpDetector(model_path, input_width=input_width, scale_factor=scale_factor, min_neighbors=min_neighbors,
+                       min_size=min_size)
+
+@register_detector("ssd")
+def _ssd_detector(model_path=None, input_width=None, confidence=0.5, input_size=(300, 300), **options):
+    return SsdDetector(model_path=model_path, input_size=input_size, confidence=confidence, input_width=input_width)
+
+@register_detector("yunet")
+def _yunet_detector(model_path=None, input_width=320, confidence=0.6, nms_threshold=0.3, top_k=50, **options):
+    return YuNetDetector(model_path=model_path, input_width=input_width, confidence=confidence,
+                         nms_threshold=nms_threshold, top_k=top_k)
+
+def compare_detectors(clip, names=None, max_frames=300, **options):
+    """
+    Run every detector over the same frames of a clip and measure speed and detection rate
+
+    Frames are decoded and converted to grayscale one at a time and handed to every detector in
+    turn, so memory stays flat however long the clip and only detection is timed. Like in the
+    players, cascades get the grayscale frame and DNN detectors the BGR one.
+
+    Args:
+        clip (str): Video file, image directory or camera index
+        names (list): Detectors to compare (default: all registered)
+        max_frames (int): Frames to use from the clip (default: 300)
+        **options: Detector options passed to create_detector (e.g. input_width)
+
+    Returns:
+        dict: {name: {"description", "frames", "fps", "mean_ms", "p95_ms", "detection_rate", "faces_per_frame"}},
+            or {name: {"error": message}} for detectors that could not be loaded
+    """
+    from frame_sources import open_source
+
+    names = names or available_detectors()
+    results = {}
+    detectors = {}
+    for name in names:
+        detector = create_detector(name, **options)
+        try:
+            detector.load()
+        except (OSError, ValueError, cv2.error) as e:
+            results[name] = {'error': str(e)}
+            continue
+        detectors[name] = detector
+
+    timings = {name: [] for name in detectors}
+    frames_with_faces = dict.fromkeys(detectors, 0)
+    faces_found = dict.fromkeys(detectors, 0)
+    frames = 0
+    cap = open_source(clip, max_speed=True)
+    try:
+        while frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if frames == 0:
+                # One untimed call each so lazy initialisation inside OpenCV doesn't count
+                for detector in detectors.values():
+                    detector.detect(frame, gray=gray)
+            frames += 1
+
+            for name, detector in detectors.items():
+                start = time.perf_counter()
+                faces = detector.detect(frame, gray=gray)
+                timings[name].append(time.perf_counter() - start)
+                frames_with_faces[name] += 1 if faces else 0
+                faces_found[name] += len(faces)
+    finally:
+        cap.release()
+    if frames == 0:
+        raise ValueError(f"Could not read any frames from {clip}")
+
+    for name, detector in detectors.items():
+        times = sorted(timings[name])
+        total = sum(times)
+        results[name] = {
+            'description': detector.describe(),
+            'frames': frames,
+            'fps': frames / total if total > 0 else 0.0,
+            'mean_ms': 1000.0 * total / frames,
+            'p95_ms': 1000.0 * times[min(len(times) - 1, int(len(times) * 0.95))],
+            'detection_rate': frames_with_faces[name] / frames,
+            'faces_per_frame': faces_found[name] / frames,
+        }
+    return {name: results[name] for name in names}
+
+def print_comparison(results):
+    print(f"{'detector':<10}{'fps':>9}{'mean ms':>10}{'p95 ms':>10}{'detected':>10}{'faces/frame':>13}")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<10}  unavailable: {result['error']}")
+            continue
+        print(f"{name:<10}{result['fps']:>9.1f}{result['mean_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['detection_rate']:>9.0%} {result['faces_per_frame']:>12.2f}")
+    for name, result in results.items():
+        if 'description' in result:
+            print(f"  {name}: {result['description']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare face detectors on a recorded clip")
+    parser.add_argument("clip", help="video file, image directory or camera index")
+    parser.add_argument("--detectors", nargs="+", choices=available_detectors(), default=None,
+                        help="detectors to compare (default: all)")
+    parser.add_argument("--max-frames", type=int, default=300, help="frames to use from the clip (default: 300)")
+    parser.add_argument("--width", type=int, default=None,
+                        help="downscale frames to this width before detecting (default: each detector's own)")
+    parser.add_argument("--scale-factor", type=float, default=None, help="cascade scale factor (default: 1.1)")
+    parser.add_argument("--min-neighbors", type=int, default=None, help="cascade min neighbors (default: 4)")
+    parser.add_argument("--confidence", type=float, default=None, help="DNN detector minimum confidence")
+    args = parser.parse_args()
+
+    clip = int(args.clip) if args.clip.isdigit() else args.clip
+    results = compare_detectors(clip, args.detectors, args.max_frames, input_width=args.width,
+                                scale_factor=args.scale_factor, min_neighbors=args.min_neighbors,
+                                confidence=args.confidence)
+    print_comparison(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Face Tracker Module
+Runs the full-frame face detector only every few frames and follows the largest face
+in between by searching a small region around its last position.
+"""
+
+from face_detectors import largest_face
+
+class FaceTracker:
+    def __init__(self, face_detector, detect_interval=5, search_margin=0.5, max_misses=2, smoothing=0.6):
+        """
+        Initialize the tracker
+
+        Args:
+            face_detector: FaceDetector used for detection (see face_detectors.create_detector)
+            detect_interval (int): Run a full-frame detection every N frames (default: 5)
+            search_margin (float): How far around the last face to search, relative to its size (default: 0.5)
+            max_misses (int): Consecutive missed searches before falling back to full detection (default: 2)
+            smoothing (float): Weight of the new box when blending with the previous one, 1.0 disables smoothing
+        """
+        self.face_detector = face_detector
+        self.detect_interval = max(1, detect_interval)
+        self.search_margin = search_margin
+        self.max_misses = max_misses
+        self.smoothing = smoothing
+
+        # Tracking state
+        self.last_face = None
+        self.frames_since_detection = 0
+        self.misses = 0
+
+        # Statistics
+        self.full_detections = 0
+        self.roi_searches = 0
+
+    def reset(self):
+        """
+        Forget the tracked face so the next frame runs a full detection
+        """
+        self.last_face = None
+        self.frames_since_detection = 0
+        self.misses = 0
+
+    def update(self, frame, gray=None):
+        """
+        Find the largest face in a frame
+
+        Args:
+            frame: BGR frame
+            gray: Grayscale version of the frame, if the caller already converted it
+
+        Returns:
+            tuple: (x, y, w, h) of the tracked face, or None if no face was found
+        """
+        needs_full_detection = (
+            self.last_face is None
+            or self.misses >= self.max_misses
+            or self.frames_since_detection >= self.detect_interval
+        )
+
+        if needs_full_detection:
+            face = self._detect_full(frame, gray)
+            self.frames_since_detection = 0
+            self.misses = 0
+        else:
+            face = self._search_around_last_face(frame, gray)
+            self.frames_since_detection += 1
+            if face is None:
+                # Keep the last box for a moment - a short miss shouldn't make the box flicker
+                self.misses += 1
+                return self.last_face if self.misses < self.max_misses else None
+            self.misses = 0
+
+        if face is None:
+            self.last_face = None
+            return None
+
+        self.last_face = self._smooth(face)
+        return self.last_face
+
+    def _detect_full(self, frame, gray):
+        """
+        Run the detector over the whole frame and keep the largest face
+        """
+        self.full_detections += 1
+        return largest_face(self.face_detector.detect(frame, gray=gray))
+
+    def _search_around_last_face(self, frame, gray):
+        """
+        Run the detector only on a region around the last known face
+        """
+        self.roi_searches += 1
+        x, y, w, h = self.last_face
+        frame_h, frame_w = frame.shape[:2]
+
+        # Expand the last box by the search margin, clipped to the frame
+        margin_x = int(w * self.search_margin)
+        margin_y = int(h * self.search_margin)
+        x0 = max(0, x - margin_x)
+        y0 = max(0, y - margin_y)
+        x1 = min(frame_w, x + w + margin_x)
+        y1 = min(frame_h, y + h + margin_y)
+
+        roi = frame[y0:y1, x0:x1]
+        if roi.size == 0:
+            return None
+        gray_roi = gray[y0:y1, x0:x1] if gray is not None else None
+
+        # The face hardly changes size between frames, so only look for similar sizes
+        min_size = (int(w * 0.7), int(h * 0.7))
+        max_size = (int(w * 1.4), int(h * 1.4))
+        face = largest_face(self.face_detector.detect(roi, min_size=min_size, max_size=max_size, gray=gray_roi))
+        if face is None:
+            return None
+
+        fx, fy, fw, fh = face
+        return (fx + x0, fy + y0, fw, fh)
+
+    def _smooth(self, face):
+        """
+        Blend the new box with the previous one so it doesn't jitter
+        """
+        if self.last_face is None or self.smoothing >= 1.0:
+            return face
+
+        # Don't smooth across a jump to a different face
+        if _overlap(face, self.last_face) < 0.3:
+            return face
+
+        a = self.smoothing
+        return tuple(int(round(a * new + (1 - a) * old)) for new, old in zip(face, self.last_face))
+
+def _overlap(box_a, box_b):
+    """
+    Intersection over union of two (x, y, w, h) boxes
+    """
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = ix * iy
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 0.0
@@ -0,0 +1,194 @@
+"""
+Fake Spotify Server Module
+A local stand-in for the parts of the Spotify Web API the player uses, so benchmarks
+can run without a Spotify account or network access.
+"""
+
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+class FakeSpotifyServer:
+    def __init__(self, port=0, latency_ms=0.0, devices=None, playlist_size=50):
+        """
+        Initialize the server (call start() to begin serving)
+
+        Args:
+            port (int): Port to listen on, 0 picks a free one (default: 0)
+            latency_ms (float): Artificial delay added to every response, to mimic the real API
+            devices (list): Devices returned by /me/player/devices (default: one active computer)
+            playlist_size (int): Tracks in every playlist (default: 50)
+        """
+        self.latency = latency_ms / 1000.0
+        self.devices = devices if devices is not None else [
+            {'id': 'fake-device', 'name': 'Benchmark Speaker', 'type': 'Computer', 'is_active': True}
+        ]
+        self.playlist_size = playlist_size
+        # playlist id -> snapshot_id, change an entry to simulate an edited playlist
+        self.snapshot_ids = {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        str: Base URL of the server, e.g. http://127.0.0.1:54321
+        """
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_prefix(self):
+        """
+        str: Value for spotipy.Spotify.prefix so a client talks to this server
+        """
+        return f"{self.url}/v1/"
+
+    def start(self):
+        """
+        Start serving on a background thread
+
+        Returns:
+            FakeSpotifyServer: self, so the call can be chained
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-spotify", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def request_counts(self):
+        """
+        Get the number of requests served per endpoint
+
+        Returns:
+            dict: {"METHOD /path pattern": count}
+        """
+        with self.lock:
+            return dict(self.requests)
+
+    def handle(self, method, path, body, query=None):
+        """
+        Produce the response for a request
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path without the query string
+            body (bytes): Request body
+            query (dict): Query parameters, {name: [values]}
+
+        Returns:
+            tuple: (endpoint, status, payload) - endpoint names the route for the request counts,
+                payload is serialized as JSON (None for an empty body)
+        """
+        if method == "GET" and path == "/v1/me":
+            return "GET /v1/me", 200, {'id': 'benchmark', 'display_name': 'Benchmark User'}
+
+        if method == "GET" and path == "/v1/me/player/devices":
+            return "GET /v1/me/player/devices", 200, {'devices': self.devices}
+
+        if method == "PUT" and path == "/v1/me/player/play":
+            return "PUT /v1/me/player/play", 204, None
+
+        query = query or {}
+
+        match = re.fullmatch(r"/v1/playlists/([^/]+)", path)
+        if method == "GET" and match:
+            playlist_id = match.group(1)
+            return "GET /v1/playlists/{id}", 200, {
+                'id': playlist_id,
+                'name': f"Playlist {playlist_id[:8]}",
+                'snapshot_id': self.snapshot_ids.get(playlist_id, 'fake-snapshot'),
+                'tracks': {'total': self.playlist_size},
+            }
+
+        # Newer clients use /items, older ones /tracks
+        match = re.fullmatch(r"/v1/playlists/([^/]+)/(items|tracks)", path)
+        if method == "GET" and match:
+            playlist_id, collection = match.groups()
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['100'])[0])
+            end = min(offset + limit, self.playlist_size)
+            items = [{'track': {'uri': f"spotify:track:{self._track_id(playlist_id, i)}", 'type': 'track',
+                                'is_local': False}}
+                     for i in range(offset, end)]
+            next_url = (f"{self.api_prefix}playlists/{playlist_id}/{collection}?offset={end}&limit={limit}"
+                        if end < self.playlist_size else None)
+            return f"GET /v1/playlists/{{id}}/{collection}", 200, {'items': items, 'next': next_url}
+
+        if method == "GET" and path == "/v1/audio-features":
+            ids = query.get('ids', [''])[0].split(",")
+            return "GET /v1/audio-features", 200, {'audio_features': [self._features(track_id) for track_id in ids]}
+
+        return f"{method} {path}", 404, {'error': {'status': 404, 'message': 'Not found'}}
+
+    @staticmethod
+    def _track_id(playlist_id, index):
+        # Stable 22 character id per playlist position
+        return f"{zlib.crc32(playlist_id.encode()):010d}{index:012d}"
+
+    @staticmethod
+    def _features(track_id):
+        # Deterministic pseudo-random features so repeated syncs agree
+        seed = zlib.crc32(track_id.encode())
+        return {'id': track_id, 'valence': (seed % 1000) / 1000.0, 'energy': (seed // 1000 % 1000) / 1000.0}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send small responses right away instead of waiting on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                path, _, query = self.path.partition("?")
+                path = path.rstrip("/")
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                endpoint, status, payload = server.handle(method, path, body, parse_qs(query))
+                with server.lock:
+                    server.requests[endpoint] += 1
+
+                data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_PUT(self):
+                self._respond("PUT")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                # Keep benchmark output readable
+                pass
+
+        return Handler
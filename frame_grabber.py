@@ -0,0 +1,129 @@
+"""
+Frame Grabber Module
+Reads camera frames on a background thread so the detection loop always works on the newest frame.
+"""
+
+import threading
+from collections import deque
+
+class LatestFrameGrabber:
+    def __init__(self, cap, buffer_size=2, reuse_buffers=False):
+        """
+        Initialize the frame grabber around an opened capture
+
+        Args:
+            cap: An opened cv2.VideoCapture (or anything with a compatible read() method)
+            buffer_size (int): Number of frames kept in the ring buffer (default: 2)
+            reuse_buffers (bool): Decode into a fixed set of three frame buffers instead of a new
+                array per frame. The frame returned by read() is then only valid until the next read().
+        """
+        self.cap = cap
+        self.reuse_buffers = reuse_buffers
+
+        # Ring buffer of (frame_number, frame) - old frames fall off the end automatically
+        self.frames = deque(maxlen=1 if reuse_buffers else max(1, buffer_size))
+        self.condition = threading.Condition()
+
+        # Triple buffering when reusing buffers: the capture thread decodes into a free buffer,
+        # the newest complete frame waits in self.frames, and the reader holds the frame from
+        # its last read(). Buffers return to the free list once neither side needs them.
+        self.free_buffers = []
+        self.reader_buffer = None
+
+        # Frame bookkeeping
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.last_frame_number = 0
+        self.failed = False
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        Start the background capture thread
+
+        Returns:
+            LatestFrameGrabber: self, so the call can be chained
+        """
+        if self.running:
+            return self
+
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, name="frame-grabber", daemon=True)
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        """
+        Keep pulling frames from the camera until stopped or the camera fails
+        """
+        while self.running:
+            if self.reuse_buffers:
+                with self.condition:
+                    buffer = self.free_buffers.pop() if self.free_buffers else None
+                ret, frame = self.cap.read(buffer)
+            else:
+                ret, frame = self.cap.read()
+
+            with self.condition:
+                if not ret:
+                    # Camera unplugged or end of a video file - wake up the reader
+                    self.failed = True
+                    self.running = False
+                    self.condition.notify_all()
+                    break
+
+                self.frames_captured += 1
+                if self.reuse_buffers and self.frames:
+                    # The unread frame is replaced - its buffer can be decoded into again
+                    self.free_buffers.append(self.frames.pop()[1])
+                self.frames.append((self.frames_captured, frame))
+                self.condition.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        Get the newest frame, dropping any older ones still in the buffer
+
+        Waits for a frame that has not been returned before, so callers never
+        process the same frame twice.
+
+        Args:
+            timeout (float): Seconds to wait for a new frame (default: 1.0)
+
+        Returns:
+            tuple: (ret, frame) - same contract as cv2.VideoCapture.read()
+        """
+        with self.condition:
+            has_new_frame = lambda: self.failed or (self.frames and self.frames[-1][0] > self.last_frame_number)
+            if not self.condition.wait_for(has_new_frame, timeout):
+                return False, None
+
+            if not self.frames or self.frames[-1][0] <= self.last_frame_number:
+                return False, None
+
+            frame_number, frame = self.frames[-1]
+            self.frames_dropped += frame_number - self.last_frame_number - 1
+            self.last_frame_number = frame_number
+            self.frames.clear()
+
+            if self.reuse_buffers:
+                # The caller is done with the previous frame now
+                if self.reader_buffer is not None:
+                    self.free_buffers.append(self.reader_buffer)
+                self.reader_buffer = frame
+
+            return True, frame
+
+    def stop(self):
+        """
+        Stop the capture thread and wait for it to finish
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+        if self.frames_captured:
+            print(f"Frame grabber stopped: {self.frames_captured} frames captured, "
+                  f"{self.frames_dropped} stale frames dropped")
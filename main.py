@@ -5,19 +5,98 @@ This application uses facial emotion detection to play music from Spotify that m
 
 import os
 import time
+import argparse
 from dotenv import load_dotenv
 from emotion_detector import EmotionDetector
+from process_pipeline import ProcessEmotionDetector
+from emotion_backends import available_backends, create_backend
+from face_detectors import available_detectors, create_detector as create_face_detector
 from spotify_player import SpotifyPlayer
+from emotion_smoother import EmotionSmoother
+from detection_scheduler import DetectionScheduler
+from metrics import record_frame, start_exporters
+from service import ShutdownSignal
+from startup import StartupOrchestrator
+from track_catalog import load_catalog
 
 # Load environment variables from .env file
 load_dotenv()
 
+def parse_args():
+    """
+    Parse command line options
+    
+    Returns:
+        argparse.Namespace: The parsed options
+    """
+    parser = argparse.ArgumentParser(description="Emotion-Based Music Player")
+    parser.add_argument("--camera", type=int, default=0, help="index of the camera to use (default: 0)")
+    parser.add_argument("--source", default=None,
+                        help="video file, image directory or RTSP/HTTP stream URL to use instead of the camera")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="read video files and image directories as fast as possible instead of in real time")
+    parser.add_argument("--threaded-capture", action="store_true",
+                        help="read camera frames on a background thread and always use the newest one")
+    parser.add_argument("--track-faces", action="store_true",
+                        help="run the full face detector only every few frames and track the face in between")
+    parser.add_argument("--detect-interval", type=int, default=5,
+                        help="frames between full face detections when tracking (default: 5)")
+    parser.add_argument("--backend", choices=available_backends(), default=None,
+                        help="emotion backend (default: EMOTION_BACKEND setting or 'simulated')")
+    parser.add_argument("--batch-size", type=int, default=4,
+                        help="face crops per classifier forward pass (default: 4)")
+    parser.add_argument("--min-dwell", type=float, default=10.0,
+                        help="minimum seconds to keep an emotion before switching music (default: 10)")
+    parser.add_argument("--frame-budget-ms", type=float, default=None,
+                        help="run detection less often to keep the average frame processing time under this budget")
+    parser.add_argument("--cpu-limit", type=float, default=None,
+                        help="run detection less often to keep CPU use under this percentage of one core")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port (/metrics, /metrics.json)")
+    parser.add_argument("--metrics-json", default=None,
+                        help="periodically write metrics as JSON to this file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between JSON metric dumps (default: 10)")
+    parser.add_argument("--reuse-buffers", action="store_true",
+                        help="read and convert frames into preallocated buffers instead of allocating every frame")
+    parser.add_argument("--face-detector", choices=available_detectors(), default=None,
+                        help="face detector (default: FACE_DETECTOR setting or 'haar')")
+    parser.add_argument("--detector-width", type=int, default=None,
+                        help="downscale frames to this width for face detection (default: the detector's own)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="run face detection and classification in this many worker processes fed through shared memory")
+    parser.add_argument("--catalog", default=None,
+                        help="track catalog to match tracks to the detected mood (default: MOODIFY_CATALOG setting "
+                             "or track_catalog.snapshot if it exists, otherwise emotion playlists)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview window or frame annotation; stop with SIGTERM/SIGINT (for running as a service)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("Starting Emotion-Based Music Player...")
-    print("Press 'q' to quit")
+    
+    # Without a window there is no 'q' key - stop on SIGTERM/SIGINT instead
+    shutdown = ShutdownSignal().install() if args.headless else None
+    print("Send SIGTERM or press Ctrl+C to quit" if args.headless else "Press 'q' to quit")
     
     # Initialize the emotion detector
-    emotion_detector = EmotionDetector()
+    source = args.source if args.source is not None else args.camera
+    
+    classifier = None if args.processes else create_backend(args.backend, batch_size=args.batch_size)
+    face_detector = create_face_detector(args.face_detector, input_width=args.detector_width)
+    
+    def create_detector():
+        if args.processes:
+            # Capture and inference run in their own processes; frames are shared, not copied
+            return ProcessEmotionDetector(source=source, workers=args.processes, backend=args.backend,
+                                          headless=args.headless, max_speed=args.max_speed,
+                                          face_detector=face_detector)
+        return EmotionDetector(camera_index=source, threaded_capture=args.threaded_capture,
+                               track_faces=args.track_faces, detect_interval=args.detect_interval,
+                               classifier=classifier, headless=args.headless, max_speed=args.max_speed,
+                               reuse_buffers=args.reuse_buffers, face_detector=face_detector)
     
     # Initialize the Spotify player (in demo mode)
     client_id = os.getenv("SPOTIFY_CLIENT_ID")
@@ -28,31 +107,77 @@ def main():
         print("Note: Using demo mode since valid Spotify credentials are not configured")
         print("To use actual Spotify playback, update the .env file with your credentials")
     
-    spotify_player = SpotifyPlayer(client_id, client_secret, redirect_uri)
+    # Open the camera and connect to Spotify at the same time - frames start as soon as the
+    # camera is ready, and music once Spotify is (OAuth and the device check can take seconds)
+    startup = StartupOrchestrator()
+    startup.add("detector", create_detector)
+    if classifier is not None:
+        startup.add("emotion_model", classifier.load)
+    startup.add("spotify", lambda: SpotifyPlayer(client_id, client_secret, redirect_uri,
+                                                 catalog=load_catalog(args.catalog)))
+    startup.start()
+    
+    emotion_detector = startup.result("detector")
+    if emotion_detector is None:
+        print("Could not start the emotion detector")
+        _close_spotify(startup)
+        return
+    spotify_player = None
     
+    # Smooth detections over time so one-frame flips don't switch the music
+    smoother = EmotionSmoother(min_dwell=args.min_dwell)
     current_emotion = None
-    last_emotion_change = 0
-    emotion_cooldown = 10  # Seconds to wait before changing songs
+    
+    # Run detection less often when the loop is over its frame-time or CPU budget
+    scheduler = DetectionScheduler(frame_budget_ms=args.frame_budget_ms, cpu_percent=args.cpu_limit)
+    
+    # Export stage timings, fps and Spotify latency if requested
+    exporters = start_exporters(args.metrics_port, args.metrics_json, args.metrics_interval)
     
     try:
         # Start the emotion detection loop
-        while True:
-            frame, emotion = emotion_detector.detect_emotion()
+        while shutdown is None or not shutdown.requested:
+            run_detection = scheduler.should_detect()
+            frame_start = time.perf_counter()
+            frame, emotion = emotion_detector.detect_emotion(run_detection)
+            if emotion_detector.ended:
+                # A video file or image directory has no more frames
+                break
+            if frame is not None:
+                record_frame(run_detection)
+                startup.first_frame()
             
             # Display the current emotion
             if emotion:
-                if emotion != current_emotion and time.time() - last_emotion_change > emotion_cooldown:
-                    print(f"Detected emotion: {emotion}")
-                    spotify_player.play_music_for_emotion(emotion)
-                    current_emotion = emotion
-                    last_emotion_change = time.time()
+                if run_detection:
+                    smoother.update(emotion_detector.last_probabilities or emotion)
+                stable_emotion = smoother.stable_emotion
+                if spotify_player is None and startup.done("spotify"):
+                    spotify_player = startup.result("spotify")
+                if stable_emotion is not None and stable_emotion != current_emotion and spotify_player is not None:
+                    print(f"Detected emotion: {stable_emotion}")
+                    spotify_player.play_music_for_emotion(stable_emotion, smoother.smoothed)
+                    current_emotion = stable_emotion
+                elif run_detection and spotify_player is not None:
+                    # Get the likely next playlist and device ready before the switch
+                    spotify_player.prepare_next(smoother.likely_next())
                 
                 # Display emotion on frame
-                emotion_detector.display_emotion(frame, emotion)
+                emotion_detector.display_emotion(frame, current_emotion or emotion)
+            
+            # Only compute (detection, classification, drawing) counts against the budget,
+            # not waiting for the camera
+            scheduler.record(time.perf_counter() - frame_start - emotion_detector.read_seconds, run_detection)
             
             # Display the frame
             emotion_detector.show_frame(frame)
             
+            if shutdown is not None:
+                if frame is None:
+                    # Camera hiccup - wait a moment instead of spinning
+                    shutdown.wait(0.5)
+                continue
+            
             # Check if user wants to quit
             if emotion_detector.should_quit():
                 break
@@ -61,8 +186,22 @@ def main():
         print("Application stopped by user")
     finally:
         # Clean up
+        for exporter in exporters:
+            exporter.stop()
+        # The player may exist without ever having been used (e.g. no face was seen)
+        _close_spotify(startup)
         emotion_detector.release()
         print("Application closed")
 
+def _close_spotify(startup):
+    """
+    Close the Spotify player built by the startup step, so its background threads stop
+    """
+    # Let steps still running finish first, or the player would be created after this
+    startup.wait_all(timeout=10.0)
+    spotify_player = startup.result("spotify", timeout=0)
+    if spotify_player is not None:
+        spotify_player.close()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,436 @@
+"""
+Metrics Module
+Collects per-stage timings, counters and gauges from the pipeline and exports them
+as a Prometheus text endpoint or a periodic JSON dump.
+"""
+
+import json
+import os
+import re
+import threading
+import urllib.parse
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in seconds, from sub-millisecond OpenCV calls to slow Spotify requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Spotify IDs are 22 base62 characters; user and category IDs are free-form
+_SPOTIFY_ID = re.compile(r"^[0-9A-Za-z]{22}$")
+_FREE_FORM_ID_PARENTS = ("users", "categories")
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        """
+        Initialize the counter
+
+        Args:
+            name (str): Metric name
+            help_text (str): Description shown in the Prometheus output
+            labels (tuple): Label names, values are passed to inc()
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        # Unlabelled metrics are exported as 0 before their first update
+        self.values = {} if self.labels else {(): 0}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter
+
+        Args:
+            amount (float): How much to add (default: 1)
+            **labels: Label values
+        """
+        key = _label_key(self.labels, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+    def snapshot(self):
+        with self.lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self.values.items()]
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        """
+        Set the gauge to a value
+
+        Args:
+            value (float): New value
+            **labels: Label values
+        """
+        key = _label_key(self.labels, labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the histogram
+
+        Args:
+            name (str): Metric name
+            help_text (str): Description shown in the Prometheus output
+            labels (tuple): Label names, values are passed to observe()
+            buckets (tuple): Upper bounds of the buckets, in ascending order
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # {label key: [bucket counts..., +Inf count, sum]}
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Record a value
+
+        Args:
+            value (float): The observed value (seconds for timings)
+            **labels: Label values
+        """
+        key = _label_key(self.labels, labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self):
+        result = []
+        with self.lock:
+            for key, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                    cumulative += count
+                    result.append((self.name + "_bucket", key + (("le", _format_bound(bound)),), cumulative))
+                result.append((self.name + "_count", key, cumulative))
+                result.append((self.name + "_sum", key, series[-1]))
+        return result
+
+    def snapshot(self):
+        result = []
+        with self.lock:
+            for key, series in self.series.items():
+                counts = series[:-1]
+                total = sum(counts)
+                result.append({
+                    'labels': dict(key),
+                    'count': total,
+                    'sum': series[-1],
+                    'mean': series[-1] / total if total else 0.0,
+                    'p50': self._quantile(counts, total, 0.50),
+                    'p95': self._quantile(counts, total, 0.95),
+                    'p99': self._quantile(counts, total, 0.99),
+                })
+        return result
+
+    def _quantile(self, counts, total, q):
+        """
+        Estimate a quantile as the upper bound of the bucket it falls into
+        """
+        if total == 0:
+            return 0.0
+        target = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Initialize an empty registry
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labels, buckets)
+
+    def to_prometheus(self):
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Returns:
+            str: The metrics text
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            kind = {Histogram: "histogram", Gauge: "gauge"}.get(type(metric), "counter")
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            for name, key, value in metric.samples():
+                labels = ",".join(f'{label}="{_escape(value_)}"' for label, value_ in key)
+                lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """
+        Get all metrics as plain data for the JSON dump
+
+        Returns:
+            dict: {metric name: [series...]}, histogram times in seconds
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+class FpsMeter:
+    def __init__(self, gauge, window=1.0):
+        """
+        Initialize the meter
+
+        Args:
+            gauge (Gauge): Gauge updated with the measured frames per second
+            window (float): Seconds over which frames are counted (default: 1.0)
+        """
+        self.gauge = gauge
+        self.window = window
+        self.frames = 0
+        self.window_start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def tick(self):
+        """
+        Count one processed frame (safe to call from several threads)
+        """
+        with self.lock:
+            self.frames += 1
+            now = time.perf_counter()
+            elapsed = now - self.window_start
+            if elapsed >= self.window:
+                self.gauge.set(self.frames / elapsed)
+                self.frames = 0
+                self.window_start = now
+
+class MetricsServer:
+    def __init__(self, registry=None, port=9100, host="0.0.0.0"):
+        """
+        Initialize the HTTP endpoint (call start() to begin serving)
+
+        Serves the Prometheus text format on /metrics and the JSON snapshot on /metrics.json.
+
+        Args:
+            registry (MetricsRegistry): Registry to export (default: the shared one)
+            port (int): Port to listen on (default: 9100)
+            host (str): Address to bind (default: all interfaces)
+        """
+        self.registry = registry or REGISTRY
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+        self.thread.start()
+        print(f"Metrics available on http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _make_handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    data = registry.to_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    data = json.dumps(registry.to_dict()).encode("utf-8")
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Scrapes would flood the console
+                pass
+
+        return Handler
+
+class JsonMetricsWriter:
+    def __init__(self, path, interval=10.0, registry=None):
+        """
+        Initialize the periodic JSON dump (call start() to begin writing)
+
+        Args:
+            path (str): File the snapshot is written to, replaced atomically each time
+            interval (float): Seconds between dumps (default: 10)
+            registry (MetricsRegistry): Registry to export (default: the shared one)
+        """
+        self.path = path
+        self.interval = interval
+        self.registry = registry or REGISTRY
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self.thread.start()
+        print(f"Writing metrics to {self.path} every {self.interval:g}s")
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def write(self):
+        """
+        Write the current snapshot
+        """
+        snapshot = {'timestamp': time.time(), 'metrics': self.registry.to_dict()}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        # Leave the final numbers behind
+        self.write()
+
+def spotify_endpoint(url):
+    """
+    Reduce a Spotify Web API URL to a low-cardinality endpoint label
+
+    Args:
+        url (str): Full URL or path relative to the API prefix
+
+    Returns:
+        str: Path without the version prefix or query, IDs replaced by "{id}" (e.g. "playlists/{id}/items")
+    """
+    parts = [part for part in urllib.parse.urlsplit(url).path.split("/") if part]
+    if parts[:1] == ["v1"]:
+        parts = parts[1:]
+    return "/".join("{id}" if _SPOTIFY_ID.match(part) or (i > 0 and parts[i - 1] in _FREE_FORM_ID_PARENTS)
+                    else part for i, part in enumerate(parts))
+
+def _label_key(names, values):
+    return tuple((name, str(values.get(name, ""))) for name in names)
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Shared by every module in this process
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("moodify_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+FRAMES = REGISTRY.counter("moodify_frames_total", "Frames processed")
+DETECTIONS = REGISTRY.counter("moodify_detections_total", "Frames on which face detection ran")
+FPS = REGISTRY.gauge("moodify_fps", "Frames processed per second over the last second")
+SPOTIFY_SECONDS = REGISTRY.histogram("moodify_spotify_request_seconds", "Spotify Web API request latency",
+                                     ["method", "endpoint"])
+SPOTIFY_REQUESTS = REGISTRY.counter("moodify_spotify_requests_total", "Spotify Web API requests by result",
+                                    ["method", "endpoint", "status"])
+PLAYBACK_SWITCHES = REGISTRY.counter("moodify_playback_switches_total", "Playlists started, by emotion",
+                                     ["emotion"])
+PREPARED_SWITCHES = REGISTRY.counter("moodify_prepared_switches_total",
+                                     "Playback switches by whether the context was prepared ahead (hit/miss)",
+                                     ["result"])
+STARTUP_SECONDS = REGISTRY.gauge("moodify_startup_step_seconds", "Time each startup step took", ["step"])
+TIME_TO_FIRST_FRAME = REGISTRY.gauge("moodify_time_to_first_frame_seconds", "Seconds from startup to the first frame")
+
+_fps_meter = FpsMeter(FPS)
+
+@contextmanager
+def time_stage(stage):
+    """
+    Time the enclosed block and record it under the given pipeline stage
+
+    Args:
+        stage (str): Stage name, e.g. "read" or "detect_faces"
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def record_frame(detected):
+    """
+    Count a processed frame and update the fps gauge (call from the frame loop)
+
+    Args:
+        detected (bool): Whether detection ran on the frame
+    """
+    FRAMES.inc()
+    if detected:
+        DETECTIONS.inc()
+    _fps_meter.tick()
+
+def start_exporters(port=None, json_path=None, interval=10.0):
+    """
+    Start the requested metric exporters
+
+    Args:
+        port (int): Serve Prometheus metrics on this port, if given
+        json_path (str): Dump JSON metrics to this file, if given
+        interval (float): Seconds between JSON dumps (default: 10)
+
+    Returns:
+        list: The started exporters - call stop() on each when done
+    """
+    exporters = []
+    if port is not None:
+        try:
+            exporters.append(MetricsServer(port=port).start())
+        except OSError as e:
+            print(f"Could not start metrics server on port {port}: {e}")
+    if json_path:
+        exporters.append(JsonMetricsWriter(json_path, interval).start())
+    return exporters
@@ -0,0 +1,385 @@
+"""
+Multi-Stream Module
+Runs several cameras (zones) in one process. The emotion model is loaded once and
+classifies face crops from all zones in shared batches, face detection is spread over a
+pool of worker threads in round-robin order, and each zone plays on its own Spotify device.
+
+Usage:
+    python multi_stream.py --sources 0 1 --devices "Kitchen" "Living Room"
+    python multi_stream.py --zones zones.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import queue
+import threading
+import cv2
+from dotenv import load_dotenv
+from frame_grabber import LatestFrameGrabber
+from face_tracker import FaceTracker
+from face_detectors import FaceDetector, available_detectors, create_detector, largest_face
+from emotion_backends import available_backends, create_backend, top_emotion
+from emotion_smoother import EmotionSmoother
+from spotify_player import SpotifyPlayer
+from metrics import record_frame, start_exporters, time_stage
+from service import ShutdownSignal
+from frame_sources import open_source
+
+class Zone:
+    def __init__(self, name, source, player, min_dwell=10.0, track_faces=False, detect_interval=5):
+        """
+        Initialize a zone - one camera and the Spotify device it controls
+
+        Args:
+            name (str): Zone name, used for the window title and log messages
+            source: Camera index, video file, image directory or stream URL (see frame_sources.open_source)
+            player (SpotifyPlayer): Player for this zone's device
+            min_dwell (float): Minimum seconds to keep an emotion before switching music (default: 10)
+            track_faces (bool): Run the full face detector only every few frames and track the face in between
+            detect_interval (int): Frames between full detections when tracking (default: 5)
+        """
+        self.name = name
+        self.player = player
+
+        self.cap = open_source(source)
+        if not self.cap.isOpened():
+            raise ValueError(f"Could not open {self.cap!r} for zone '{name}'")
+
+        # Always read on a background thread so a busy worker never builds up camera latency
+        self.grabber = LatestFrameGrabber(self.cap).start()
+
+        # The tracker's detector is swapped for the calling worker's own detector before each update
+        self.tracker = FaceTracker(None, detect_interval) if track_faces else None
+        self.smoother = EmotionSmoother(min_dwell=min_dwell)
+
+        self.last_face = None
+        self.current_emotion = None
+        self.playing_emotion = None
+
+        # Set once the camera stops delivering frames (or a video file ends)
+        self.stopped = False
+
+        # Latest frame for the preview, written by workers and read by the main thread
+        self.display_frame = None
+        self.lock = threading.Lock()
+
+    def apply(self, probabilities):
+        """
+        Feed a classification result into the zone's smoother and switch the music if needed
+        (called from the inference thread)
+
+        Args:
+            probabilities (dict): {emotion: probability} for the zone's face
+        """
+        emotion = top_emotion(probabilities)
+        if emotion != self.current_emotion:
+            self.current_emotion = emotion
+            print(f"[{self.name}] Detected emotion: {emotion}")
+
+        stable_emotion = self.smoother.update(probabilities)
+        if stable_emotion is not None and stable_emotion != self.playing_emotion:
+            self.playing_emotion = stable_emotion
+            self.player.play_music_for_emotion(stable_emotion, self.smoother.smoothed)
+        else:
+            self.player.prepare_next(self.smoother.likely_next())
+
+    def release(self):
+        self.grabber.stop()
+        self.cap.release()
+        self.player.close()
+
+class MultiStreamProcessor:
+    def __init__(self, zones, classifier, workers=None, max_batch=16, headless=False, face_detector=None):
+        """
+        Initialize the processor
+
+        Args:
+            zones (list): Zone instances
+            classifier: Emotion backend shared by all zones
+            workers (int): Face detection threads (default: one per CPU core, at most one per zone)
+            max_batch (int): Largest number of face crops classified in one forward pass (default: 16)
+            headless (bool): Don't annotate frames or open preview windows
+            face_detector: Face detector name (see face_detectors.available_detectors) or a FaceDetector
+                that hasn't been loaded yet - every worker loads its own copy
+        """
+        self.zones = zones
+        self.classifier = classifier
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(zones)))
+        self.max_batch = max_batch
+        self.headless = headless
+
+        # Every zone is in this queue exactly once while idle - workers take the zone at the
+        # front and put it back at the end, so zones get turns in round-robin order and at
+        # most one frame per zone is in flight
+        self.ready_zones = queue.Queue()
+        for zone in zones:
+            self.ready_zones.put(zone)
+
+        # Face crops waiting for the shared model: (zone, crop)
+        self.crops = queue.Queue()
+
+        # OpenCV detectors must not be used from several threads at once, so each worker
+        # loads its own copy - the memory cost scales with workers, not zones
+        if not isinstance(face_detector, FaceDetector):
+            face_detector = create_detector(face_detector)
+        self.face_detector = face_detector
+        self.local = threading.local()
+
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        """
+        Start the detection workers and the inference thread
+
+        Returns:
+            MultiStreamProcessor: self, so the call can be chained
+        """
+        self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._detection_loop, name=f"detect-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        thread = threading.Thread(target=self._inference_loop, name="inference", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+        print(f"Processing {len(self.zones)} zone(s) with {self.workers} detection worker(s)")
+        return self
+
+    def _worker_face_detector(self):
+        detector = getattr(self.local, "face_detector", None)
+        if detector is None:
+            detector = copy.deepcopy(self.face_detector)
+            detector.load()
+            self.local.face_detector = detector
+        return detector
+
+    def _detection_loop(self):
+        while self.running:
+            try:
+                zone = self.ready_zones.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            try:
+                self._process_frame(zone)
+            except Exception as e:
+                print(f"[{zone.name}] Frame processing error: {e}")
+
+            if zone.grabber.failed:
+                # Camera unplugged or end of a video file - take the zone out of the rotation
+                print(f"[{zone.name}] Camera stopped delivering frames")
+                zone.stopped = True
+                continue
+            self.ready_zones.put(zone)
+
+    def _process_frame(self, zone):
+        """
+        Read the newest frame of a zone, find the face and queue its crop for classification
+        """
+        with time_stage("read"):
+            ret, frame = zone.grabber.read(timeout=0.1)
+        if not ret:
+            return
+
+        with time_stage("convert"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        with time_stage("detect_faces"):
+            detector = self._worker_face_detector()
+            if zone.tracker is not None:
+                zone.tracker.face_detector = detector
+                face = zone.tracker.update(frame, gray)
+            else:
+                face = largest_face(detector.detect(frame, gray=gray))
+        zone.last_face = face
+        record_frame(True)
+
+        if face is not None:
+            if self.classifier.ready:
+                self.crops.put((zone, self.classifier.preprocess(gray, face)))
+            else:
+                self.classifier.start_loading()
+
+        if not self.headless:
+            self._annotate(zone, frame, face)
+            with zone.lock:
+                zone.display_frame = frame
+
+    def _annotate(self, zone, frame, face):
+        with time_stage("draw"):
+            if face is not None:
+                x, y, w, h = face
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 255), 2)
+            label = zone.smoother.stable_emotion or "..."
+            cv2.putText(frame, f"{zone.name}: {label}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+
+    def _inference_loop(self):
+        """
+        Classify queued crops from all zones together, in batches of up to max_batch
+        """
+        while self.running:
+            try:
+                batch = [self.crops.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # Take whatever else is already waiting, keeping only the newest crop per zone
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.crops.get_nowait())
+                except queue.Empty:
+                    break
+            newest = {}
+            for zone, crop in batch:
+                newest[zone] = crop
+
+            try:
+                with time_stage("classify"):
+                    results = self.classifier.predict_batch(list(newest.values()))
+            except Exception as e:
+                print(f"Emotion classification error: {e}")
+                continue
+
+            for zone, probabilities in zip(newest.keys(), results):
+                zone.apply(probabilities)
+
+    def run(self):
+        """
+        Run until 'q' is pressed in a preview window, until SIGTERM/SIGINT when headless,
+        or until every zone has stopped delivering frames (e.g. all sources are video files)
+        """
+        shutdown = ShutdownSignal().install()
+        self.start()
+        try:
+            while not shutdown.requested:
+                if all(zone.stopped for zone in self.zones):
+                    print("Every zone has stopped delivering frames")
+                    break
+                if self.headless:
+                    shutdown.wait(0.5)
+                    continue
+
+                for zone in self.zones:
+                    with zone.lock:
+                        frame, zone.display_frame = zone.display_frame, None
+                    if frame is not None:
+                        with time_stage("display"):
+                            cv2.imshow(f"Emotion-Based Music Player - {zone.name}", frame)
+
+                with time_stage("wait_key"):
+                    key = cv2.waitKey(10)
+                if key & 0xFF == ord('q'):
+                    break
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self.threads = []
+        for zone in self.zones:
+            zone.release()
+        if not self.headless:
+            cv2.destroyAllWindows()
+        print("All zones stopped")
+
+def load_zones(args):
+    """
+    Get the zone definitions from the command line
+
+    Returns:
+        list: Dicts with "name", "source" and "device" (None for the active device)
+
+    Raises:
+        ValueError: If no zones are configured
+    """
+    if args.zones:
+        with open(args.zones, "r", encoding="utf-8") as f:
+            zones = json.load(f)
+    else:
+        devices = args.devices or []
+        zones = [{'source': source, 'device': devices[i] if i < len(devices) else None}
+                 for i, source in enumerate(args.sources)]
+
+    for i, zone in enumerate(zones):
+        zone.setdefault('name', zone.get('device') or f"zone {i + 1}")
+        zone.setdefault('device', None)
+    if not zones:
+        raise ValueError("No zones configured - give --sources or a --zones file with at least one zone")
+    return zones
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Emotion-Based Music Player for several cameras")
+    parser.add_argument("--sources", nargs="+", default=["0"],
+                        help="camera indices, video files or stream URLs, one per zone (default: 0)")
+    parser.add_argument("--devices", nargs="+", default=None,
+                        help="Spotify device name or id for each source, in the same order")
+    parser.add_argument("--zones", default=None,
+                        help='JSON file with a list of {"name", "source", "device"} zones (instead of --sources)')
+    parser.add_argument("--workers", type=int, default=None,
+                        help="face detection threads (default: one per CPU core)")
+    parser.add_argument("--track-faces", action="store_true",
+                        help="run the full face detector only every few frames and track the face in between")
+    parser.add_argument("--detect-interval", type=int, default=5,
+                        help="frames between full face detections when tracking (default: 5)")
+    parser.add_argument("--face-detector", choices=available_detectors(), default=None,
+                        help="face detector (default: FACE_DETECTOR setting or 'haar')")
+    parser.add_argument("--detector-width", type=int, default=None,
+                        help="downscale frames to this width for face detection (default: the detector's own)")
+    parser.add_argument("--backend", choices=available_backends(), default=None,
+                        help="emotion backend (default: EMOTION_BACKEND setting or 'simulated')")
+    parser.add_argument("--max-batch", type=int, default=16,
+                        help="most face crops classified in one forward pass (default: 16)")
+    parser.add_argument("--min-dwell", type=float, default=10.0,
+                        help="minimum seconds to keep an emotion before switching music (default: 10)")
+    parser.add_argument("--headless", action="store_true",
+                        help="no preview windows or frame annotation; stop with SIGTERM/SIGINT")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on this port (/metrics, /metrics.json)")
+    parser.add_argument("--metrics-json", default=None,
+                        help="periodically write metrics as JSON to this file")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between JSON metric dumps (default: 10)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    load_dotenv()
+
+    try:
+        zone_configs = load_zones(args)
+    except ValueError as e:
+        print(e)
+        return
+
+    # One model for all zones
+    classifier = create_backend(args.backend)
+    classifier.start_loading()
+
+    # One Spotify client, device registry and playlist cache, one player per zone device
+    first_player = SpotifyPlayer(os.getenv("SPOTIFY_CLIENT_ID"), os.getenv("SPOTIFY_CLIENT_SECRET"),
+                                 os.getenv("SPOTIFY_REDIRECT_URI"), device=zone_configs[0]['device'])
+    zones = []
+    for i, config in enumerate(zone_configs):
+        player = first_player if i == 0 else first_player.for_device(config['device'])
+        zones.append(Zone(config['name'], config['source'], player, min_dwell=args.min_dwell,
+                          track_faces=args.track_faces, detect_interval=args.detect_interval))
+
+    exporters = start_exporters(args.metrics_port, args.metrics_json, args.metrics_interval)
+    try:
+        MultiStreamProcessor(zones, classifier, workers=args.workers, max_batch=args.max_batch,
+                             headless=args.headless,
+                             face_detector=create_detector(args.face_detector, input_width=args.detector_width)).run()
+    finally:
+        for exporter in exporters:
+            exporter.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Playback Prewarm Module
+Prepares the playback context for the emotion the smoother expects next (see
+EmotionSmoother.likely_next) while the current one is still playing: the playlist is picked
+and its metadata cached, and the device list is refreshed if it is getting old. When the
+switch comes it is a single start_playback call with everything already resolved.
+"""
+
+import threading
+import time
+from spotify_dispatcher import SpotifyDispatcher
+from metrics import PREPARED_SWITCHES
+
+class PlaybackPrewarmer:
+    def __init__(self, choose_context, device_registry, device=None, playlist_cache=None, max_age=30.0):
+        """
+        Initialize the prewarmer and start its worker thread
+
+        Args:
+            choose_context (callable): Takes an emotion and returns the playlist URI to play for it,
+                or None if the context is only known at switch time (e.g. catalog tracks)
+            device_registry (DeviceRegistry): Registry to resolve the device from
+            device (str): Name or id of the device to play on (default: the active device)
+            playlist_cache (PlaylistCache): Cache to warm with the chosen playlist's metadata
+            max_age (float): Seconds a prepared context stays usable (default: 30, the device list TTL)
+        """
+        self.choose_context = choose_context
+        self.device_registry = device_registry
+        self.device = device
+        self.playlist_cache = playlist_cache
+        self.max_age = max_age
+
+        self.prepared = None
+        self.lock = threading.Lock()
+
+        # Own worker, so preparing never delays a switch queued on the playback dispatcher
+        self.dispatcher = SpotifyDispatcher(max_pending=1, name="spotify-prewarm").start()
+
+    def predict(self, emotion):
+        """
+        Prepare the context for the emotion expected next, in the background
+
+        Cheap to call on every detection - nothing happens while the same emotion stays prepared.
+
+        Args:
+            emotion (str): The expected emotion, or None if no change is expected
+        """
+        if emotion is None:
+            return
+        with self.lock:
+            prepared = self.prepared
+        if prepared is not None and prepared['emotion'] == emotion and not self._expired(prepared):
+            return
+        self.dispatcher.submit(self._prepare, emotion, key="prepare")
+
+    def _prepare(self, emotion):
+        context = self.choose_context(emotion)
+        try:
+            if context is not None and self.playlist_cache is not None:
+                # Fetches the name only if it isn't cached yet, so the switch can print it for free
+                self.playlist_cache.get(context)
+
+            # Refreshes the device list if it went stale, so the switch doesn't have to
+            device_id = self.device_registry.get_device_id(self.device)
+        except Exception as e:
+            print(f"Could not prepare playback for {emotion}: {e}")
+            return
+
+        with self.lock:
+            self.prepared = {
+                'emotion': emotion,
+                'context': context,
+                'device_id': device_id,
+                'prepared_at': time.time(),
+            }
+
+    def _expired(self, prepared):
+        return time.time() - prepared['prepared_at'] > self.max_age
+
+    def take(self, emotion):
+        """
+        Get the prepared context for an emotion that is about to play
+
+        Returns:
+            dict: {"emotion", "context", "device_id", "prepared_at"}, or None if a different
+                emotion was prepared (or nothing usable was)
+        """
+        with self.lock:
+            prepared = self.prepared
+            if prepared is not None and prepared['emotion'] == emotion:
+                self.prepared = None
+
+        if prepared is None or prepared['emotion'] != emotion or self._expired(prepared) \
+                or prepared['device_id'] is None:
+            PREPARED_SWITCHES.inc(result="miss")
+            return None
+        PREPARED_SWITCHES.inc(result="hit")
+        return prepared
+
+    def stop(self):
+        """
+        Stop the worker thread
+        """
+        self.dispatcher.stop()
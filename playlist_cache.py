@@ -0,0 +1,144 @@
+"""
+Playlist Cache Module
+Keeps playlist metadata on disk so switching playlists doesn't need an extra Spotify round-trip.
+"""
+
+import json
+import os
+import threading
+import time
+
+class PlaylistCache:
+    def __init__(self, sp, path=".playlist_cache.json", ttl=24 * 60 * 60, fields="name,snapshot_id,tracks.total"):
+        """
+        Initialize the cache and load any entries saved by a previous run
+
+        Args:
+            sp: Authenticated spotipy.Spotify client
+            path (str): File the cache is stored in (default: .playlist_cache.json)
+            ttl (float): Seconds before a cached entry is fetched again (default: one day)
+            fields (str): Spotify fields filter - only these fields are fetched and stored
+        """
+        self.sp = sp
+        self.path = path
+        self.ttl = ttl
+        self.fields = fields
+
+        # uri -> {"fetched_at": timestamp, "data": {...}}
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.prefetch_thread = None
+
+        self._load()
+
+    def _load(self):
+        """
+        Load cached entries from disk, ignoring a missing or damaged file
+        """
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read playlist cache, starting empty: {e}")
+            self.entries = {}
+
+    def save(self):
+        """
+        Write the cache to disk (via a temporary file so a crash can't leave it half written)
+        """
+        with self.lock:
+            data = json.dumps(self.entries)
+
+        tmp_path = f"{self.path}.tmp"
+        with self.save_lock:
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not write playlist cache: {e}")
+
+    def is_fresh(self, uri):
+        """
+        Check whether a playlist is cached and not older than the TTL
+
+        Args:
+            uri (str): Spotify playlist URI
+
+        Returns:
+            bool: True if the cached entry can be used
+        """
+        with self.lock:
+            entry = self.entries.get(uri)
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def get(self, uri, fetch=True):
+        """
+        Get the metadata of a playlist, fetching it if it isn't cached or is stale
+
+        Args:
+            uri (str): Spotify playlist URI
+            fetch (bool): Fetch from Spotify when the cached entry is missing or stale
+
+        Returns:
+            dict: Playlist metadata restricted to the cache fields, or None if not available
+        """
+        if fetch and not self.is_fresh(uri):
+            self._fetch(uri)
+            self.save()
+
+        with self.lock:
+            entry = self.entries.get(uri)
+        return entry["data"] if entry else None
+
+    def get_name(self, uri):
+        """
+        Get the display name of a playlist
+
+        Args:
+            uri (str): Spotify playlist URI
+
+        Returns:
+            str: Playlist name, or the URI if it couldn't be fetched
+        """
+        try:
+            data = self.get(uri)
+        except Exception as e:
+            print(f"Could not fetch playlist details: {e}")
+            data = self.get(uri, fetch=False)
+        return data.get("name", uri) if data else uri
+
+    def _fetch(self, uri):
+        """
+        Fetch the filtered playlist metadata from Spotify and store it
+        """
+        data = self.sp.playlist(uri, fields=self.fields)
+        with self.lock:
+            self.entries[uri] = {"fetched_at": time.time(), "data": data}
+
+    def prefetch(self, uris):
+        """
+        Fetch missing or stale playlists on a background thread
+
+        Args:
+            uris (iterable): Spotify playlist URIs to warm up
+        """
+        stale = [uri for uri in dict.fromkeys(uris) if not self.is_fresh(uri)]
+        if not stale:
+            return
+
+        def warm():
+            for uri in stale:
+                try:
+                    self._fetch(uri)
+                except Exception as e:
+                    print(f"Could not prefetch playlist {uri}: {e}")
+            self.save()
+            print(f"Playlist cache warmed ({len(stale)} playlists fetched)")
+
+        self.prefetch_thread = threading.Thread(target=warm, name="playlist-prefetch", daemon=True)
+        self.prefetch_thread.start()
@@ -0,0 +1,442 @@
+"""
+Process Pipeline Module
+Runs the emotion detector on several processes so face detection and the Python parts of
+classification aren't serialised by the GIL. A capture process decodes frames straight into
+a ring of shared memory slots, inference worker processes read them by slot index without
+copying, and only small result records (frame number, slot, face box, probabilities) travel
+back to the main process over a queue.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from emotion_detector import EmotionDetector
+from emotion_backends import DEFAULT_BACKEND, create_backend, top_emotion
+from face_detectors import FaceDetector, create_detector, largest_face
+from metrics import STAGE_SECONDS, time_stage
+from frame_sources import open_source
+
+# Seconds the main process waits for a result before reporting a missing frame
+RESULT_TIMEOUT = 1.0
+
+# Seconds the main process waits for the workers to load their models
+LOAD_TIMEOUT = 300.0
+
+class SharedFrameRing:
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        """
+        Create a ring of frame slots in shared memory, or attach to an existing one by name
+
+        Args:
+            slots (int): Number of frames the ring holds
+            shape (tuple): Shape of one frame, e.g. (1080, 1920, 3)
+            dtype: Element type of the frames (default: uint8)
+            name (str): Name of an existing ring to attach to, None to create a new one
+        """
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=frame_bytes * slots)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+
+        # One numpy view per slot - reading or writing a frame never copies it between processes
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def frame(self, slot):
+        """
+        Get the frame stored in a slot
+
+        Args:
+            slot (int): Slot index
+
+        Returns:
+            numpy.ndarray: A view into shared memory - valid until the slot is handed out again
+        """
+        return self.frames[slot]
+
+    def write(self, slot, frame):
+        """
+        Copy a frame into a slot, resizing it if the source changed resolution
+        """
+        view = self.frames[slot]
+        if frame.shape == view.shape:
+            view[...] = frame
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=view)
+
+    def close(self):
+        """
+        Detach from the ring, and remove it if this process created it
+        """
+        # The views must go before the memory can be unmapped
+        self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+def _capture_process(source, max_speed, slots, setup, free_slots, jobs, results, workers):
+    """
+    Read frames into the shared ring (runs in the capture process)
+
+    The first frame's shape is sent to the main process, which creates the ring and replies
+    with its name. After that every frame is decoded directly into a free slot and the slot
+    index is queued for the inference workers.
+    """
+    cap = open_source(source, max_speed=max_speed)
+    ret, first_frame = cap.read() if cap.isOpened() else (False, None)
+    if not ret:
+        results.put(("error", f"Could not read from {cap!r}"))
+        cap.release()
+        return
+
+    results.put(("shape", first_frame.shape))
+    ring = SharedFrameRing(slots, first_frame.shape, name=setup.get())
+
+    # Live sources drop frames when every slot is busy so latency can't build up; in max speed
+    # mode (files) capture waits for a slot instead so every frame gets analysed
+    drop_frames = not max_speed
+    scratch = np.empty_like(first_frame)
+    frame_number = 0
+    dropped = 0
+
+    slot = free_slots.get()
+    ring.write(slot, first_frame)
+    try:
+        while True:
+            jobs.put((slot, frame_number, time.time()))
+            frame_number += 1
+
+            # Find a slot for the next frame and decode into it before it is queued
+            slot = None
+            while slot is None:
+                slot = _take_slot(free_slots, drop_frames)
+                if slot is not None:
+                    view = ring.frame(slot)
+                    ret, frame = cap.read(view)
+                    if not ret:
+                        free_slots.put(slot)
+                        return
+                    if frame is not view:
+                        # The source changed resolution and OpenCV decoded into a new array
+                        ring.write(slot, frame)
+                    break
+
+                # Every slot is in use - read anyway to keep the camera buffer drained. The frame
+                # is read before a queued one is given up for it, so the end of a file costs none
+                ret, frame = cap.read(scratch)
+                if not ret:
+                    return
+                dropped += 1
+                slot = _reclaim_slot(jobs)
+                if slot is None:
+                    # Workers have started on every queued frame - this one is dropped
+                    frame_number += 1
+                else:
+                    # The oldest frame still waiting for a worker is dropped for this newer one
+                    ring.write(slot, frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _ in range(workers):
+            jobs.put(None)
+        results.put(("end", frame_number, dropped))
+        cap.release()
+        ring.close()
+
+def _take_slot(free_slots, drop_frames):
+    """
+    Get a free slot to decode the next frame into
+
+    Returns:
+        int: A free slot, or None if every slot is busy and frames may be dropped
+    """
+    if not drop_frames:
+        return free_slots.get()
+
+    try:
+        return free_slots.get_nowait()
+    except queue.Empty:
+        return None
+
+def _reclaim_slot(jobs):
+    """
+    Take back the slot of the oldest queued frame no worker has started on yet
+
+    Returns:
+        int: The reclaimed slot, or None if no frame is waiting
+    """
+    try:
+        job = jobs.get_nowait()
+    except queue.Empty:
+        return None
+    if job is None:
+        return None
+    return job[0]
+
+def _inference_process(ring_name, slots, shape, backend, backend_options, face_detector, jobs, results):
+    """
+    Detect the face and classify its emotion for queued frames (runs in each worker process)
+    """
+    # Each process is one worker - extra OpenCV threads would only compete for the same cores
+    cv2.setNumThreads(1)
+    ring = SharedFrameRing(slots, shape, name=ring_name)
+    face_detector.load()
+    classifier = create_backend(backend, **backend_options)
+    classifier.reuse_buffers = True
+    classifier.load()
+    results.put(("ready",))
+
+    gray = None
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slot, frame_number, captured_at = job
+
+            start = time.perf_counter()
+            frame = ring.frame(slot)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            converted = time.perf_counter()
+
+            face = largest_face(face_detector.detect(frame, gray=gray))
+            detected = time.perf_counter()
+
+            probabilities = None
+            if face is not None:
+                probabilities = classifier.predict_batch([classifier.preprocess(gray, face, slot=0)])[0]
+            classified = time.perf_counter()
+
+            timings = {'convert': converted - start, 'detect_faces': detected - converted,
+                       'classify': classified - detected}
+            results.put(("result", frame_number, slot, face, probabilities, captured_at, timings))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.close()
+
+class ProcessEmotionDetector(EmotionDetector):
+    def __init__(self, source=0, workers=2, backend=None, headless=False, max_speed=False, slots=None,
+                 face_detector=None):
+        """
+        Initialize the detector and start the capture and inference processes
+
+        Args:
+            source: Camera index, video file, image directory or stream URL (see frame_sources.open_source)
+            workers (int): Inference worker processes (default: 2)
+            backend (str): Emotion backend name, loaded once in every worker (default: EMOTION_BACKEND
+                setting or simulated emotions). Each worker classifies one frame at a time.
+            headless (bool): Don't draw on frames or open windows (for running as a service)
+            max_speed (bool): Read video files and image directories as fast as possible, without dropping frames
+            slots (int): Frames in the shared ring (default: workers + 3 - one per worker, one waiting,
+                one being captured and one on screen)
+            face_detector: Face detector name (see face_detectors.available_detectors) or a FaceDetector
+                that hasn't been loaded yet - it is copied to and loaded in every worker
+        """
+        self.headless = headless
+        self.workers = max(1, workers)
+        self.slots = slots or self.workers + 3
+
+        self.emotions = list(self.emotion_colors.keys())
+        self.emotion_change_interval = 15  # seconds
+        self.current_emotion = 'neutral'
+        self.last_probabilities = None
+        self.last_face = None
+
+        backend = backend or os.getenv("EMOTION_BACKEND", DEFAULT_BACKEND)
+        backend_options = {}
+        if backend == "simulated":
+            backend_options = {'emotions': self.emotions, 'change_interval': self.emotion_change_interval}
+        if not isinstance(face_detector, FaceDetector):
+            face_detector = create_detector(face_detector)
+        self.face_detector = face_detector
+
+        # Spawned rather than forked: OpenCV and model runtimes don't survive fork() reliably
+        context = multiprocessing.get_context("spawn")
+        setup = context.Queue()
+        self.free_slots = context.Queue()
+        self.jobs = context.Queue()
+        self.results = context.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+
+        self.capture = context.Process(
+            target=_capture_process, name="capture", daemon=True,
+            args=(source, max_speed, self.slots, setup, self.free_slots, self.jobs, self.results, self.workers))
+        self.capture.start()
+
+        # The ring is sized from the first frame, so wait for the capture process to read one
+        message = self.results.get()
+        if message[0] != "shape":
+            self.capture.join()
+            raise ValueError(f"{message[1]}. Please check your webcam connection or source.")
+        self.ring = SharedFrameRing(self.slots, message[1])
+        setup.put(self.ring.name)
+
+        self.inference = [
+            context.Process(target=_inference_process, name=f"inference-{i}", daemon=True,
+                            args=(self.ring.name, self.slots, self.ring.shape, backend, backend_options,
+                                  face_detector, self.jobs, self.results))
+            for i in range(self.workers)
+        ]
+        for process in self.inference:
+            process.start()
+
+        self.frame_slot = None
+        self.last_frame_number = -1
+        self.ended = False
+        self.read_seconds = 0.0
+
+        # Don't hand out frames before every worker has its model loaded
+        self._wait_until_ready()
+
+        print(f"Emotion detector initialized with {self.workers} inference process(es). Accessing camera feed...")
+
+    def _wait_until_ready(self):
+        """
+        Wait for every inference worker to report that its model is loaded
+
+        Raises:
+            RuntimeError: If a worker exits or the workers don't get ready within LOAD_TIMEOUT
+        """
+        ready = 0
+        deadline = time.monotonic() + LOAD_TIMEOUT
+        while ready < self.workers:
+            try:
+                message = self.results.get(timeout=1.0)
+            except queue.Empty:
+                failed = [process.name for process in self.inference if not process.is_alive()]
+                if failed or time.monotonic() > deadline:
+                    self.release()
+                    reason = f"{', '.join(failed)} exited" if failed else "timed out"
+                    raise RuntimeError(f"Inference workers failed to load the emotion model ({reason})")
+                continue
+
+            if message[0] == "ready":
+                ready += 1
+            elif message[0] == "result":
+                # A faster worker already finished a frame - nobody will show it, so free its slot
+                self.free_slots.put(message[2])
+            elif message[0] == "end":
+                self.ended = True
+                print(f"Capture stopped after {message[1]} frames ({message[2]} dropped)")
+
+    def detect_emotion(self, run_detection=True):
+        """
+        Get the newest analysed frame and its emotion
+
+        Detection always runs in the worker processes, so run_detection is ignored. The frame
+        lives in shared memory and is only valid until the next call.
+
+        Returns:
+            tuple: (frame, emotion) - The analysed frame and the detected emotion
+        """
+        self._release_frame()
+
+        read_start = time.perf_counter()
+        with time_stage("read"):
+            record = self._next_result()
+        self.read_seconds = time.perf_counter() - read_start
+        if record is None:
+            return None, None
+
+        frame_number, slot, face, probabilities, captured_at, timings = record
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        self.frame_slot = slot
+        frame = self.ring.frame(slot)
+
+        self.last_face = face
+        self.last_probabilities = probabilities
+        if probabilities is None:
+            return frame, None
+
+        emotion = top_emotion(probabilities)
+        if emotion != self.current_emotion:
+            self.current_emotion = emotion
+            print(f"Emotion changed to: {self.current_emotion}")
+
+        if not self.headless:
+            with time_stage("draw"):
+                x, y, w, h = face
+                color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
+                cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+
+        return frame, self.current_emotion
+
+    def _next_result(self):
+        """
+        Wait for a result, then skip to the newest one already queued
+
+        Returns:
+            tuple: (frame_number, slot, face, probabilities, captured_at, timings), or None
+        """
+        newest = None
+        deadline = time.monotonic() + RESULT_TIMEOUT
+        while True:
+            try:
+                if newest is None:
+                    # Keep waiting until there's a usable result (stale ones don't count)
+                    message = self.results.get(timeout=max(0, deadline - time.monotonic()))
+                else:
+                    message = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == "end":
+                self.ended = True
+                print(f"Capture stopped after {message[1]} frames ({message[2]} dropped)")
+                continue
+            if message[0] != "result":
+                continue
+
+            record = message[1:]
+            if record[0] < self.last_frame_number or (newest is not None and record[0] < newest[0]):
+                # A worker finished an older frame after a newer one - it's no use any more
+                self.free_slots.put(record[1])
+                continue
+            if newest is not None:
+                self.free_slots.put(newest[1])
+            newest = record
+
+        if newest is None:
+            if not self.ended:
+                print("Failed to capture frame from camera")
+            return None
+
+        self.last_frame_number = newest[0]
+        return newest
+
+    def _release_frame(self):
+        # The caller is done with the previous frame - capture may decode into its slot again
+        if self.frame_slot is not None:
+            self.free_slots.put(self.frame_slot)
+            self.frame_slot = None
+
+    def release(self):
+        """
+        Stop the processes, free the shared ring and close all windows
+        """
+        for process in [self.capture] + self.inference:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=2.0)
+        self.ring.close()
+        if self.headless:
+            print("Capture and inference processes stopped")
+            return
+        cv2.destroyAllWindows()
+        print("Capture and inference processes stopped and windows closed")
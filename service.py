@@ -0,0 +1,68 @@
+"""
+Service Module
+Signal handling for running the player headless, e.g. as a systemd service,
+where there is no window to press 'q' in.
+"""
+
+import signal
+import threading
+
+class ShutdownSignal:
+    def __init__(self, signals=None):
+        """
+        Initialize the handler (call install() to start listening)
+
+        Args:
+            signals (list): Signals that request a shutdown (default: SIGTERM, SIGINT and SIGHUP where available)
+        """
+        if signals is None:
+            names = ["SIGTERM", "SIGINT", "SIGHUP"]
+            signals = [getattr(signal, name) for name in names if hasattr(signal, name)]
+        self.signals = signals
+        self.event = threading.Event()
+        self.previous_handlers = {}
+
+    def install(self):
+        """
+        Install the signal handlers (must be called from the main thread)
+
+        Returns:
+            ShutdownSignal: self, so the call can be chained
+        """
+        for sig in self.signals:
+            self.previous_handlers[sig] = signal.signal(sig, self._handle)
+        return self
+
+    def _handle(self, signum, frame):
+        if self.event.is_set():
+            # A second signal while shutting down - give up on a clean exit
+            raise KeyboardInterrupt
+        print(f"Received {signal.Signals(signum).name}, shutting down...")
+        self.event.set()
+
+    @property
+    def requested(self):
+        """
+        bool: True once a shutdown signal has arrived
+        """
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Sleep until the timeout passes or a shutdown is requested
+
+        Args:
+            timeout (float): Seconds to wait at most
+
+        Returns:
+            bool: True if a shutdown was requested
+        """
+        return self.event.wait(timeout)
+
+    def restore(self):
+        """
+        Put the previous signal handlers back
+        """
+        for sig, handler in self.previous_handlers.items():
+            signal.signal(sig, handler)
+        self.previous_handlers = {}
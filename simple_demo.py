@@ -4,19 +4,23 @@ This simplified application uses OpenCV to detect faces and simulate emotions,
 then recommends music that would match the mood without actually playing it.
 """
 
+import argparse
 import cv2
 import random
 import time
+from face_detectors import available_detectors, create_detector, largest_face
+from frame_sources import open_source
 
 class SimpleEmotionMusicRecommender:
-    def __init__(self):
-        # Initialize the camera
-        self.cap = cv2.VideoCapture(0)
+    def __init__(self, source=0, max_speed=False, face_detector=None, detector_width=None):
+        # Initialize the camera (or video file, image directory or stream)
+        self.cap = open_source(source, max_speed=max_speed)
         if not self.cap.isOpened():
-            raise ValueError("Could not open camera. Please check your webcam connection.")
+            raise ValueError(f"Could not open {self.cap!r}. Please check your webcam connection.")
         
-        # Load the face cascade for face detection
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Load the face detector (Haar cascade unless configured otherwise)
+        self.face_detector = create_detector(face_detector, input_width=detector_width)
+        self.face_detector.load()
         
         # Emotion colors (BGR format)
         self.emotion_colors = {
@@ -60,9 +64,6 @@ class SimpleEmotionMusicRecommender:
                 print("Error: Could not read frame from camera")
                 break
             
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
             # For demo purposes, change emotion every few seconds
             current_time = time.time()
             if current_time - self.last_emotion_time > self.emotion_change_interval:
@@ -70,14 +71,12 @@ class SimpleEmotionMusicRecommender:
                 self.last_emotion_time = current_time
                 self.recommend_music(self.current_emotion)
             
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+            # Detect faces and use the largest one (the detector converts to grayscale if it needs to)
+            face = largest_face(self.face_detector.detect(frame))
             
             # Draw faces and display emotion
-            if len(faces) > 0:
-                # Use the largest face
-                largest_face = max(faces, key=lambda face: face[2] * face[3])
-                x, y, w, h = largest_face
+            if face is not None:
+                x, y, w, h = face
                 
                 # Draw rectangle around face
                 color = self.emotion_colors.get(self.current_emotion, (255, 255, 255))
@@ -117,8 +116,19 @@ class SimpleEmotionMusicRecommender:
         print("-" * 40)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emotion-Based Music Recommender Demo")
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file, image directory or RTSP/HTTP stream URL (default: 0)")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="read video files and image directories as fast as possible instead of in real time")
+    parser.add_argument("--face-detector", choices=available_detectors(), default=None,
+                        help="face detector (default: FACE_DETECTOR setting or 'haar')")
+    parser.add_argument("--detector-width", type=int, default=None,
+                        help="downscale frames to this width for face detection (default: the detector's own)")
+    args = parser.parse_args()
+    
     try:
-        app = SimpleEmotionMusicRecommender()
+        app = SimpleEmotionMusicRecommender(args.source, args.max_speed, args.face_detector, args.detector_width)
         app.run()
     except Exception as e:
         print(f"Error: {e}")
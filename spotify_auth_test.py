@@ -8,6 +8,7 @@ import sys
 from dotenv import load_dotenv
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotify_client import create_spotify_client
 
 def test_spotify_auth():
     """Test Spotify authentication and device availability"""
@@ -48,7 +49,7 @@ def test_spotify_auth():
             cache_path=".spotify_cache"
         )
         
-        sp = spotipy.Spotify(auth_manager=auth_manager)
+        sp = create_spotify_client(auth_manager=auth_manager)
         
         # Test authorization by getting current user
         user = sp.current_user()
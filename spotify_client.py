@@ -0,0 +1,207 @@
+"""
+Spotify Client Module
+Builds Spotify clients that share one pooled HTTP session and one rate limiter,
+and retry throttled or failed requests with backoff instead of giving up.
+"""
+
+import random
+import threading
+import time
+import requests
+import spotipy
+from metrics import SPOTIFY_REQUESTS, SPOTIFY_SECONDS, spotify_endpoint
+
+class TokenBucket:
+    def __init__(self, rate=5.0, capacity=10):
+        """
+        Initialize the token bucket
+
+        Args:
+            rate (float): Tokens added per second - the sustained request rate (default: 5)
+            capacity (int): Maximum number of tokens - the largest allowed burst (default: 10)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, waiting until one is available
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for a while, e.g. after Spotify asked us to back off
+
+        Args:
+            seconds (float): How long to pause
+        """
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class RateLimitedSpotify(spotipy.Spotify):
+    """
+    spotipy.Spotify that waits for the rate limiter before each request and retries
+    429 (following Retry-After), 5xx and connection errors with jittered exponential backoff
+    """
+
+    def __init__(self, *args, rate_limiter=None, max_attempts=4, base_delay=0.5, max_delay=30.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _internal_call(self, method, url, payload, params):
+        endpoint = spotify_endpoint(url)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            start = time.perf_counter()
+            try:
+                # spotipy removes keys from params, so give every attempt its own copy
+                result = super()._internal_call(method, url, payload, dict(params))
+                SPOTIFY_REQUESTS.inc(method=method, endpoint=endpoint, status="ok")
+                return result
+            except Exception as e:
+                SPOTIFY_REQUESTS.inc(method=method, endpoint=endpoint, status=_describe(e))
+                if attempt >= self.max_attempts or not is_transient_error(e):
+                    raise
+                error = e
+            finally:
+                SPOTIFY_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+
+            retry_after = _retry_after(error)
+            if retry_after is not None:
+                # Retrying before Retry-After only earns another 429 - give up if it's too long to wait
+                if retry_after > self.max_delay:
+                    print(f"Spotify asked to wait {retry_after:.0f}s (more than {self.max_delay:.0f}s) - giving up")
+                    raise error
+                delay = retry_after
+            else:
+                backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+                delay = random.uniform(backoff / 2, backoff)
+
+            print(f"Spotify request failed ({_describe(error)}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{self.max_attempts})")
+
+            if retry_after is not None and self.rate_limiter is not None:
+                # Everyone sharing the limiter has to back off - the retry waits in acquire()
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+def is_transient_error(error):
+    """
+    Check whether an error is worth retrying rather than giving up on Spotify
+
+    Args:
+        error (Exception): Error raised by a Spotify call
+
+    Returns:
+        bool: True for rate limiting, server errors and network problems
+    """
+    if isinstance(error, spotipy.exceptions.SpotifyException):
+        return error.http_status == 429 or (error.http_status or 0) >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+def _retry_after(error):
+    """
+    Get the Retry-After value in seconds from a 429 error, if there is one
+    """
+    if not isinstance(error, spotipy.exceptions.SpotifyException) or error.http_status != 429:
+        return None
+
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def _describe(error):
+    if isinstance(error, spotipy.exceptions.SpotifyException):
+        return f"HTTP {error.http_status}"
+    return type(error).__name__
+
+# Shared by every client created in this process
+_shared_session = None
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+def get_shared_session(pool_size=10):
+    """
+    Get the process-wide HTTP session with a keep-alive connection pool
+
+    Retries are handled by RateLimitedSpotify, so the session itself doesn't retry.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host (default: 10)
+
+    Returns:
+        requests.Session: The shared session
+    """
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _shared_session = session
+        return _shared_session
+
+def get_shared_limiter(rate=5.0, capacity=10):
+    """
+    Get the process-wide rate limiter
+
+    Args:
+        rate (float): Sustained requests per second (default: 5)
+        capacity (int): Largest allowed burst (default: 10)
+
+    Returns:
+        TokenBucket: The shared limiter
+    """
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = TokenBucket(rate, capacity)
+        return _shared_limiter
+
+def create_spotify_client(auth_manager=None, auth=None, requests_timeout=5, max_attempts=4):
+    """
+    Create a Spotify client on the shared session and rate limiter
+
+    Args:
+        auth_manager: spotipy auth manager (e.g. SpotifyOAuth)
+        auth (str): Access token, if not using an auth manager
+        requests_timeout (float): Seconds before a request times out (default: 5)
+        max_attempts (int): Attempts per request for transient errors (default: 4)
+
+    Returns:
+        RateLimitedSpotify: The client
+    """
+    return RateLimitedSpotify(
+        auth=auth,
+        auth_manager=auth_manager,
+        requests_session=get_shared_session(),
+        requests_timeout=requests_timeout,
+        rate_limiter=get_shared_limiter(),
+        max_attempts=max_attempts,
+    )
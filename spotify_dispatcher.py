@@ -0,0 +1,138 @@
+"""
+Spotify Dispatcher Module
+Runs Spotify API calls on a background thread so the video loop never waits on the network.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+class SpotifyDispatcher:
+    def __init__(self, max_pending=8, name="spotify-dispatcher"):
+        """
+        Initialize the dispatcher
+
+        Args:
+            max_pending (int): Maximum number of commands waiting to run (default: 8)
+            name (str): Name of the worker thread
+        """
+        self.max_pending = max(1, max_pending)
+        self.name = name
+
+        # key -> (func, args, kwargs); commands submitted with the same key replace each other
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.unique_keys = itertools.count()
+        self.busy = False
+
+        # Statistics
+        self.commands_run = 0
+        self.commands_coalesced = 0
+        self.commands_dropped = 0
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """
+        Start the worker thread
+
+        Returns:
+            SpotifyDispatcher: self, so the call can be chained
+        """
+        with self.condition:
+            if self.running:
+                return self
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, func, *args, key=None, **kwargs):
+        """
+        Queue a command to run on the worker thread
+
+        Args:
+            func: Function to call
+            *args: Positional arguments for func
+            key: Commands with the same key are coalesced - only the latest pending one runs
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            bool: True if the command was queued
+        """
+        with self.condition:
+            if not self.running:
+                return False
+
+            if key is None:
+                key = ("unique", next(self.unique_keys))
+            else:
+                key = ("keyed", key)
+
+            if key in self.pending:
+                # Latest wins - replace the older pending command
+                del self.pending[key]
+                self.commands_coalesced += 1
+            elif len(self.pending) >= self.max_pending:
+                # Queue is full - drop the oldest one-off command, keeping the latest keyed state if possible
+                oldest = next((k for k in self.pending if k[0] == "unique"), next(iter(self.pending)))
+                del self.pending[oldest]
+                self.commands_dropped += 1
+                print("Spotify dispatcher queue full - dropped the oldest command")
+
+            self.pending[key] = (func, args, kwargs)
+            self.condition.notify_all()
+            return True
+
+    def _run(self):
+        """
+        Run queued commands one at a time until stopped
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or not self.running)
+                if not self.pending:
+                    # Stopped and nothing left to do
+                    break
+                _, (func, args, kwargs) = self.pending.popitem(last=False)
+                self.busy = True
+
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"Spotify command failed: {e}")
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.commands_run += 1
+                    self.condition.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """
+        Wait until every queued command has run
+
+        Args:
+            timeout (float): Seconds to wait, or None to wait forever
+
+        Returns:
+            bool: True if the dispatcher is idle
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+    def stop(self, timeout=2.0):
+        """
+        Stop the worker thread after it finishes the queued commands
+
+        Args:
+            timeout (float): Seconds to wait for the worker to finish
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
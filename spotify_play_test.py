@@ -8,6 +8,7 @@ import time
 import random
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotify_client import create_spotify_client
 from dotenv import load_dotenv
 
 def main():
@@ -65,7 +66,7 @@ def main():
             show_dialog=True
         )
         
-        sp = spotipy.Spotify(auth_manager=auth_manager)
+        sp = create_spotify_client(auth_manager=auth_manager)
         user = sp.current_user()
         print(f"Connected as: {user['display_name']}")
         
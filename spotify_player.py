@@ -6,10 +6,56 @@ Handles Spotify authentication and playing music based on detected emotions.
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
 import random
-import time
+from spotify_dispatcher import SpotifyDispatcher
+from playlist_cache import PlaylistCache
+from device_registry import DeviceRegistry
+from playback_prewarm import PlaybackPrewarmer
+from spotify_client import create_spotify_client, is_transient_error
+from token_manager import SharedTokenCache, TokenManager
+from metrics import PLAYBACK_SWITCHES, time_stage
+
+# Playlists for each emotion - one is picked at random when the emotion starts playing
+EMOTION_PLAYLISTS = {
+    'happy': [
+        'spotify:playlist:37i9dQZF1DXdPec7aLTmlC',  # Happy Hits!
+        'spotify:playlist:37i9dQZF1DX9XIFQuFvzM4',  # Feelin' Good
+        'spotify:playlist:37i9dQZF1DX2sUQwD7tbmL'   # Feel-Good Indie Rock
+    ],
+    'sad': [
+        'spotify:playlist:37i9dQZF1DX7qK8ma5wgG1',  # Sad Hours
+        'spotify:playlist:37i9dQZF1DX889U0CL85jj',  # Down in the Dumps
+        'spotify:playlist:37i9dQZF1DX3YSRoSdA634'   # Life Sucks
+    ],
+    'angry': [
+        'spotify:playlist:37i9dQZF1DX1tyCD9QhIWF',  # Anger Management
+        'spotify:playlist:37i9dQZF1DX4eRPd9frC1m',  # Rock Hard
+        'spotify:playlist:37i9dQZF1DWXIcbzpLauPS'   # Adrenaline Workout
+    ],
+    'neutral': [
+        'spotify:playlist:37i9dQZF1DX4sWSpwq3LiO',  # Peaceful Piano
+        'spotify:playlist:37i9dQZF1DWZeKCadgRdKQ',  # Deep Focus
+        'spotify:playlist:37i9dQZF1DWZqd5JICZI0u'   # Instrumental Study
+    ],
+    'fear': [
+        'spotify:playlist:37i9dQZF1DX6SZazidEqln',  # Confidence Boost
+        'spotify:playlist:37i9dQZF1DX4fpCWaHOned',  # Positive Vibes
+        'spotify:playlist:37i9dQZF1DX9XIFQuFvzM4'   # Feelin' Good
+    ],
+    'disgust': [
+        'spotify:playlist:37i9dQZF1DWZMCPjHG57Sq',  # Soothing Relaxation
+        'spotify:playlist:37i9dQZF1DXcF6B6QPhFDv',  # Mindful Moments
+        'spotify:playlist:37i9dQZF1DWYoYGBbGKurt'   # Ambient Relaxation
+    ],
+    'surprise': [
+        'spotify:playlist:37i9dQZF1DX5Vy6DFOcx00',  # Dance Classics
+        'spotify:playlist:37i9dQZF1DX0BcQWzuB7ZO',  # Dance Party
+        'spotify:playlist:37i9dQZF1DX8tZsk68tuDw'   # Dance Rising
+    ]
+}
 
 class SpotifyPlayer:
-    def __init__(self, client_id, client_secret, redirect_uri):
+    def __init__(self, client_id, client_secret, redirect_uri, non_blocking=True, sp=None,
+                 device=None, device_registry=None, playlist_cache=None, catalog=None):
         """
         Initialize the Spotify player with developer credentials
         
@@ -17,82 +63,114 @@ class SpotifyPlayer:
             client_id (str): Spotify Developer Client ID
             client_secret (str): Spotify Developer Client Secret
             redirect_uri (str): Redirect URI set in Spotify Developer Dashboard
+            non_blocking (bool): Run playback calls on a background thread (default: True)
+            sp: Ready-made Spotify client to use instead of authenticating (e.g. one pointed at a test server)
+            device (str): Name or id of the device to play on (default: the active device)
+            device_registry (DeviceRegistry): Registry shared with other players (default: a new one)
+            playlist_cache (PlaylistCache): Playlist cache shared with other players (default: a new one)
+            catalog (TrackCatalog): Track catalog to pick tracks by mood from, instead of a random
+                playlist per emotion (default: none, use playlists)
         """
         self.scope = "user-read-playback-state,user-modify-playback-state"
+        
+        # Background worker for playback calls - only the latest emotion change is sent
+        self.dispatcher = SpotifyDispatcher().start() if non_blocking else None
+        self.device = device
+        self.catalog = catalog
+        self.device_registry = None
+        self.owns_registry = device_registry is None
+        self.prewarmer = None
+        self.token_manager = None
+        
+        self.sp = sp if sp is not None else self._authenticate(client_id, client_secret, redirect_uri)
+        if self.sp is None:
+            print("Falling back to demo mode...")
+            # Create a demo mode indicator
+            self.demo_mode = True
+            self.emotion_playlists = {}
+            return
+        
+        # Keep the device list cached and refreshed in the background
+        self.device_registry = device_registry or DeviceRegistry(self.sp).start()
+        
+        # Check if the user has an active device
+        self._check_devices()
+        
+        # Emotion to playlist mapping
+        self.emotion_playlists = {emotion: list(uris) for emotion, uris in EMOTION_PLAYLISTS.items()}
+        
+        # Keep track of current emotion and playlist
+        self.current_emotion = None
+        self.current_playlist = None
+        
+        # Warm the playlist metadata cache in the background so switches don't fetch it
+        # (not needed when tracks come from the catalog)
+        if playlist_cache is None:
+            playlist_cache = PlaylistCache(self.sp)
+            if catalog is None:
+                playlist_cache.prefetch(uri for uris in self.emotion_playlists.values() for uri in uris)
+        self.playlist_cache = playlist_cache
+        
+        # Resolve the playlist and device for the emotion expected next while the current one plays
+        self.prewarmer = PlaybackPrewarmer(self._choose_playlist if catalog is None else lambda emotion: None,
+                                           self.device_registry, device=device, playlist_cache=playlist_cache)
+        
+        print("Spotify player initialized.")
+    
+    def for_device(self, device):
+        """
+        Create another player for a different device that shares this player's client,
+        device registry and playlist cache
+        
+        Args:
+            device (str): Name or id of the device the new player plays on
+        
+        Returns:
+            SpotifyPlayer: The new player
+        """
+        return SpotifyPlayer(None, None, None, non_blocking=self.dispatcher is not None, sp=self.sp, device=device,
+                             device_registry=self.device_registry, playlist_cache=getattr(self, 'playlist_cache', None),
+                             catalog=self.catalog)
+    
+    def _authenticate(self, client_id, client_secret, redirect_uri):
+        """
+        Authenticate with Spotify through the browser
+        
+        Returns:
+            spotipy.Spotify: The client, or None if authentication failed
+        """
+        if not client_id or not client_secret:
+            print("No Spotify credentials configured")
+            return None
+        
         try:
             print(f"Authenticating with Spotify: {client_id[:5]}...")
             print(f"Using redirect URI: {redirect_uri}")
             print("Opening browser for authentication - please login and authorize the app")
             
-            # Initialize auth manager - more tolerant of redirect URI differences
+            # Initialize auth manager - more tolerant of redirect URI differences. The token cache
+            # is shared with other processes (e.g. the async pipeline or a second player)
             auth_manager = SpotifyOAuth(
                 client_id=client_id,
                 client_secret=client_secret,
                 redirect_uri=redirect_uri,
                 scope=self.scope,
                 open_browser=True,
-                show_dialog=True
+                show_dialog=True,
+                cache_handler=SharedTokenCache(".spotify_cache")
             )
             
-            # Create Spotify client
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            # Refresh the token in the background before it expires, so no request waits for it
+            self.token_manager = TokenManager(auth_manager).start()
+            
+            # Create Spotify client (pooled connections, rate limited, retries throttled requests)
+            sp = create_spotify_client(auth_manager=self.token_manager)
             print("Authentication successful!")
+            return sp
             
         except Exception as e:
             print(f"Spotify authentication error: {e}")
-            print("Falling back to demo mode...")
-            # Create a demo mode indicator
-            self.demo_mode = True
-            self.emotion_playlists = {}
-            return
-        
-        # Check if the user has an active device
-        self._check_devices()
-        
-        # Define emotion to playlist mapping
-        self.emotion_playlists = {
-            'happy': [
-                'spotify:playlist:37i9dQZF1DXdPec7aLTmlC',  # Happy Hits!
-                'spotify:playlist:37i9dQZF1DX9XIFQuFvzM4',  # Feelin' Good
-                'spotify:playlist:37i9dQZF1DX2sUQwD7tbmL'   # Feel-Good Indie Rock
-            ],
-            'sad': [
-                'spotify:playlist:37i9dQZF1DX7qK8ma5wgG1',  # Sad Hours
-                'spotify:playlist:37i9dQZF1DX889U0CL85jj',  # Down in the Dumps
-                'spotify:playlist:37i9dQZF1DX3YSRoSdA634'   # Life Sucks
-            ],
-            'angry': [
-                'spotify:playlist:37i9dQZF1DX1tyCD9QhIWF',  # Anger Management
-                'spotify:playlist:37i9dQZF1DX4eRPd9frC1m',  # Rock Hard
-                'spotify:playlist:37i9dQZF1DWXIcbzpLauPS'   # Adrenaline Workout
-            ],
-            'neutral': [
-                'spotify:playlist:37i9dQZF1DX4sWSpwq3LiO',  # Peaceful Piano
-                'spotify:playlist:37i9dQZF1DWZeKCadgRdKQ',  # Deep Focus
-                'spotify:playlist:37i9dQZF1DWZqd5JICZI0u'   # Instrumental Study
-            ],
-            'fear': [
-                'spotify:playlist:37i9dQZF1DX6SZazidEqln',  # Confidence Boost
-                'spotify:playlist:37i9dQZF1DX4fpCWaHOned',  # Positive Vibes
-                'spotify:playlist:37i9dQZF1DX9XIFQuFvzM4'   # Feelin' Good
-            ],
-            'disgust': [
-                'spotify:playlist:37i9dQZF1DWZMCPjHG57Sq',  # Soothing Relaxation
-                'spotify:playlist:37i9dQZF1DXcF6B6QPhFDv',  # Mindful Moments
-                'spotify:playlist:37i9dQZF1DWYoYGBbGKurt'   # Ambient Relaxation
-            ],
-            'surprise': [
-                'spotify:playlist:37i9dQZF1DX5Vy6DFOcx00',  # Dance Classics
-                'spotify:playlist:37i9dQZF1DX0BcQWzuB7ZO',  # Dance Party
-                'spotify:playlist:37i9dQZF1DX8tZsk68tuDw'   # Dance Rising
-            ]
-        }
-        
-        # Keep track of current emotion and playlist
-        self.current_emotion = None
-        self.current_playlist = None
-        
-        print("Spotify player initialized.")
+            return None
     
     def _check_devices(self):
         """
@@ -105,22 +183,21 @@ class SpotifyPlayer:
                 print("Running in demo mode - device check skipped")
                 return
                 
-            devices = self.sp.devices()
-            if not devices['devices']:
-                print("WARNING: No active Spotify devices found!")
-                print("Please open Spotify on your computer or phone and start playing any song")
+            if self.device_registry.get_device(self.device) is None:
+                if self.device:
+                    print(f"WARNING: Spotify device '{self.device}' not found!")
+                    print("Please open Spotify on that device and start playing any song")
+                else:
+                    print("WARNING: No active Spotify devices found!")
+                    print("Please open Spotify on your computer or phone and start playing any song")
                 print("Then pause it and return to this application")
                 print("Waiting for an active device...")
                 
-                # Wait until a device is available
-                attempts = 0
-                while attempts < 3:
-                    time.sleep(5)
-                    devices = self.sp.devices()
-                    if devices['devices']:
-                        print(f"Found active device: {devices['devices'][0]['name']}")
-                        return
-                    attempts += 1
+                # Wait until the background refresh finds a device
+                device = self.device_registry.wait_for_device(timeout=15, preferred=self.device)
+                if device is not None:
+                    print(f"Found active device: {device['name']}")
+                    return
                 
                 print("No devices found after waiting. Music playback may not work.")
                 print("Please ensure Spotify is open on at least one of your devices.")
@@ -133,12 +210,55 @@ class SpotifyPlayer:
             self.demo_mode = True
             print("Switching to demo mode due to error")
     
-    def play_music_for_emotion(self, emotion):
+    def _choose_playlist(self, emotion):
+        """
+        Pick a random playlist for an emotion (neutral's if the emotion isn't recognized)
+        """
+        playlists = self.emotion_playlists.get(emotion, self.emotion_playlists['neutral'])
+        return random.choice(playlists)
+    
+    def prepare_next(self, emotion):
+        """
+        Prepare playback for the emotion that is likely to be detected next, so the switch is a
+        single Spotify call (see EmotionSmoother.likely_next)
+        
+        Args:
+            emotion (str): The expected emotion, or None if no change is expected
+        """
+        if self.prewarmer is None or emotion is None or emotion == self.current_emotion:
+            return
+        if hasattr(self, 'demo_mode') and self.demo_mode:
+            return
+        self.prewarmer.predict(emotion)
+    
+    def play_music_for_emotion(self, emotion, probabilities=None):
         """
         Play music that matches the detected emotion
         
+        With non_blocking enabled this returns immediately and the Spotify calls
+        run on the dispatcher thread. Pending emotion changes are coalesced, so
+        only the latest one is sent.
+        
+        Args:
+            emotion (str): The detected emotion
+            probabilities (dict): Smoothed {emotion: probability} - with a track catalog, tracks are
+                matched to the blended mood instead of the emotion alone
+        """
+        if probabilities is not None:
+            # The caller keeps updating its dict - send a snapshot
+            probabilities = dict(probabilities)
+        if self.dispatcher is not None:
+            self.dispatcher.submit(self._play_music_for_emotion, emotion, probabilities, key="play_emotion")
+        else:
+            self._play_music_for_emotion(emotion, probabilities)
+    
+    def _play_music_for_emotion(self, emotion, probabilities=None):
+        """
+        Play music that matches the detected emotion, blocking until the Spotify calls finish
+        
         Args:
             emotion (str): The detected emotion
+            probabilities (dict): Smoothed {emotion: probability}, used with a track catalog
         """
         # Check if we're in demo mode after an authentication error
         if hasattr(self, 'demo_mode') and self.demo_mode:
@@ -166,47 +286,90 @@ class SpotifyPlayer:
             # Update current emotion
             self.current_emotion = emotion
             
-            # Get the list of playlists for this emotion, or use neutral if emotion not recognized
-            playlists = self.emotion_playlists.get(emotion, self.emotion_playlists['neutral'])
+            # Playlist and device resolved ahead of time if this emotion was predicted
+            prepared = self.prewarmer.take(emotion)
             
-            # Select a random playlist from the list
-            self.current_playlist = random.choice(playlists)
+            if self.catalog is not None:
+                # Tracks nearest to the detected mood
+                tracks = self.catalog.recommend(probabilities or emotion)
+                self.current_playlist = tracks[0] if tracks else None
+            elif prepared is not None:
+                self.current_playlist = prepared['context']
+            else:
+                # Select a random playlist for this emotion
+                self.current_playlist = self._choose_playlist(emotion)
             
-            # Check available devices again in case the active device changed
-            devices = self.sp.devices()
-            if not devices['devices']:
+            # Use the prepared or cached device - the registry refreshes it in the background
+            if prepared is not None:
+                device_id = prepared['device_id']
+            else:
+                device_id = self.device_registry.get_device_id(self.device)
+            if device_id is None:
+                # The registry keeps looking in the background, so the next switch can retry
                 print("No active Spotify devices found. Please open Spotify on a device.")
-                # Switch to demo mode
-                self.demo_mode = True
-                print("Switching to demo mode - no devices available")
-                self.play_music_for_emotion(emotion)  # Retry in demo mode
+                self.current_playlist = None
                 return
             
-            # Get the active device id
-            device_id = devices['devices'][0]['id']
+            # Start playing the selected tracks or playlist
+            with time_stage("spotify_playback"):
+                if self.catalog is not None:
+                    self.sp.start_playback(device_id=device_id, uris=tracks)
+                else:
+                    self.sp.start_playback(device_id=device_id, context_uri=self.current_playlist)
+            PLAYBACK_SWITCHES.inc(emotion=emotion)
             
-            # Start playing the selected playlist
-            self.sp.start_playback(device_id=device_id, context_uri=self.current_playlist)
+            if self.catalog is not None:
+                print(f"Now playing: {len(tracks)} tracks for {self.catalog.describe(probabilities or emotion)} "
+                      f"(Emotion: {emotion})")
+                return
             
-            # Get the playlist details to display to the user
-            playlist_info = self.sp.playlist(self.current_playlist)
-            print(f"Now playing: {playlist_info['name']} (Emotion: {emotion})")
+            # Get the playlist name to display to the user (cached)
+            playlist_name = self.playlist_cache.get_name(self.current_playlist)
+            print(f"Now playing: {playlist_name} (Emotion: {emotion})")
             
         except spotipy.exceptions.SpotifyException as e:
             print(f"Spotify error: {e}")
-            if "NO_ACTIVE_DEVICE" in str(e):
+            if is_transient_error(e):
+                # Still rate limited or failing after retries - keep real playback and retry on the next switch
+                print("Spotify is temporarily unavailable - will retry on the next emotion change")
+                self.current_playlist = None
+                return
+            elif "NO_ACTIVE_DEVICE" in str(e):
                 print("Please open Spotify on your device and play/pause a song to activate it.")
+                
+                # The cached device is gone - refresh right away and let the next switch retry
+                self.device_registry.invalidate()
+                self.current_playlist = None
+                return
             elif "PREMIUM_REQUIRED" in str(e):
                 print("This feature requires Spotify Premium.")
             
             # Switch to demo mode
             self.demo_mode = True
             print("Switching to demo mode due to Spotify error")
-            self.play_music_for_emotion(emotion)  # Retry in demo mode
+            self._play_music_for_emotion(emotion)  # Retry in demo mode
             
         except Exception as e:
+            if is_transient_error(e):
+                print(f"Network error talking to Spotify: {e} - will retry on the next emotion change")
+                self.current_playlist = None
+                return
+            
             print(f"Unexpected error: {e}")
             # Switch to demo mode
             self.demo_mode = True
             print("Switching to demo mode due to unexpected error")
-            self.play_music_for_emotion(emotion)  # Retry in demo mode
+            self._play_music_for_emotion(emotion)  # Retry in demo mode
+    
+    def close(self):
+        """
+        Stop the background dispatcher, playback prewarming, device and token refresh
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+        if self.prewarmer is not None:
+            self.prewarmer.stop()
+        if self.token_manager is not None:
+            self.token_manager.stop()
+        if self.device_registry is not None and self.owns_registry:
+            self.device_registry.stop()
@@ -0,0 +1,144 @@
+"""
+Startup Module
+Runs the slow startup steps (opening the camera, loading the face cascade and emotion model,
+connecting to Spotify) at the same time instead of one after another, so the video loop can
+start as soon as the camera is open and playback comes online whenever Spotify is ready.
+"""
+
+import threading
+import time
+from metrics import STARTUP_SECONDS, TIME_TO_FIRST_FRAME
+
+class StartupOrchestrator:
+    def __init__(self):
+        """
+        Initialize an empty set of startup steps (add them with add(), then call start())
+        """
+        self.started_at = time.perf_counter()
+        self.steps = {}
+        self.lock = threading.Lock()
+        self.first_frame_seconds = None
+
+    def add(self, name, func, requires=()):
+        """
+        Add a startup step
+
+        Args:
+            name (str): Step name, e.g. "camera"
+            func (callable): Does the work - its return value is the step's result
+            requires (tuple): Names of steps that must finish first
+
+        Returns:
+            StartupOrchestrator: self, so calls can be chained
+        """
+        self.steps[name] = {
+            'func': func,
+            'requires': tuple(requires),
+            'done': threading.Event(),
+            'result': None,
+            'error': None,
+            'seconds': None,
+        }
+        return self
+
+    def start(self):
+        """
+        Start every step on its own thread - steps with requirements wait for them first
+
+        Returns:
+            StartupOrchestrator: self, so the call can be chained
+        """
+        for name in self.steps:
+            threading.Thread(target=self._run_step, args=(name,), name=f"startup-{name}", daemon=True).start()
+        return self
+
+    def _run_step(self, name):
+        step = self.steps[name]
+        for required in step['requires']:
+            self.wait(required)
+
+        start = time.perf_counter()
+        try:
+            step['result'] = step['func']()
+        except Exception as e:
+            step['error'] = e
+            print(f"Startup step '{name}' failed: {e}")
+        finally:
+            step['seconds'] = time.perf_counter() - start
+            STARTUP_SECONDS.set(step['seconds'], step=name)
+            print(f"Startup: {name} ready after {time.perf_counter() - self.started_at:.2f}s "
+                  f"(took {step['seconds']:.2f}s)")
+            step['done'].set()
+
+    def done(self, name):
+        """
+        bool: True once the step has finished (successfully or not)
+        """
+        return self.steps[name]['done'].is_set()
+
+    def wait(self, name, timeout=None):
+        """
+        Wait for a step to finish
+
+        Args:
+            name (str): Step name
+            timeout (float): Seconds to wait at most, None to wait for as long as it takes
+
+        Returns:
+            bool: True if the step has finished
+        """
+        return self.steps[name]['done'].wait(timeout)
+
+    def wait_all(self, timeout=None):
+        """
+        Wait for every step to finish, e.g. before shutting down after a short input
+
+        Args:
+            timeout (float): Seconds to wait at most in total, None to wait for as long as it takes
+
+        Returns:
+            bool: True if every step has finished
+        """
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        for name in self.steps:
+            remaining = max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+            if not self.wait(name, remaining):
+                return False
+        return True
+
+    def result(self, name, timeout=None):
+        """
+        Get a step's result, waiting for it to finish first
+
+        Returns:
+            The value returned by the step, or None if it failed or didn't finish in time
+        """
+        if not self.wait(name, timeout):
+            return None
+        return self.steps[name]['result']
+
+    def first_frame(self):
+        """
+        Record the time to the first frame (call for every frame shown - only the first one counts)
+
+        Returns:
+            float: Seconds from startup to the first frame
+        """
+        with self.lock:
+            if self.first_frame_seconds is None:
+                self.first_frame_seconds = time.perf_counter() - self.started_at
+                TIME_TO_FIRST_FRAME.set(self.first_frame_seconds)
+                print(f"Startup: first frame after {self.first_frame_seconds:.2f}s")
+        return self.first_frame_seconds
+
+    def summary(self):
+        """
+        Get the duration of every finished step
+
+        Returns:
+            dict: {step: seconds}, plus "first_frame" once a frame was shown
+        """
+        timings = {name: step['seconds'] for name, step in self.steps.items() if step['seconds'] is not None}
+        if self.first_frame_seconds is not None:
+            timings['first_frame'] = self.first_frame_seconds
+        return timings
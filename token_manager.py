@@ -0,0 +1,256 @@
+"""
+Token Manager Module
+Keeps the Spotify access token fresh in the background, so no request has to wait for a
+refresh round-trip when the token expires. The token cache file can be shared by several
+processes (the player, batch workers, zone players): it is only written under a file lock
+and replaced atomically, and whoever gets the lock first refreshes while the others pick
+up the new token from the file instead of refreshing again.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from spotipy.cache_handler import CacheHandler
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Refresh this many seconds before the token expires (tokens last an hour)
+REFRESH_MARGIN = 300
+
+# Seconds to wait before trying again after a failed refresh
+RETRY_INTERVAL = 30
+
+class SharedTokenCache(CacheHandler):
+    def __init__(self, path=".spotify_cache"):
+        """
+        Initialize a token cache file that several processes can share
+
+        Args:
+            path (str): Cache file (default: .spotify_cache); "<path>.lock" is used as the lock file
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+        # Reentrant within the process, exclusive across processes
+        self.thread_lock = threading.RLock()
+        self.lock_depth = 0
+        self.lock_file = None
+
+        # Last token read and the file's (inode, mtime) then, so unchanged files aren't parsed again
+        self.token = None
+        self.stamp = None
+
+    def locked(self):
+        """
+        Context manager holding the cache lock (across processes too)
+        """
+        return _CacheLock(self)
+
+    def _acquire(self):
+        self.thread_lock.acquire()
+        if self.lock_depth == 0:
+            try:
+                self.lock_file = open(self.lock_path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.lock_file.seek(0)
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            except OSError:
+                if self.lock_file is not None:
+                    self.lock_file.close()
+                    self.lock_file = None
+                self.thread_lock.release()
+                raise
+        self.lock_depth += 1
+
+    def _release(self):
+        self.lock_depth -= 1
+        if self.lock_depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.lock_file.seek(0)
+                msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.lock_file.close()
+            self.lock_file = None
+        self.thread_lock.release()
+
+    def get_cached_token(self):
+        """
+        Get the cached token, reading the file only if another process replaced it
+
+        Returns:
+            dict: spotipy token info, or None if there is no (readable) cache
+        """
+        try:
+            stamp = self._stamp()
+        except OSError:
+            return None
+        if stamp == self.stamp:
+            return self.token
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                token = json.load(f)
+        except (OSError, ValueError) as e:
+            # Writes are atomic, so this is a damaged file rather than a half written one
+            print(f"Could not read Spotify token cache: {e}")
+            return None
+        self.token, self.stamp = token, stamp
+        return token
+
+    def _stamp(self):
+        # Atomic replaces change the inode, in-place edits the mtime
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def save_token_to_cache(self, token_info):
+        """
+        Write a token (via a temporary file and an atomic rename, under the cache lock)
+        """
+        with self.locked():
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                # Owner-only permissions - the file holds the refresh token
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(token_info, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not write Spotify token cache: {e}")
+                return
+            self.token = token_info
+            self.stamp = self._stamp()
+
+class _CacheLock:
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __enter__(self):
+        self.cache._acquire()
+        return self.cache
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cache._release()
+
+class TokenManager:
+    def __init__(self, auth_manager, refresh_margin=REFRESH_MARGIN):
+        """
+        Initialize the manager (call start() to begin refreshing in the background)
+
+        Use it as the auth manager of Spotify clients in place of auth_manager.
+
+        Args:
+            auth_manager: spotipy.oauth2.SpotifyOAuth whose cache_handler is a SharedTokenCache
+            refresh_margin (float): Seconds before expiry to refresh the token (default: 300)
+        """
+        if not isinstance(auth_manager.cache_handler, SharedTokenCache):
+            raise ValueError("TokenManager needs an auth manager with a SharedTokenCache")
+        self.auth_manager = auth_manager
+        self.cache = auth_manager.cache_handler
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start the background refresh thread
+
+        Returns:
+            TokenManager: self, so the call can be chained
+        """
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._refresh_loop, name="spotify-token", daemon=True)
+            self.thread.start()
+        return self
+
+    def _refresh_loop(self):
+        while not self.stop_event.is_set():
+            token = self.cache.get_cached_token()
+            if token is None or 'expires_at' not in token:
+                # Not logged in yet - check again once a request has gone through the login
+                self.stop_event.wait(RETRY_INTERVAL)
+                continue
+
+            # Spread processes sharing the cache out a little; the first one refreshes
+            wait = token['expires_at'] - self.refresh_margin - time.time() + random.uniform(0, 10)
+            if wait > 0:
+                self.stop_event.wait(min(wait, RETRY_INTERVAL * 10))
+                continue
+
+            try:
+                if self.refresh() is None:
+                    # No refresh token (or the cache disappeared) - the next login replaces it
+                    self.stop_event.wait(RETRY_INTERVAL)
+            except Exception as e:
+                print(f"Spotify token refresh failed: {e} - retrying in {RETRY_INTERVAL}s")
+                self.stop_event.wait(RETRY_INTERVAL)
+
+    def refresh(self, force=False):
+        """
+        Refresh the token unless another process already did
+
+        Args:
+            force (bool): Refresh even if the cached token isn't close to expiring
+
+        Returns:
+            dict: The current token info, or None if there is no token to refresh
+        """
+        with self.cache.locked():
+            # Re-read under the lock - another process may have refreshed while we waited
+            self.cache.stamp = None
+            token = self.cache.get_cached_token()
+            if token is None or 'refresh_token' not in token:
+                return None
+            if not force and token.get('expires_at', 0) - time.time() > self.refresh_margin:
+                return token
+
+            token = self.auth_manager.refresh_access_token(token['refresh_token'])
+            self.refreshes += 1
+            print(f"Refreshed Spotify access token (valid for {(token['expires_at'] - time.time()) / 60:.0f} minutes)")
+            return token
+
+    def get_access_token(self, as_dict=False):
+        """
+        Get a valid access token - the cached one unless it expired before the background refresh ran
+
+        This is what spotipy.Spotify calls before every request.
+
+        Args:
+            as_dict (bool): Return the full token info instead of the access token string
+
+        Returns:
+            str: The access token (or the token info dict with as_dict)
+        """
+        token = self.cache.get_cached_token()
+        if token is None or self.auth_manager.is_token_expired(token):
+            token = self.refresh() if token is not None else None
+            if token is None:
+                # Nobody is logged in yet - run the interactive login once for all processes
+                with self.cache.locked():
+                    token = self.auth_manager.validate_token(self.cache.get_cached_token())
+                    if token is None:
+                        self.auth_manager.get_access_token(as_dict=False, check_cache=False)
+                        token = self.cache.get_cached_token()
+        return token if as_dict else token['access_token']
+
+    def stop(self):
+        """
+        Stop the background refresh thread
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
@@ -0,0 +1,269 @@
+"""
+Track Catalog Module
+A local catalog of tracks with per-track mood features (Spotify's valence and energy)
+held in one NumPy matrix. Detected emotions are turned into a point on the
+valence/arousal plane and the closest tracks are found with a vectorized
+nearest-neighbour query, which takes a few milliseconds even for 100k+ tracks.
+
+Catalogs built by catalog_sync.py are stored as a columnar snapshot: one file of
+aligned .npy blocks that is memory-mapped at startup instead of being parsed.
+"""
+
+import os
+from collections import deque
+import numpy as np
+
+# Default catalog file, overridden by the MOODIFY_CATALOG setting or --catalog
+DEFAULT_CATALOG_PATH = "track_catalog.snapshot"
+
+# Snapshot layout: a magic string, then one .npy block per column in this order, each block
+# starting on a 64 byte boundary so every column can be used straight from the mapped file
+SNAPSHOT_MAGIC = b"MOODCAT1"
+SNAPSHOT_ALIGNMENT = 64
+SNAPSHOT_COLUMNS = (
+    "uris",                # (n,) track URIs as ASCII bytes
+    "features",            # (n, len(FEATURES)) float32
+    "playlists",           # (p,) playlist URIs the tracks came from
+    "playlist_snapshots",  # (p,) each playlist's snapshot_id when it was synced
+    "member_playlist",     # (m,) int32 playlist row of each playlist/track pair
+    "member_track",        # (m,) int32 track row of each playlist/track pair
+)
+
+# Audio features stored per track, in column order - energy stands in for arousal
+FEATURES = ("valence", "energy")
+
+# Where each emotion sits on the (valence, arousal) plane, on Spotify's 0-1 feature scale
+EMOTION_MOODS = {
+    'happy': (0.85, 0.70),
+    'surprise': (0.70, 0.85),
+    'angry': (0.20, 0.85),
+    'fear': (0.20, 0.75),
+    'disgust': (0.20, 0.55),
+    'sad': (0.15, 0.25),
+    'neutral': (0.50, 0.40),
+}
+
+def mood_for(emotion):
+    """
+    Get the target mood for an emotion or a probability distribution over emotions
+
+    Probabilities blend the emotions' positions, so an uncertain happy/neutral face
+    lands between the two instead of in either bucket.
+
+    Args:
+        emotion: Emotion label, or {emotion: probability} dict
+
+    Returns:
+        numpy.ndarray: (valence, arousal) as float32
+    """
+    if isinstance(emotion, str):
+        return np.array(EMOTION_MOODS.get(emotion, EMOTION_MOODS['neutral']), dtype=np.float32)
+
+    weights = {label: p for label, p in (emotion or {}).items() if label in EMOTION_MOODS and p > 0}
+    total = sum(weights.values())
+    if total <= 0:
+        return np.array(EMOTION_MOODS['neutral'], dtype=np.float32)
+    mood = sum(np.array(EMOTION_MOODS[label], dtype=np.float64) * p for label, p in weights.items()) / total
+    return mood.astype(np.float32)
+
+class TrackCatalog:
+    def __init__(self, uris, features, names=None, recent_size=200):
+        """
+        Initialize the catalog
+
+        Args:
+            uris: Track URIs, one per row of features
+            features: (n, len(FEATURES)) array of per-track features
+            names: Display names ("Artist - Title"), optional
+            recent_size (int): Number of recently recommended tracks to skip in later queries (default: 200)
+        """
+        self.uris = np.asarray(uris)
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.names = np.asarray(names) if names is not None else None
+        if self.features.ndim != 2 or len(self.features) != len(self.uris):
+            raise ValueError(f"Expected one feature row per track, got {self.features.shape} for {len(self.uris)} tracks")
+
+        # |f|^2 per track, so a query needs only one matrix-vector product
+        self.norms = np.einsum("ij,ij->i", self.features, self.features)
+
+        # Recently recommended rows, so consecutive switches don't replay the same tracks
+        self.recent = deque(maxlen=recent_size)
+
+    def __len__(self):
+        return len(self.uris)
+
+    @classmethod
+    def from_tracks(cls, tracks, **kwargs):
+        """
+        Build a catalog from track dicts
+
+        Args:
+            tracks (list): Dicts with "uri", optional "name" and a value for each of FEATURES
+
+        Returns:
+            TrackCatalog: The catalog
+        """
+        uris = [track['uri'] for track in tracks]
+        names = [track.get('name', "") for track in tracks]
+        features = np.array([[track[feature] for feature in FEATURES] for track in tracks], dtype=np.float32)
+        return cls(uris, features.reshape(len(tracks), len(FEATURES)), names, **kwargs)
+
+    def nearest(self, target, k=20, exclude=None):
+        """
+        Find the tracks closest to a target feature vector
+
+        Args:
+            target: Feature vector, e.g. from mood_for()
+            k (int): Number of tracks (default: 20)
+            exclude: Row indices to leave out
+
+        Returns:
+            numpy.ndarray: Row indices of the k nearest tracks, closest first
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.intp)
+        target = np.asarray(target, dtype=np.float32)
+
+        # Squared euclidean distance to every track: |f|^2 - 2 f.t + |t|^2
+        distances = self.norms - 2.0 * (self.features @ target) + float(target @ target)
+        if exclude is not None and len(exclude):
+            distances[np.fromiter(exclude, dtype=np.intp)] = np.inf
+
+        k = min(k, len(self))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return nearest[np.isfinite(distances[nearest])]
+
+    def recommend(self, emotion, k=20):
+        """
+        Pick tracks for an emotion or probability distribution, skipping recent recommendations
+
+        Args:
+            emotion: Emotion label or {emotion: probability} dict
+            k (int): Number of tracks (default: 20)
+
+        Returns:
+            list: Track URIs, best match first
+        """
+        rows = self.nearest(mood_for(emotion), k, exclude=set(self.recent))
+        if len(rows) == 0 and self.recent:
+            # Everything nearby was played recently - start over
+            self.recent.clear()
+            rows = self.nearest(mood_for(emotion), k)
+        self.recent.extend(int(row) for row in rows)
+        uris = self.uris[rows]
+        if uris.dtype.kind == "S":
+            # Snapshots store URIs as bytes
+            return [uri.decode("ascii") for uri in uris]
+        return [str(uri) for uri in uris]
+
+    def describe(self, emotion):
+        """
+        Short description of the target mood for log messages
+        """
+        valence, arousal = mood_for(emotion)
+        return f"valence {valence:.2f}, energy {arousal:.2f}"
+
+    def save(self, path):
+        """
+        Save the catalog to an .npz file
+        """
+        names = self.names if self.names is not None else np.array([""] * len(self))
+        np.savez(path, uris=self.uris.astype(str), names=names.astype(str), features=self.features)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Load a catalog saved with save(), or map a snapshot written by write_snapshot()
+        """
+        if not path.endswith(".npz"):
+            columns = read_snapshot(path)
+            return cls(columns['uris'], columns['features'], **kwargs)
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['uris'], data['features'], data['names'], **kwargs)
+
+def _pad_to_alignment(f):
+    padding = -f.tell() % SNAPSHOT_ALIGNMENT
+    if padding:
+        f.write(b"\0" * padding)
+
+def write_snapshot(path, columns):
+    """
+    Write a catalog snapshot (via a temporary file, so readers never see a half written one)
+
+    Processes that already mapped the old snapshot keep using it until they restart.
+
+    Args:
+        path (str): Snapshot file
+        columns (dict): An array for each of SNAPSHOT_COLUMNS
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        for name in SNAPSHOT_COLUMNS:
+            _pad_to_alignment(f)
+            np.lib.format.write_array(f, np.ascontiguousarray(columns[name]), allow_pickle=False)
+    os.replace(tmp_path, path)
+
+def read_snapshot(path):
+    """
+    Map a catalog snapshot into memory
+
+    Only the small .npy headers are read - the columns are views of the mapped file and
+    their pages are loaded by the OS when they are first used.
+
+    Args:
+        path (str): Snapshot file
+
+    Returns:
+        dict: {column: read-only numpy array} for each of SNAPSHOT_COLUMNS
+
+    Raises:
+        ValueError: If the file is not a snapshot or is truncated
+    """
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+    columns = {}
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a track catalog snapshot")
+        for name in SNAPSHOT_COLUMNS:
+            f.seek(-f.tell() % SNAPSHOT_ALIGNMENT, os.SEEK_CUR)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if fortran_order or dtype.hasobject:
+                raise ValueError(f"Unsupported layout for column '{name}' in {path}")
+
+            offset = f.tell()
+            size = int(np.prod(shape)) * dtype.itemsize
+            if offset + size > len(mapped):
+                raise ValueError(f"{path} is truncated")
+            columns[name] = mapped[offset:offset + size].view(dtype).reshape(shape)
+            f.seek(offset + size)
+    return columns
+
+def load_catalog(path=None):
+    """
+    Load the track catalog if there is one
+
+    Args:
+        path (str): Catalog file (default: MOODIFY_CATALOG setting or DEFAULT_CATALOG_PATH)
+
+    Returns:
+        TrackCatalog: The catalog, or None if there is no catalog file (playlists are used instead)
+    """
+    path = path or os.getenv("MOODIFY_CATALOG", DEFAULT_CATALOG_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        catalog = TrackCatalog.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not load track catalog {path}: {e} - using playlists instead")
+        return None
+    if len(catalog) == 0:
+        print(f"Track catalog {path} is empty - using playlists instead")
+        return None
+    print(f"Loaded track catalog with {len(catalog)} tracks from {path}")
+    return catalog